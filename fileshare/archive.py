@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - LOTES DE ARQUIVOS
+Vários arquivos num único fluxo de dados, no estilo de um tar
+
+Cada arquivo é precedido de um cabeçalho com o tamanho do nome, o tamanho
+do conteúdo e a data de modificação; o nome vem em seguida e depois o
+conteúdo. O fluxo é cortado em frames de dados de ~256 KB sem respeitar as
+fronteiras dos arquivos, então milhares de arquivos pequenos viajam em
+poucos frames grandes, sem uma requisição por arquivo.
+
+Quem envia lê o disco numa thread e escreve no socket em outra; quem
+recebe faz o inverso. Os frames podem ser comprimidos como em
+compression.send_stream.
+"""
+
+import itertools
+import math
+import os
+import queue
+import struct
+import threading
+from pathlib import Path
+
+from protocol import FLAG_COMPRESSED
+from compression import (AdaptiveCompressor, get_codec, run_pipeline, PIPELINE_DEPTH,
+                         CHUNK_SIZE)
+from durability import FSYNC_NONE, fsync_directory
+
+# Cabeçalho de cada arquivo: tamanho do nome, tamanho do conteúdo e mtime
+ENTRY_HEADER = struct.Struct('!HQd')
+
+# Tamanho máximo de cada frame de dados do lote (um frame comprimido não
+# pode descomprimir em mais que CHUNK_SIZE)
+FRAME_TARGET = CHUNK_SIZE
+
+# Numera os lotes recebidos por este processo (nomes dos temporários)
+_batch_ids = itertools.count(1)
+
+
+class ArchiveError(Exception):
+    """Lote malformado ou com nome de arquivo inválido"""
+
+
+def valid_name(name):
+    """
+    Indica se um nome pode ser gravado na pasta de destino
+
+    Só nomes simples (sem diretórios) e que não começam com ponto, para que
+    um lote não escreva fora da pasta nem nos dados internos do servidor.
+    """
+    return (bool(name) and not name.startswith('.') and '/' not in name
+            and '\\' not in name and '\0' not in name and Path(name).name == name)
+
+
+def send_archive(conn, request_id, entries, codec_name=None, progress=None):
+    """
+    Envia vários arquivos como um único fluxo de dados
+
+    A leitura dos arquivos roda numa thread e a escrita no socket na thread
+    atual. Deve ser chamado com `conn.send_lock` adquirido se a resposta
+    precisar vir junto.
+
+    Args:
+        conn (FrameConnection): Conexão de destino
+        request_id (int): Id da requisição
+        entries: Pares (nome no lote, caminho local)
+        codec_name (str): Codec negociado ou None
+        progress: Função chamada com os bytes de conteúdo já enviados
+
+    Returns:
+        tuple: (arquivos enviados, bytes de conteúdo)
+    """
+    codec = get_codec(codec_name)
+    compressor = AdaptiveCompressor(codec) if codec else None
+    totals = [0, 0]
+
+    def produce(put):
+        buffer = bytearray()
+        content = 0  # Bytes de conteúdo no buffer atual
+
+        def flush():
+            nonlocal content
+            data = bytes(buffer)
+            buffer.clear()
+            item = compressor.encode(data) if compressor else (data, 0)
+            put(item + (content,))
+            content = 0
+
+        for name, path in entries:
+            encoded = name.encode('utf-8')
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if len(buffer) + ENTRY_HEADER.size + len(encoded) > FRAME_TARGET:
+                    flush()
+                buffer += ENTRY_HEADER.pack(len(encoded), stat.st_size, stat.st_mtime)
+                buffer += encoded
+                remaining = stat.st_size
+                while remaining:
+                    if len(buffer) == FRAME_TARGET:
+                        flush()
+                    data = f.read(min(FRAME_TARGET - len(buffer), remaining))
+                    if not data:
+                        # O cabeçalho já prometeu o tamanho: o lote não pode continuar
+                        raise ConnectionError(f'Arquivo alterado durante o envio: {name}')
+                    buffer += data
+                    content += len(data)
+                    remaining -= len(data)
+                    if len(buffer) >= FRAME_TARGET:
+                        flush()
+            totals[0] += 1
+        if buffer:
+            flush()
+
+    def send(item):
+        payload, flags, content = item
+        conn.send_data(request_id, payload, flags=flags)
+        totals[1] += content
+        if progress:
+            progress(totals[1])
+
+    with conn.send_lock:
+        run_pipeline(produce, send)
+        conn.send_data(request_id, b'', end=True)
+    return totals[0], totals[1]
+
+
+class ArchiveParser:
+    def __init__(self):
+        """Separa um fluxo de lote em eventos, recebendo pedaços de qualquer tamanho"""
+        self.pending = bytearray()  # Cabeçalho ou nome incompleto
+        self.remaining = 0  # Conteúdo que falta do arquivo atual
+        self.in_entry = False
+
+    def feed(self, data):
+        """
+        Processa mais um pedaço do fluxo
+
+        Yields:
+            tuple: ('begin', nome, tamanho, mtime), ('data', bytes) ou ('end',)
+        """
+        view = memoryview(data)
+        while view:
+            if self.in_entry:
+                take = min(self.remaining, len(view))
+                if take:
+                    yield ('data', bytes(view[:take]))
+                    view = view[take:]
+                    self.remaining -= take
+                if not self.remaining:
+                    self.in_entry = False
+                    yield ('end',)
+                continue
+
+            # Junta cabeçalho e nome, que podem vir divididos entre frames
+            need = ENTRY_HEADER.size
+            if len(self.pending) >= need:
+                need += ENTRY_HEADER.unpack_from(self.pending)[0]
+            take = min(need - len(self.pending), len(view))
+            self.pending += view[:take]
+            view = view[take:]
+            if len(self.pending) < ENTRY_HEADER.size:
+                continue
+            name_size, size, mtime = ENTRY_HEADER.unpack_from(self.pending)
+            if len(self.pending) < ENTRY_HEADER.size + name_size:
+                continue
+            try:
+                name = bytes(self.pending[ENTRY_HEADER.size:]).decode('utf-8')
+            except UnicodeDecodeError:
+                raise ArchiveError('Nome de arquivo inválido no lote')
+            if not math.isfinite(mtime):
+                raise ArchiveError(f'Data de modificação inválida no lote: {name!r}')
+            self.pending.clear()
+            self.remaining = size
+            self.in_entry = True
+            yield ('begin', name, size, mtime)
+        # Arquivo vazio no fim do pedaço: fecha sem esperar mais dados
+        if self.in_entry and not self.remaining:
+            self.in_entry = False
+            yield ('end',)
+
+    def finish(self):
+        """Confere se o fluxo terminou entre dois arquivos"""
+        if self.in_entry or self.pending:
+            raise ArchiveError('Lote incompleto')
+
+
+def receive_archive(conn, sink, codec_name=None, progress=None):
+    """
+    Recebe um fluxo de lote e entrega os arquivos a `sink`
+
+    O socket é lido na thread atual; `sink` grava numa thread separada.
+    Erros do `sink` só são levantados depois que o fluxo inteiro foi lido,
+    para manter o protocolo sincronizado.
+
+    Args:
+        conn (FrameConnection): Conexão de origem
+        sink: Objeto com begin(nome, tamanho, mtime), write(bytes) e end()
+        codec_name (str): Codec negociado ou None
+        progress: Função chamada (nesta thread) com os bytes de conteúdo recebidos
+    """
+    codec = get_codec(codec_name)
+    parser = ArchiveParser()
+    items = queue.Queue(maxsize=PIPELINE_DEPTH * 4)
+    done = object()
+    error = []
+
+    def write_worker():
+        try:
+            while True:
+                events = items.get()
+                if events is done:
+                    return
+                for event in events:
+                    if event[0] == 'begin':
+                        sink.begin(*event[1:])
+                    elif event[0] == 'data':
+                        sink.write(event[1])
+                    else:
+                        sink.end()
+        except BaseException as e:
+            error.append(e)
+            # Continua esvaziando a fila para não travar quem lê o socket
+            while items.get() is not done:
+                pass
+
+    thread = threading.Thread(target=write_worker, daemon=True)
+    thread.start()
+    received = 0
+    try:
+        for flags, chunk in conn.iter_data(whole_frames=codec is not None,
+                                           max_length=CHUNK_SIZE):
+            if flags & FLAG_COMPRESSED:
+                if codec is None:
+                    raise ArchiveError('Frame comprimido sem codec negociado')
+                chunk = codec.decompress(chunk)
+            events = list(parser.feed(chunk))
+            items.put(events)
+            if progress:
+                received += sum(len(event[1]) for event in events if event[0] == 'data')
+                progress(received)
+        parser.finish()
+    finally:
+        items.put(done)
+        thread.join()
+    if error:
+        raise error[0]
+
+
+class FolderSink:
+    def __init__(self, folder, temp_folder=None, fsync_policy=FSYNC_NONE):
+        """
+        Grava os arquivos de um lote numa pasta
+
+        Cada arquivo é escrito num temporário e só aparece com o nome final
+        quando está completo (os.replace), com a data de modificação original.
+
+        Args:
+            folder (Path): Pasta de destino
+            temp_folder (Path): Pasta dos temporários (padrão: a de destino)
+            fsync_policy (str): Com algo além de 'none', cada arquivo passa
+                por fsync antes de ser publicado (ver durability.py)
+        """
+        self.folder = Path(folder)
+        self.temp_folder = Path(temp_folder or folder)
+        self.fsync_policy = fsync_policy
+        self.count = 0
+        self.bytes = 0
+        self.names = []
+        self._file = None
+        self._tmp_path = None
+        self._entry = None
+        # Prefixo único dos temporários deste lote (mais barato que mkstemp
+        # quando são dezenas de milhares de arquivos)
+        self._tmp_prefix = f".batch_{os.getpid()}_{next(_batch_ids)}_"
+
+    def begin(self, name, size, mtime):
+        """Começa um arquivo"""
+        if not valid_name(name):
+            raise ArchiveError(f'Nome de arquivo inválido no lote: {name!r}')
+        self._tmp_path = self.temp_folder / (self._tmp_prefix + name)
+        self._file = open(self._tmp_path, 'wb')
+        self._entry = (name, size, mtime)
+
+    def write(self, data):
+        """Grava conteúdo do arquivo atual"""
+        self._file.write(data)
+        self.bytes += len(data)
+
+    def end(self):
+        """Publica o arquivo atual"""
+        name, _, mtime = self._entry
+        if self.fsync_policy != FSYNC_NONE:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.utime(self._tmp_path, (mtime, mtime))
+        os.replace(self._tmp_path, self.folder / name)
+        self._tmp_path = None
+        self.count += 1
+        self.names.append(name)
+
+    def sync_folder(self):
+        """Garante no disco os nomes publicados (uma vez por lote)"""
+        if self.fsync_policy != FSYNC_NONE and self.count:
+            fsync_directory(self.folder)
+
+    def abort(self):
+        """Descarta o arquivo incompleto (chamar se o lote falhou)"""
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._tmp_path:
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+            self._tmp_path = None
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - SERVIDOR ASSÍNCRONO
+Motor baseado em asyncio para milhares de conexões simultâneas
+
+Conexões ociosas ficam só registradas no event loop (sem thread e sem buffer
+de leitura). O loop lê cada requisição até ela estar inteira no buffer e só
+então a entrega a uma thread, que a atende com exatamente o mesmo
+`process_request` do servidor com threads.
+
+Os sockets nunca bloqueiam: quando uma thread precisa esperar o cliente (um
+download para quem não lê, o restante de um upload), a espera é feita pelo
+event loop (ver LoopSocket) e a thread devolve a sua vaga de trabalho. Assim
+`max_workers` limita só quantas requisições usam disco e CPU ao mesmo
+tempo, e clientes lentos não tomam a vez dos outros.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from file_server import FileServer, DEFAULT_BACKLOG, DEFAULT_SHARED_FOLDER
+from protocol import FrameConnection, ProtocolError, FRAME_REQUEST
+
+# Tempo máximo de uma leitura ou escrita parada (cliente que não lê) no meio
+# de uma requisição; conexões ociosas e leituras paradas também são
+# encerradas pelo registro de conexões (ver connections.py)
+REQUEST_TIMEOUT = 30
+
+# Requisições em andamento (cada uma numa thread, trabalhando ou esperando o
+# cliente) quando o número de conexões não é limitado
+MAX_REQUEST_THREADS = 1024
+
+
+class WorkSlots:
+    def __init__(self, count):
+        """
+        Vagas para requisições usando disco e CPU ao mesmo tempo
+
+        Args:
+            count (int): Número de vagas
+        """
+        self.semaphore = threading.Semaphore(count)
+        self.local = threading.local()  # Se a thread atual tem uma vaga
+        self.lock = threading.Lock()
+        self.waiting = 0  # Threads esperando uma vaga
+
+    def acquire(self):
+        """Ocupa uma vaga, esperando se todas estiverem em uso"""
+        if not self.semaphore.acquire(blocking=False):
+            with self.lock:
+                self.waiting += 1
+            try:
+                self.semaphore.acquire()
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+        self.local.held = True
+
+    def release(self):
+        """Devolve a vaga da thread atual"""
+        self.local.held = False
+        self.semaphore.release()
+
+    @contextmanager
+    def released(self):
+        """Devolve a vaga da thread atual (se ela tiver uma) durante o bloco"""
+        if not getattr(self.local, 'held', False):
+            yield
+            return
+        self.release()
+        try:
+            yield
+        finally:
+            self.acquire()
+
+
+class LoopSocket:
+    def __init__(self, sock, loop, slots, timeout=REQUEST_TIMEOUT):
+        """
+        Socket não bloqueante de um cliente, usado pelas threads de trabalho
+
+        Cada operação é tentada na hora; se o socket não está pronto, o
+        event loop espera por ele (add_reader/add_writer) enquanto a thread
+        fica parada sem ocupar vaga de trabalho. Para quem usa, o socket se
+        comporta como um socket bloqueante com timeout.
+
+        Args:
+            sock: Socket do cliente (não bloqueante)
+            loop: Event loop do servidor
+            slots (WorkSlots): Vagas de trabalho do servidor
+            timeout (float): Espera máxima por uma leitura ou escrita
+        """
+        self.sock = sock
+        self.loop = loop
+        self.slots = slots
+        self.timeout = timeout
+        self.send_timeout = timeout  # Ver file_server.set_send_timeout
+
+    def __getattr__(self, name):
+        # fileno, shutdown, close, setsockopt etc. vão direto para o socket
+        return getattr(self.sock, name)
+
+    def gettimeout(self):
+        """Timeout visto por quem usa o socket (ver transfer.can_zero_copy)"""
+        return self.timeout
+
+    def wait(self, writable):
+        """
+        Espera o socket ficar pronto para escrita (ou leitura) pelo event loop
+
+        Raises:
+            TimeoutError: Se o cliente não avançou dentro do prazo
+        """
+        ready = threading.Event()
+        fd = self.sock.fileno()
+        if writable:
+            watch, unwatch, timeout = self.loop.add_writer, self.loop.remove_writer, self.send_timeout
+        else:
+            watch, unwatch, timeout = self.loop.add_reader, self.loop.remove_reader, self.timeout
+
+        def fire():
+            # Roda no loop: para de observar e acorda a thread
+            unwatch(fd)
+            ready.set()
+
+        self.loop.call_soon_threadsafe(watch, fd, fire)
+        with self.slots.released():
+            if not ready.wait(timeout):
+                self.loop.call_soon_threadsafe(unwatch, fd)
+                raise TimeoutError('Cliente parado no meio da requisição')
+
+    def recv_into(self, buffer, nbytes=0):
+        """Recebe no buffer, esperando pelo loop se nada chegou ainda"""
+        while True:
+            try:
+                return self.sock.recv_into(buffer, nbytes)
+            except BlockingIOError:
+                self.wait(False)
+
+    def sendall(self, data):
+        """Envia tudo, esperando pelo loop sempre que o buffer do socket enche"""
+        view = memoryview(data).cast('B')
+        while view:
+            try:
+                sent = self.sock.send(view)
+            except BlockingIOError:
+                self.wait(True)
+                continue
+            view = view[sent:]
+
+    def sendfile(self, file, offset=0, count=None):
+        """
+        Envia parte de um arquivo com os.sendfile (sem cópia)
+
+        A leitura do disco acontece na thread que chama; só a espera por
+        espaço no socket vai para o loop.
+
+        Returns:
+            int: Bytes enviados
+        """
+        source = file.fileno()
+        if count is None:
+            count = os.fstat(source).st_size - offset
+        total = 0
+        try:
+            while total < count:
+                try:
+                    sent = os.sendfile(self.sock.fileno(), source, offset + total,
+                                       count - total)
+                except BlockingIOError:
+                    self.wait(True)
+                    continue
+                if not sent:
+                    break  # Fim do arquivo
+                total += sent
+        finally:
+            file.seek(offset + total)
+        return total
+
+
+class AsyncFileServer(FileServer):
+    def __init__(self, host='localhost', port=8888, backlog=DEFAULT_BACKLOG,
+                 max_workers=None, shared_folder=DEFAULT_SHARED_FOLDER):
+        """
+        Inicializa o servidor assíncrono
+
+        Args:
+            host (str): Endereço IP do servidor
+            port (int): Porta do servidor
+            backlog (int): Tamanho da fila de conexões pendentes
+            max_workers (int): Requisições usando disco e CPU ao mesmo tempo
+            shared_folder (str): Pasta de arquivos compartilhados
+        """
+        super().__init__(host, port, backlog, shared_folder)
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self.executor = None
+        self.slots = None
+        self.loop = None
+        self.shutdown_event = None
+        self.tasks = set()  # Tarefas das conexões ativas
+
+    def start_server(self):
+        """Inicia o servidor e roda o event loop até ser parado"""
+        # O loop com selectors permite esperar leitura em sockets crus
+        # (o loop padrão do Windows não suporta add_reader)
+        loop = asyncio.SelectorEventLoop()
+        main_task = loop.create_task(self.serve())
+        try:
+            loop.run_until_complete(main_task)
+        except KeyboardInterrupt:
+            # Ctrl+C: encerra de forma ordenada dentro do próprio loop
+            print("\n🛑 Parando servidor...")
+            self.shutdown_event.set()
+            loop.run_until_complete(main_task)
+        except Exception as e:
+            print(f"❌ Erro ao iniciar servidor: {e}")
+        finally:
+            loop.close()
+
+    async def serve(self):
+        """Aceita conexões e cria uma tarefa para cada cliente"""
+        self.loop = asyncio.get_running_loop()
+        self.shutdown_event = asyncio.Event()
+        # Uma conexão tem no máximo uma requisição em andamento; as threads
+        # paradas esperando o cliente não contam nas vagas de trabalho
+        self.slots = WorkSlots(self.max_workers)
+        threads = max(self.max_workers,
+                      self.connections.max_connections or MAX_REQUEST_THREADS)
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads,
+            thread_name_prefix='fileshare-worker'
+        )
+
+        self.socket = self.create_listen_socket()
+        self.socket.setblocking(False)
+        self.running = True
+        self.connections.start()
+        self.announce()
+        self.start_replication()
+        print(f"⚙️ Modo assíncrono: {self.max_workers} vagas de trabalho")
+        self.metrics.add_gauge(
+            'executor_queue_depth', 'Requisições esperando uma vaga de trabalho',
+            lambda: self.slots.waiting
+        )
+        self.metrics.add_gauge(
+            'event_loop_tasks', 'Conexões acompanhadas pelo event loop',
+            lambda: len(self.tasks)
+        )
+
+        accept_task = asyncio.create_task(self.accept_loop())
+        try:
+            await self.shutdown_event.wait()
+        finally:
+            self.running = False
+            if self.replicator:
+                # Para de aplicar mudanças fora do loop (a thread pode estar baixando)
+                await self.loop.run_in_executor(self.executor, self.replicator.stop)
+            accept_task.cancel()
+            self.socket.close()
+            # Conexões ociosas fecham na hora; as que atendem uma requisição
+            # têm até drain_timeout (a tarefa termina depois da requisição atual)
+            self.connections.close_idle()
+            if self.tasks:
+                _, pending = await asyncio.wait(list(self.tasks), timeout=self.drain_timeout)
+                if pending:
+                    forced = self.connections.close_all()
+                    print(f"⚠️ {forced} conexão(ões) encerrada(s) sem terminar a requisição")
+            tasks = list(self.tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(accept_task, *tasks, return_exceptions=True)
+            # As threads que ainda esperam um cliente dependem do loop: ele
+            # continua rodando enquanto elas terminam
+            await self.loop.run_in_executor(
+                None, lambda: self.executor.shutdown(wait=True, cancel_futures=True))
+            self.connections.stop()
+            if self.metrics_http:
+                self.metrics_http.shutdown()
+            if self.watcher:
+                self.watcher.stop()
+            if self.chunk_indexer:
+                self.chunk_indexer.stop()
+            print("✅ Servidor parado")
+
+    async def accept_loop(self):
+        """Laço de aceitação de conexões"""
+        while self.running:
+            try:
+                client_socket, client_address = await self.loop.sock_accept(self.socket)
+            except OSError:
+                if self.running:
+                    print("❌ Erro ao aceitar conexão")
+                    await asyncio.sleep(0.1)
+                continue
+
+            # Servidor cheio: recusado sem criar tarefa
+            sock = LoopSocket(client_socket, self.loop, self.slots)
+            client = self.connections.register(sock, client_address)
+            if client is None:
+                continue
+            task = asyncio.create_task(self.serve_connection(client))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def wait_readable(self, sock):
+        """Espera, sem bloquear o loop, até o socket ter dados para leitura"""
+        future = self.loop.create_future()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        self.loop.add_reader(sock.fileno(), ready)
+        try:
+            await future
+        finally:
+            self.loop.remove_reader(sock.fileno())
+
+    async def receive_request(self, conn):
+        """
+        Lê no event loop até haver uma requisição inteira no buffer
+
+        Args:
+            conn (FrameConnection): Conexão com o cliente (sobre um LoopSocket)
+
+        Returns:
+            bool: False se o cliente fechou a conexão
+        """
+        sock = conn.sock.sock
+        while not conn.has_buffered_frame():
+            # Frame que não é requisição ou grande demais: recusado pelo
+            # cabeçalho, antes de receber o corpo
+            conn.peek_header(FRAME_REQUEST)
+            if not conn.buffered():
+                # Ociosa: espera sem buffer de leitura alocado
+                await self.wait_readable(sock)
+            space = conn.recv_space()
+            if not space:
+                # Requisição maior que o buffer: a thread lê o restante
+                return True
+            # Requisição pela metade conta como leitura parada (ver connections.py)
+            conn.recv_started = time.monotonic() if conn.buffered() else None
+            try:
+                n = await self.loop.sock_recv_into(sock, space)
+            finally:
+                conn.recv_started = None
+            if not n:
+                return False
+            conn.recv_done(n)
+        return True
+
+    async def serve_connection(self, client):
+        """
+        Atende um cliente: lê as requisições no loop e as processa no pool de threads
+
+        Args:
+            client (ClientConnection): Conexão registrada do cliente
+        """
+        client_socket, client_address = client.sock, client.address
+        conn = client.conn = FrameConnection(client_socket)
+        self.metrics.connection_opened(conn, client_address)
+        self.bandwidth.attach(conn, client_address)
+        try:
+            while self.running:
+                if not conn.has_buffered_frame():
+                    client.idle()
+                    if not await self.receive_request(conn):
+                        break
+                alive = await self.loop.run_in_executor(
+                    self.executor, self.serve_ready_requests, conn, client
+                )
+                if not alive:
+                    break
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"❌ Erro ao manipular cliente {client_address}: {e}")
+        finally:
+            if self.watcher:
+                self.watcher.unsubscribe(conn)
+            self.bandwidth.detach(conn)
+            self.metrics.connection_closed(conn)
+            self.connections.unregister(client_socket)
+            client_socket.close()
+
+    def serve_ready_requests(self, conn, client=None):
+        """
+        Atende (numa thread do pool) as requisições que já chegaram
+
+        A thread ocupa uma vaga de trabalho enquanto processa; as esperas
+        pelo cliente no meio da requisição a devolvem (ver LoopSocket).
+
+        Args:
+            conn (FrameConnection): Conexão com o cliente
+            client (ClientConnection): Registro da conexão
+
+        Returns:
+            bool: False se a conexão deve ser encerrada
+        """
+        self.slots.acquire()
+        try:
+            while True:
+                if not self.serve_request(conn, client):
+                    return False
+                if not conn.has_buffered_frame():
+                    break
+        except (OSError, ValueError, ProtocolError) as e:
+            print(f"❌ Erro ao atender requisição: {e}")
+            return False
+        finally:
+            self.slots.release()
+
+        # Conexão volta a ficar ociosa: devolve o buffer de leitura
+        conn.release_buffer()
+        return True
+
+    def stop_server(self):
+        """Para o servidor (pode ser chamado de outra thread)"""
+        print("\n🛑 Parando servidor...")
+        if self.loop and not self.loop.is_closed() and self.shutdown_event:
+            self.loop.call_soon_threadsafe(self.shutdown_event.set)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - BANDA
+Divisão justa da banda de envio e de recepção entre os clientes do servidor
+
+Cada direção tem um balde de fichas global (o limite do servidor) e cada
+cliente, identificado pelo IP, tem o seu (o limite por cliente). As
+conexões pedem fichas antes de cada pedaço enviado ou recebido:
+
+- requisições interativas (listagens, consultas) nunca esperam; os bytes
+  delas só são descontados, atrasando as transferências;
+- transferências esperam a vez numa fila por classe de prioridade, em que
+  os clientes são atendidos em rodízio, um pedaço por vez. Um cliente com
+  vários downloads paralelos continua recebendo uma só fatia.
+
+Sem nenhum limite configurado as conexões não ganham `throttle` e o custo
+é zero.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from protocol import THROTTLE_STEP
+from units import parse_size
+
+# Classes de prioridade (menor número passa na frente)
+PRIORITY_INTERACTIVE = 0  # Respostas pequenas: nunca esperam
+PRIORITY_NORMAL = 1       # Uploads e downloads de um arquivo
+PRIORITY_BULK = 2         # Lotes e outros trabalhos de fundo
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK)
+
+# Rajada permitida por um balde cheio, em segundos do limite
+BURST_SECONDS = 0.25
+
+# Direções, do ponto de vista do servidor
+EGRESS = 'egress'    # Downloads
+INGRESS = 'ingress'  # Uploads
+
+def parse_rate(text):
+    """
+    Converte um limite como '500K', '10M' ou '1.5G' (bytes/s)
+
+    Returns:
+        int: Bytes por segundo
+
+    Raises:
+        ValueError: Se o texto não for um limite válido
+    """
+    rate = parse_size(text)
+    if rate <= 0:
+        raise ValueError(f'Limite de banda inválido: {text}')
+    return rate
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        """
+        Balde de fichas (uma ficha por byte) que admite dívida
+
+        Quem retira mais fichas do que há deixa o saldo negativo e a dívida
+        é paga com o tempo; assim pedaços grandes não ficam presos esperando
+        um balde maior que eles.
+
+        Args:
+            rate (float): Fichas por segundo
+            burst (float): Capacidade do balde (padrão: BURST_SECONDS do limite)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(self.rate * BURST_SECONDS, THROTTLE_STEP))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """Acrescenta as fichas do tempo decorrido (chamado com o lock)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def charge(self, amount):
+        """Retira fichas sem esperar (o saldo pode ficar negativo)"""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+    def reserve(self, amount):
+        """
+        Retira fichas e informa quanto esperar para honrar o limite
+
+        Returns:
+            float: Segundos até a dívida ser paga (0 se havia saldo)
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def delay(self):
+        """
+        Segundos até o saldo voltar a ser positivo
+
+        Returns:
+            float: 0 se já há fichas
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens > 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class SharedLink:
+    def __init__(self, rate):
+        """
+        Banda global de uma direção, dividida em rodízio entre clientes
+
+        Args:
+            rate (int): Limite em bytes/s (None = sem limite global)
+        """
+        self.bucket = TokenBucket(rate) if rate else None
+        self.cond = threading.Condition()
+        # Por prioridade: cliente -> threads esperando, na ordem do rodízio
+        self.waiting = [OrderedDict() for _ in PRIORITIES]
+
+    def next_client(self):
+        """Cliente da vez: o primeiro da classe mais prioritária (com o lock)"""
+        for clients in self.waiting:
+            if clients:
+                return next(iter(clients))
+        return None
+
+    def acquire(self, client, amount, priority):
+        """
+        Espera a vez do cliente e retira `amount` fichas do balde global
+
+        Args:
+            client: Chave do cliente
+            amount (int): Bytes a transferir
+            priority (int): Classe de prioridade
+        """
+        if self.bucket is None:
+            return
+        if priority == PRIORITY_INTERACTIVE:
+            self.bucket.charge(amount)
+            return
+
+        with self.cond:
+            clients = self.waiting[priority]
+            clients[client] = clients.get(client, 0) + 1
+            try:
+                while True:
+                    if self.next_client() != client:
+                        # Timeout só por segurança: quem sai sempre avisa
+                        self.cond.wait(1.0)
+                        continue
+                    wait = self.bucket.delay()
+                    if wait <= 0:
+                        self.bucket.charge(amount)
+                        # Próximo pedaço deste cliente vai para o fim da fila
+                        clients.move_to_end(client)
+                        return
+                    self.cond.wait(wait)
+            finally:
+                clients[client] -= 1
+                if not clients[client]:
+                    del clients[client]
+                self.cond.notify_all()
+
+    def waiters(self):
+        """Threads esperando a vez, somando todas as classes"""
+        with self.cond:
+            return sum(sum(clients.values()) for clients in self.waiting)
+
+
+class ConnectionThrottle:
+    def __init__(self, scheduler, client):
+        """
+        Limite de banda de uma conexão (atribuído a `FrameConnection.throttle`)
+
+        Args:
+            scheduler (BandwidthScheduler): Agendador do servidor
+            client: Chave do cliente (IP)
+        """
+        self.scheduler = scheduler
+        self.client = client
+        self.priority = PRIORITY_INTERACTIVE  # Trocada a cada requisição
+
+    def sending(self, amount):
+        """Bloqueia até `amount` bytes poderem ser enviados"""
+        self.scheduler.consume(EGRESS, self.client, amount, self.priority)
+
+    def receiving(self, amount):
+        """Desconta `amount` bytes recebidos, bloqueando se passou do limite"""
+        self.scheduler.consume(INGRESS, self.client, amount, self.priority)
+
+
+class BandwidthScheduler:
+    def __init__(self, egress=None, ingress=None, client_egress=None, client_ingress=None):
+        """
+        Limites de banda do servidor (todos em bytes/s, None = sem limite)
+
+        Args:
+            egress (int): Envio total (downloads)
+            ingress (int): Recepção total (uploads)
+            client_egress (int): Envio para cada cliente
+            client_ingress (int): Recepção de cada cliente
+        """
+        self.links = {EGRESS: SharedLink(egress), INGRESS: SharedLink(ingress)}
+        self.client_limits = {EGRESS: client_egress, INGRESS: client_ingress}
+        self.lock = threading.Lock()
+        self.clients = {}  # IP -> [conexões, {direção: TokenBucket}]
+        self.waited = 0.0  # Segundos que as transferências passaram esperando
+
+    @property
+    def enabled(self):
+        """Indica se há algum limite configurado"""
+        return any(link.bucket for link in self.links.values()) or any(
+            self.client_limits.values())
+
+    def attach(self, conn, address):
+        """
+        Passa a limitar uma conexão recém-aceita
+
+        Args:
+            conn (FrameConnection): Conexão do cliente
+            address: Endereço do cliente (o IP identifica o cliente)
+        """
+        if not self.enabled:
+            return
+        client = address[0] if isinstance(address, tuple) else address
+        with self.lock:
+            entry = self.clients.get(client)
+            if entry is None:
+                buckets = {direction: TokenBucket(rate)
+                           for direction, rate in self.client_limits.items() if rate}
+                entry = self.clients[client] = [0, buckets]
+            entry[0] += 1
+        conn.throttle = ConnectionThrottle(self, client)
+
+    def detach(self, conn):
+        """Para de limitar uma conexão que fechou"""
+        throttle = conn.throttle
+        if throttle is None:
+            return
+        conn.throttle = None
+        with self.lock:
+            entry = self.clients.get(throttle.client)
+            if entry is not None:
+                entry[0] -= 1
+                if not entry[0]:
+                    del self.clients[throttle.client]
+
+    def consume(self, direction, client, amount, priority):
+        """
+        Espera até `amount` bytes poderem passar na direção dada
+
+        Primeiro o limite do cliente (dormindo o que ele exigir) e depois a
+        vez no rodízio global.
+        """
+        with self.lock:
+            entry = self.clients.get(client)
+        bucket = entry[1].get(direction) if entry else None
+        started = time.monotonic()
+        if bucket is not None:
+            if priority == PRIORITY_INTERACTIVE:
+                bucket.charge(amount)
+            else:
+                wait = bucket.reserve(amount)
+                if wait:
+                    time.sleep(wait)
+        self.links[direction].acquire(client, amount, priority)
+        if priority != PRIORITY_INTERACTIVE:
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                with self.lock:
+                    self.waited += waited
+
+    def waiters(self):
+        """Transferências esperando a vez no rodízio global"""
+        return sum(link.waiters() for link in self.links.values())
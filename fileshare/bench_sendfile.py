@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - BENCHMARK DE ENVIO
+Compara a vazão do envio sem cópia (sendfile) com o caminho com buffer
+
+Uso:
+    python bench_sendfile.py --size-mb 512 --runs 3
+"""
+
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from transfer import can_zero_copy, send_zero_copy, send_buffered
+
+
+def drain(server_socket, total, done):
+    """Recebe e descarta `total` bytes da primeira conexão aceita"""
+    conn, _ = server_socket.accept()
+    buffer = bytearray(1024 * 1024)
+    received = 0
+    with conn:
+        while received < total:
+            n = conn.recv_into(buffer)
+            if not n:
+                break
+            received += n
+    done.append(received)
+
+
+def run_once(path, size, use_sendfile):
+    """
+    Envia o arquivo inteiro por uma conexão local
+
+    Returns:
+        tuple: (segundos, segundos de CPU do processo)
+    """
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.listen(1)
+    done = []
+    receiver = threading.Thread(target=drain, args=(server_socket, size, done))
+    receiver.start()
+
+    sock = socket.create_connection(server_socket.getsockname())
+    with open(path, 'rb') as f, sock:
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        if use_sendfile:
+            sent = send_zero_copy(sock, f, 0, size)
+        else:
+            sent = send_buffered(sock, f, 0, size)
+        sock.shutdown(socket.SHUT_WR)
+        receiver.join()
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+
+    server_socket.close()
+    if sent != size or done[0] != size:
+        raise RuntimeError(f"Transferência incompleta: {sent}/{done[0]} de {size}")
+    return elapsed, cpu
+
+
+def main():
+    """Função principal do benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark sendfile x buffer")
+    parser.add_argument('--size-mb', type=int, default=256, help="Tamanho do arquivo de teste")
+    parser.add_argument('--runs', type=int, default=3, help="Repetições de cada caminho")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    fd, path = tempfile.mkstemp(prefix='bench_sendfile_')
+    try:
+        # Cria o arquivo de teste em blocos de 1 MB
+        with os.fdopen(fd, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        probe = socket.socket()
+        with open(path, 'rb') as f:
+            zero_copy_available = can_zero_copy(probe, f)
+        probe.close()
+
+        print("=" * 50)
+        print(f"📊 BENCHMARK DE ENVIO ({args.size_mb} MB, {args.runs} execuções)")
+        print("=" * 50)
+        if not zero_copy_available:
+            print("⚠️ sendfile indisponível nesta plataforma: só o caminho com buffer será medido")
+
+        paths = [('buffer', False)]
+        if zero_copy_available:
+            paths.insert(0, ('sendfile', True))
+
+        for name, use_sendfile in paths:
+            best = None
+            for _ in range(args.runs):
+                elapsed, cpu = run_once(path, size, use_sendfile)
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, cpu)
+            elapsed, cpu = best
+            throughput = args.size_mb / elapsed
+            print(f"{name:>9}: {throughput:8.1f} MB/s  "
+                  f"({elapsed:.3f} s, CPU {cpu:.3f} s)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - TESTE DE CARGA
+Sobe um servidor local e mede vazão, latência e CPU com vários clientes
+
+O servidor roda num processo separado, com os logs descartados, para que a
+CPU dele seja medida sozinha; os clientes simulados são threads deste
+processo, cada um com a sua conexão, sorteando ações e tamanhos de arquivo
+pelos pesos informados. O resultado pode ser gravado em JSON e comparado
+com uma execução anterior.
+
+Com muitos clientes o próprio gerador pode virar o gargalo (o GIL é
+dividido entre eles): a CPU dos clientes também é informada para ajudar a
+perceber isso.
+
+Uso:
+    python bench_server.py --clients 16 --duration 30 --json resultado.json
+    python bench_server.py --mix list=60,download=30,upload=10 --sizes 4K:80,1M:15,64M:5
+    python bench_server.py --mode async --compare resultado.json
+"""
+
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from protocol import FrameConnection, ProtocolError, FRAME_REQUEST, FRAME_RESPONSE
+from compression import available_codecs, receive_stream, send_stream
+from durability import FSYNC_NONE, FSYNC_POLICIES
+from hash_cache import BlockHasher, HashingReader
+from units import parse_size
+
+# Ações que os clientes simulados sabem fazer
+ACTIONS = ('list', 'upload', 'download', 'delete')
+
+# Percentis informados para cada ação
+PERCENTILES = (50, 99, 99.9)
+
+# Formato do JSON de resultado (muda se os campos mudarem)
+RESULT_VERSION = 1
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+
+def parse_weights(text, parse_key, separator):
+    """
+    Lê uma lista de pesos como 'list=50,upload=20' ou '4K:60,1M:40'
+
+    Args:
+        text (str): Itens separados por vírgula
+        parse_key: Função que converte a chave de cada item
+        separator (str): Separador entre a chave e o peso
+
+    Returns:
+        list: Pares (chave, peso) com peso positivo
+
+    Raises:
+        argparse.ArgumentTypeError: Se a lista for inválida
+    """
+    weights = []
+    try:
+        for item in text.split(','):
+            key, _, weight = item.partition(separator)
+            weight = float(weight) if weight else 1.0
+            if not math.isfinite(weight):
+                raise ValueError(f'peso inválido {weight}')
+            if weight > 0:
+                weights.append((parse_key(key.strip()), weight))
+    except (KeyError, ValueError) as e:
+        raise argparse.ArgumentTypeError(f'Lista inválida {text!r}: {e}')
+    if not weights:
+        raise argparse.ArgumentTypeError(f'Lista sem pesos positivos: {text!r}')
+    return weights
+
+
+def parse_mix(text):
+    """Mistura de ações, ex.: 'list=50,upload=20,download=25,delete=5'"""
+    def action(name):
+        if name not in ACTIONS:
+            raise KeyError(f'ação desconhecida {name!r}')
+        return name
+    return parse_weights(text, action, '=')
+
+
+def parse_sizes(text):
+    """Distribuição de tamanhos, ex.: '4K:60,1M:30,64M:10'"""
+    return parse_weights(text, parse_size, ':')
+
+
+def percentile(ordered, p):
+    """Percentil `p` (método do posto mais próximo) de uma lista ordenada"""
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(len(ordered) * p / 100))
+    return ordered[min(len(ordered), rank) - 1]
+
+
+def summarize(latencies):
+    """
+    Resume uma lista de latências
+
+    Returns:
+        dict: Contagem, média, máximo e percentis, em milissegundos
+    """
+    ordered = sorted(latencies)
+    summary = {'count': len(ordered)}
+    if ordered:
+        summary['mean_ms'] = sum(ordered) / len(ordered) * 1000
+        summary['max_ms'] = ordered[-1] * 1000
+        for p in PERCENTILES:
+            summary[f'p{p:g}_ms'.replace('.', '')] = percentile(ordered, p) * 1000
+    return summary
+
+
+def make_payload(size, kind):
+    """
+    Dados enviados nos uploads (cada upload usa um trecho deste buffer)
+
+    Args:
+        size (int): Tamanho do buffer (o maior arquivo da distribuição)
+        kind (str): 'random' (incompressível) ou 'text' (comprimível)
+    """
+    if kind == 'text':
+        line = b'linha de texto do teste de carga do servidor de arquivos 0123456789\n'
+        return (line * (size // len(line) + 1))[:size]
+    block = os.urandom(min(size, MB))
+    return (block * (size // len(block) + 1))[:size] if block else b''
+
+
+def run_server(pipe, folder, mode, workers, fsync, zero_copy, cache_mb):
+    """
+    Processo do servidor: sobe, informa a porta e responde a comandos
+
+    Comandos recebidos pelo `pipe`: 'mark' devolve a CPU usada até agora e
+    'stop' devolve a CPU e encerra o servidor.
+    """
+    # Um print por requisição mediria o terminal, não o servidor
+    sys.stdout = open(os.devnull, 'w')
+    if mode == 'async':
+        from async_server import AsyncFileServer
+        server = AsyncFileServer('127.0.0.1', 0, max_workers=workers, shared_folder=folder)
+    else:
+        from file_server import FileServer
+        server = FileServer('127.0.0.1', 0, shared_folder=folder)
+    server.fsync_policy = fsync
+    server.zero_copy = zero_copy
+    if cache_mb:
+        from file_cache import DEFAULT_MAX_FILE_SIZE, DEFAULT_MAP_MAX_SIZE
+        server.enable_file_cache(cache_mb * 1024 * 1024, DEFAULT_MAX_FILE_SIZE,
+                                 DEFAULT_MAP_MAX_SIZE)
+    threading.Thread(target=server.start_server, daemon=True).start()
+
+    deadline = time.monotonic() + 10
+    while not server.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pipe.send(server.port if server.running else None)
+
+    while True:
+        command = pipe.recv()
+        pipe.send(time.process_time())
+        if command == 'stop':
+            server.stop_server()
+            return
+
+
+class Session:
+    def __init__(self, address):
+        """Conexão de um cliente simulado com o servidor"""
+        self.socket = socket.create_connection(address, timeout=60)
+        self.conn = FrameConnection(self.socket)
+        self.next_request_id = 0
+
+    def new_request_id(self):
+        """Gera o id da próxima requisição"""
+        self.next_request_id = (self.next_request_id + 1) & 0xFFFFFFFF
+        return self.next_request_id
+
+    def receive_response(self, request_id):
+        """Lê a resposta da requisição (o cliente não usa pipeline)"""
+        message = self.conn.recv_message(FRAME_RESPONSE)
+        if message is None:
+            raise ConnectionError("Servidor fechou a conexão")
+        response_id, response = message
+        if response_id != request_id:
+            raise ConnectionError(f"Resposta inesperada: {response_id} != {request_id}")
+        return response
+
+    def call(self, request):
+        """Envia uma requisição e espera a resposta"""
+        request_id = self.new_request_id()
+        self.conn.send_json(FRAME_REQUEST, request_id, request)
+        return self.receive_response(request_id)
+
+    def close(self):
+        """Fecha a conexão"""
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+class Discard:
+    """Destino dos downloads: conta os bytes e joga fora"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        return len(data)
+
+
+class SimulatedClient:
+    def __init__(self, index, address, options, payload, seed_names, results):
+        """
+        Cliente simulado: sorteia ações e as executa numa conexão própria
+
+        Args:
+            index (int): Número do cliente (nomes dos uploads)
+            address (tuple): (host, porta) do servidor
+            options: Opções da linha de comando
+            payload (bytes): Dados dos uploads
+            seed_names (list): Arquivos criados antes do teste
+            results (BenchResults): Onde as medidas são registradas
+        """
+        self.index = index
+        self.address = address
+        self.options = options
+        self.payload = payload
+        self.seed_names = seed_names
+        self.results = results
+        self.rng = random.Random(options.seed * 1000003 + index)
+        self.actions, self.action_weights = zip(*options.mix)
+        self.sizes, self.size_weights = zip(*options.sizes)
+        self.codec = options.compression
+        self.own = []  # Arquivos enviados por este cliente e ainda não deletados
+        self.uploads = 0
+        self.session = None
+
+    def run(self, start, deadline):
+        """Executa ações até o prazo (só mede depois do aquecimento)"""
+        self.session = Session(self.address)
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    return
+                action = self.rng.choices(self.actions, self.action_weights)[0]
+                try:
+                    action, nbytes = self.perform(action)
+                    ok = True
+                except (OSError, ConnectionError, ProtocolError, ValueError) as e:
+                    nbytes = 0
+                    ok = False
+                    self.results.error(action, e)
+                    self.session.close()
+                    self.session = Session(self.address)
+                finished = time.perf_counter()
+                if now >= start:
+                    self.results.record(action, finished - now, nbytes, ok)
+        finally:
+            self.session.close()
+
+    def perform(self, action):
+        """
+        Executa uma ação
+
+        Returns:
+            tuple: (ação realmente executada, bytes de conteúdo transferidos)
+        """
+        if action == 'delete' and not self.own:
+            action = 'upload'  # Nada para deletar ainda
+        if action == 'download' and not (self.seed_names or self.own):
+            action = 'list'
+        return action, getattr(self, action)()
+
+    def check(self, response):
+        """Transforma uma resposta de erro em exceção"""
+        if response.get('status') != 'success':
+            raise ValueError(response.get('message', 'erro do servidor'))
+        return response
+
+    def list(self):
+        self.check(self.session.call({'action': 'list_files', 'limit': self.options.list_limit}))
+        return 0
+
+    def upload(self):
+        size = self.rng.choices(self.sizes, self.size_weights)[0]
+        self.uploads += 1
+        filename = f"bench_{self.index}_{self.uploads}.bin"
+        request = {
+            'action': 'upload_file',
+            'filename': filename,
+            'filesize': size,
+            'compression': self.codec,
+            'checksum': self.options.checksum
+        }
+        conn = self.session.conn
+        request_id = self.session.new_request_id()
+        source = io.BytesIO(self.payload)
+        hasher = BlockHasher() if self.options.checksum else None
+        with conn.send_lock:
+            conn.send_json(FRAME_REQUEST, request_id, request)
+            send_stream(conn, request_id, HashingReader(source, hasher) if hasher else source,
+                        0, size, self.codec)
+            if hasher:
+                conn.send_json(FRAME_REQUEST, request_id, {'blocks': hasher.finish()})
+        self.check(self.session.receive_response(request_id))
+        self.own.append(filename)
+        return size
+
+    def download(self):
+        filename = self.rng.choice(self.seed_names + self.own)
+        request_id = self.session.new_request_id()
+        self.session.conn.send_json(FRAME_REQUEST, request_id, {
+            'action': 'download_file',
+            'filename': filename,
+            'compression': [self.codec] if self.codec else None,
+            'checksum': self.options.checksum
+        })
+        response = self.check(self.session.receive_response(request_id))
+        sink = Discard()
+        receive_stream(self.session.conn, sink, response.get('compression'))
+        if response.get('blocks_trailer'):
+            self.check(self.session.receive_response(request_id))
+        if sink.bytes != response['length']:
+            raise ValueError(f"Download incompleto: {sink.bytes} de {response['length']}")
+        return sink.bytes
+
+    def delete(self):
+        filename = self.own.pop(self.rng.randrange(len(self.own)))
+        self.check(self.session.call({'action': 'delete_file', 'filename': filename}))
+        return 0
+
+
+class BenchResults:
+    def __init__(self):
+        """Medidas de todos os clientes (protegidas por um lock)"""
+        self.lock = threading.Lock()
+        self.latencies = {action: [] for action in ACTIONS}
+        self.bytes = {action: 0 for action in ACTIONS}
+        self.errors = {action: 0 for action in ACTIONS}
+        self.error_samples = []
+
+    def record(self, action, seconds, nbytes, ok):
+        """Registra uma ação medida"""
+        with self.lock:
+            if ok:
+                self.latencies[action].append(seconds)
+                self.bytes[action] += nbytes
+
+    def error(self, action, exc):
+        """Registra uma ação que falhou"""
+        with self.lock:
+            self.errors[action] += 1
+            if len(self.error_samples) < 10:
+                self.error_samples.append(f"{action}: {exc}")
+
+
+def create_seed_files(folder, count, options, payload):
+    """
+    Cria os arquivos iniciais disponíveis para download
+
+    Returns:
+        list: Nomes dos arquivos criados
+    """
+    rng = random.Random(options.seed)
+    sizes, weights = zip(*options.sizes)
+    names = []
+    for i in range(count):
+        name = f"seed_{i:05d}.bin"
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(memoryview(payload)[:rng.choices(sizes, weights)[0]])
+        names.append(name)
+    return names
+
+
+def git_revision():
+    """Commit do código medido, se estiver num repositório git"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(options):
+    """
+    Executa o teste de carga
+
+    Returns:
+        dict: Resultado completo (o mesmo gravado em JSON)
+    """
+    folder = tempfile.mkdtemp(prefix='bench_server_')
+    parent_pipe, child_pipe = multiprocessing.Pipe()
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(child_pipe, folder, options.mode, options.workers, options.fsync,
+              not options.no_sendfile, options.cache_mb),
+        daemon=True
+    )
+    try:
+        largest = max(size for size, _ in options.sizes)
+        payload = make_payload(largest, options.data)
+        seed_names = create_seed_files(folder, options.files, options, payload)
+
+        server.start()
+        port = parent_pipe.recv()
+        if port is None:
+            raise RuntimeError("O servidor não iniciou")
+        address = ('127.0.0.1', port)
+
+        results = BenchResults()
+        clients = [SimulatedClient(i, address, options, payload, seed_names, results)
+                   for i in range(options.clients)]
+        begin = time.perf_counter()
+        start = begin + options.warmup
+        deadline = start + options.duration
+        threads = [threading.Thread(target=client.run, args=(start, deadline), daemon=True)
+                   for client in clients]
+        for thread in threads:
+            thread.start()
+
+        # Marca a CPU no fim do aquecimento
+        time.sleep(max(0.0, start - time.perf_counter()))
+        parent_pipe.send('mark')
+        server_cpu_start = parent_pipe.recv()
+        client_cpu_start = time.process_time()
+
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        client_cpu = time.process_time() - client_cpu_start
+        parent_pipe.send('stop')
+        server_cpu = parent_pipe.recv() - server_cpu_start
+        server.join(5)
+    finally:
+        if server.is_alive():
+            server.terminate()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return build_report(options, results, elapsed, server_cpu, client_cpu)
+
+
+def build_report(options, results, elapsed, server_cpu, client_cpu):
+    """Monta o resultado em formato de dicionário (pronto para JSON)"""
+    all_latencies = [seconds for action in ACTIONS for seconds in results.latencies[action]]
+    total_bytes = sum(results.bytes.values())
+    requests = len(all_latencies)
+    gigabytes = total_bytes / GB
+    return {
+        'version': RESULT_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'config': {
+            'mode': options.mode,
+            'workers': options.workers,
+            'clients': options.clients,
+            'duration': options.duration,
+            'warmup': options.warmup,
+            'mix': {action: weight for action, weight in options.mix},
+            'sizes': {str(size): weight for size, weight in options.sizes},
+            'files': options.files,
+            'data': options.data,
+            'compression': options.compression,
+            'checksum': options.checksum,
+            'fsync': options.fsync,
+            'sendfile': not options.no_sendfile,
+            'cache_mb': options.cache_mb,
+            'seed': options.seed
+        },
+        'elapsed': elapsed,
+        'requests': requests,
+        'errors': sum(results.errors.values()),
+        'error_samples': results.error_samples,
+        'throughput': {
+            'requests_per_s': requests / elapsed,
+            'mb_per_s': total_bytes / MB / elapsed
+        },
+        'bytes': total_bytes,
+        'latency': summarize(all_latencies),
+        'actions': {
+            action: dict(summarize(results.latencies[action]),
+                         bytes=results.bytes[action], errors=results.errors[action])
+            for action in ACTIONS
+        },
+        'cpu': {
+            'server_s': server_cpu,
+            'client_s': client_cpu,
+            'server_s_per_gb': server_cpu / gigabytes if gigabytes else None,
+            'client_s_per_gb': client_cpu / gigabytes if gigabytes else None
+        }
+    }
+
+
+def format_ms(value):
+    """Latência em ms para a tabela (traço se não houve medida)"""
+    return f"{value:9.2f}" if value is not None else f"{'-':>9}"
+
+
+def print_report(report):
+    """Mostra o resultado no terminal"""
+    config = report['config']
+    print("=" * 50)
+    print(f"📊 TESTE DE CARGA ({config['mode']}, {config['clients']} clientes, "
+          f"{report['elapsed']:.1f} s)")
+    print("=" * 50)
+    throughput = report['throughput']
+    print(f"Requisições: {report['requests']} ({throughput['requests_per_s']:.1f}/s), "
+          f"erros: {report['errors']}")
+    print(f"Vazão: {throughput['mb_per_s']:.1f} MB/s ({report['bytes'] / MB:.1f} MB)")
+    cpu = report['cpu']
+    line = f"CPU: servidor {cpu['server_s']:.2f} s, clientes {cpu['client_s']:.2f} s"
+    if cpu['server_s_per_gb'] is not None:
+        line += f" (servidor {cpu['server_s_per_gb']:.2f} s/GB)"
+    print(line)
+    print()
+    print(f"{'ação':>9} {'qtde':>7} {'p50 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9} {'máx ms':>9}")
+    for name, summary in list(report['actions'].items()) + [('total', report['latency'])]:
+        if not summary['count'] and name != 'total':
+            continue
+        print(f"{name:>9} {summary['count']:>7} {format_ms(summary.get('p50_ms'))} "
+              f"{format_ms(summary.get('p99_ms'))} {format_ms(summary.get('p999_ms'))} "
+              f"{format_ms(summary.get('max_ms'))}")
+    for sample in report['error_samples']:
+        print(f"⚠️ {sample}")
+
+
+# Métricas comparadas com --compare: (caminho no JSON, maior é melhor)
+COMPARED_METRICS = (
+    (('throughput', 'requests_per_s'), True),
+    (('throughput', 'mb_per_s'), True),
+    (('latency', 'p50_ms'), False),
+    (('latency', 'p99_ms'), False),
+    (('latency', 'p999_ms'), False),
+    (('cpu', 'server_s_per_gb'), False),
+    (('errors',), False)
+)
+
+
+def lookup(report, path):
+    """Valor de um caminho do JSON (None se ausente)"""
+    for key in path:
+        if not isinstance(report, dict):
+            return None
+        report = report.get(key)
+    return report
+
+
+def print_comparison(baseline, report):
+    """Mostra a variação das métricas principais em relação a uma execução anterior"""
+    print()
+    print(f"📈 Comparação com {baseline.get('timestamp')} "
+          f"(git {baseline.get('environment', {}).get('git')})")
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = lookup(baseline, path), lookup(report, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        mark = '✅' if better and abs(change) >= 5 else '❌' if abs(change) >= 5 else '  '
+        print(f"{mark} {'.'.join(path):>26}: {old:12.2f} → {new:12.2f} ({change:+.1f}%)")
+
+
+def parse_args(argv=None):
+    """Lê as opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Teste de carga do servidor de arquivos")
+    parser.add_argument('--mode', choices=['thread', 'async'], default='thread',
+                        help="Modo do servidor")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Requisições usando disco e CPU ao mesmo tempo no modo async")
+    parser.add_argument('--clients', type=int, default=8, help="Clientes simultâneos")
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help="Segundos medidos (depois do aquecimento)")
+    parser.add_argument('--warmup', type=float, default=1.0,
+                        help="Segundos iniciais fora da medida")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('list=50,upload=20,download=25,delete=5'),
+                        help="Pesos das ações, ex.: list=50,upload=20,download=25,delete=5")
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('4K:60,256K:30,8M:10'),
+                        help="Pesos dos tamanhos de arquivo, ex.: 4K:60,1M:30,64M:10")
+    parser.add_argument('--files', type=int, default=100,
+                        help="Arquivos criados no servidor antes do teste")
+    parser.add_argument('--list-limit', type=int, default=100,
+                        help="Tamanho da página pedida nas listagens")
+    parser.add_argument('--data', choices=['random', 'text'], default='random',
+                        help="Conteúdo dos arquivos: incompressível ou texto")
+    parser.add_argument('--compression', choices=available_codecs(), default=None,
+                        help="Codec usado nos uploads e oferecido nos downloads")
+    parser.add_argument('--checksum', action='store_true',
+                        help="Confere checksums dos blocos nas transferências")
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC_NONE,
+                        help="Política de fsync dos uploads no servidor")
+    parser.add_argument('--no-sendfile', action='store_true',
+                        help="Desativa o envio sem cópia no servidor")
+    parser.add_argument('--cache-mb', type=int, default=64,
+                        help="Cache de arquivos do servidor em MB (0 desativa)")
+    parser.add_argument('--seed', type=int, default=1, help="Semente dos sorteios")
+    parser.add_argument('--json', metavar='ARQUIVO', help="Grava o resultado em JSON")
+    parser.add_argument('--compare', metavar='ARQUIVO',
+                        help="JSON de uma execução anterior para comparar")
+    return parser.parse_args(argv)
+
+
+def main():
+    """Função principal do teste de carga"""
+    options = parse_args()
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report = run_benchmark(options)
+    print_report(report)
+    if baseline:
+        print_comparison(baseline, report)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultado gravado em {options.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - DEDUPLICAÇÃO
+Divisão de arquivos em pedaços definidos pelo conteúdo e armazenamento
+endereçado pelo hash de cada pedaço
+
+As fronteiras dos pedaços vêm de um hash rolante (gear hash): inserir ou
+remover bytes num ponto do arquivo só muda os pedaços vizinhos, então uma
+nova versão de um arquivo grande reaproveita quase todos os pedaços da
+anterior. Cliente e servidor usam a mesma tabela e os mesmos tamanhos.
+
+Os pedaços são uma cópia: o arquivo montado continua inteiro na pasta
+compartilhada, então o armazenamento ocupa disco além dos arquivos. O ganho
+está nos bytes transferidos, e só arquivos até um tamanho máximo entram.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+# Tamanhos dos pedaços (mínimo, médio e máximo)
+MIN_CHUNK_SIZE = 16 * 1024
+AVG_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+
+# Bloco de leitura do arquivo ao dividir em pedaços
+READ_SIZE = 1024 * 1024
+
+# Versões anteriores de cada arquivo mantidas nas receitas
+HISTORY_SIZE = 5
+
+_MASK64 = (1 << 64) - 1
+
+# Tabela do gear hash: derivada de SHA-256 para ser igual em qualquer máquina
+GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big')
+    for i in range(256)
+]
+
+
+def _boundary_mask(avg_size):
+    """Máscara com log2(avg_size) bits altos: corta em média a cada avg_size bytes"""
+    bits = max(1, avg_size.bit_length() - 1)
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def find_boundary(data, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE,
+                  mask=_boundary_mask(AVG_CHUNK_SIZE)):
+    """
+    Encontra o fim do primeiro pedaço em `data`
+
+    Args:
+        data (bytes): Dados a partir do início do pedaço
+
+    Returns:
+        int: Tamanho do pedaço
+    """
+    n = len(data)
+    if n <= min_size:
+        return n
+    end = min(n, max_size)
+    gear = GEAR
+    h = 0
+    # O hash só "lembra" os últimos 64 bytes: começa pouco antes do mínimo
+    for i in range(max(0, min_size - 64), min_size):
+        h = ((h << 1) + gear[data[i]]) & _MASK64
+    for i in range(min_size, end):
+        h = ((h << 1) + gear[data[i]]) & _MASK64
+        if not h & mask:
+            return i + 1
+    return end
+
+
+def iter_chunks(f, min_size=MIN_CHUNK_SIZE, avg_size=AVG_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE):
+    """
+    Divide um arquivo aberto em pedaços definidos pelo conteúdo
+
+    Args:
+        f: Arquivo aberto em modo binário
+
+    Yields:
+        tuple: (offset, bytes do pedaço)
+    """
+    mask = _boundary_mask(avg_size)
+    buffer = bytearray()
+    offset = 0
+    eof = False
+    while True:
+        while not eof and len(buffer) < max_size:
+            data = f.read(READ_SIZE)
+            if not data:
+                eof = True
+            else:
+                buffer += data
+        if not buffer:
+            return
+        cut = find_boundary(buffer, min_size, max_size, mask)
+        chunk = bytes(buffer[:cut])
+        del buffer[:cut]
+        yield offset, chunk
+        offset += cut
+
+
+def chunk_digest(data):
+    """Hash que identifica um pedaço"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_recipe(path):
+    """
+    Calcula a receita (lista de pedaços) de um arquivo local
+
+    Returns:
+        list: Lista de [hash, tamanho, offset]
+    """
+    with open(path, 'rb') as f:
+        return [[chunk_digest(chunk), len(chunk), offset] for offset, chunk in iter_chunks(f)]
+
+
+class ChunkStore:
+    def __init__(self, folder):
+        """
+        Armazena pedaços únicos e as receitas que montam cada arquivo
+
+        Args:
+            folder (Path): Pasta do armazenamento (dentro da pasta compartilhada)
+        """
+        self.folder = Path(folder)
+        self.chunks_folder = self.folder / "chunks"
+        self.recipes_folder = self.folder / "recipes"
+        self.chunks_folder.mkdir(parents=True, exist_ok=True)
+        self.recipes_folder.mkdir(parents=True, exist_ok=True)
+
+    # === PEDAÇOS ===
+
+    def chunk_path(self, digest):
+        """Caminho de um pedaço (dois níveis para não lotar um diretório)"""
+        if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+            raise ValueError(f'Hash de pedaço inválido: {digest!r}')
+        return self.chunks_folder / digest[:2] / digest
+
+    def has(self, digest):
+        """Indica se o pedaço já está armazenado"""
+        return self.chunk_path(digest).exists()
+
+    def missing(self, digests):
+        """
+        Lista os pedaços ausentes, sem repetição e na ordem em que aparecem
+
+        Args:
+            digests: Hashes dos pedaços
+
+        Returns:
+            list: Hashes que o armazenamento não tem
+        """
+        seen = set()
+        result = []
+        for digest in digests:
+            if digest not in seen:
+                seen.add(digest)
+                if not self.has(digest):
+                    result.append(digest)
+        return result
+
+    def put(self, digest, data):
+        """
+        Guarda um pedaço depois de conferir o hash
+
+        Raises:
+            ValueError: Se o conteúdo não corresponde ao hash
+        """
+        if chunk_digest(data) != digest:
+            raise ValueError(f'Pedaço corrompido: {digest}')
+        path = self.chunk_path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp_')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def add_file(self, path):
+        """
+        Divide um arquivo existente e guarda os pedaços que faltam
+
+        Returns:
+            list: Receita do arquivo ([hash, tamanho] de cada pedaço)
+        """
+        chunks = []
+        with open(path, 'rb') as f:
+            for _, data in iter_chunks(f):
+                digest = chunk_digest(data)
+                if not self.has(digest):
+                    self.put(digest, data)
+                chunks.append([digest, len(data)])
+        return chunks
+
+    def assemble(self, chunks, dest_path, temp_folder):
+        """
+        Monta um arquivo a partir dos pedaços e o publica atomicamente
+
+        Args:
+            chunks (list): Receita ([hash, tamanho] de cada pedaço)
+            dest_path (Path): Arquivo final
+            temp_folder (Path): Pasta para o arquivo temporário
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=temp_folder, prefix='.assemble_')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for digest, size in chunks:
+                    with open(self.chunk_path(digest), 'rb') as f:
+                        data = f.read()
+                    if len(data) != size:
+                        raise ValueError(f'Tamanho inesperado do pedaço {digest}')
+                    out.write(data)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # === RECEITAS ===
+
+    def recipe_path(self, filename):
+        """Caminho da receita de um arquivo"""
+        return self.recipes_folder / f"{filename}.json"
+
+    def load_recipe(self, filename):
+        """Lê a receita de um arquivo (None se não existir)"""
+        try:
+            return json.loads(self.recipe_path(filename).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def save_recipe(self, filename, chunks, validator):
+        """
+        Grava a receita atual e guarda a anterior no histórico
+
+        Args:
+            filename (str): Nome do arquivo
+            chunks (list): [hash, tamanho] de cada pedaço
+            validator (str): Validador do arquivo montado (ver file_validator)
+        """
+        previous = self.load_recipe(filename)
+        history = []
+        if previous:
+            if previous.get('chunks') != chunks:
+                history.append(previous['chunks'])
+            history.extend(previous.get('history', []))
+        recipe = {
+            'validator': validator,
+            'filesize': sum(size for _, size in chunks),
+            'chunks': chunks,
+            'history': history[:HISTORY_SIZE]
+        }
+        path = self.recipe_path(filename)
+        fd, tmp_path = tempfile.mkstemp(dir=self.recipes_folder, prefix='.tmp_')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(recipe, f)
+        os.replace(tmp_path, path)
+
+    def remove_recipe(self, filename):
+        """Apaga a receita (os pedaços só saem na coleta de lixo)"""
+        self.recipe_path(filename).unlink(missing_ok=True)
+
+    def collect_garbage(self):
+        """
+        Apaga pedaços que nenhuma receita (nem o histórico) usa
+
+        Returns:
+            int: Quantidade de pedaços apagados
+        """
+        referenced = set()
+        for recipe_path in self.recipes_folder.glob('*.json'):
+            try:
+                recipe = json.loads(recipe_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            for chunks in [recipe.get('chunks', [])] + recipe.get('history', []):
+                referenced.update(digest for digest, _ in chunks)
+
+        removed = 0
+        for chunk_path in self.chunks_folder.glob('*/*'):
+            if chunk_path.name not in referenced:
+                chunk_path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+class ChunkIndexer:
+    def __init__(self, store, validator, max_file_size):
+        """
+        Divide em pedaços, numa thread própria, os arquivos já publicados
+
+        Dividir custa alguns segundos por dezena de MB, então a requisição
+        não espera: o arquivo entra numa fila (uma vez só, mesmo se pedido de
+        novo antes da vez dele) e a receita fica pronta para o próximo envio.
+
+        Args:
+            store (ChunkStore): Armazenamento dos pedaços
+            validator: Função que identifica a versão de um arquivo pelo stat
+            max_file_size (int): Maior arquivo dividido (os demais são ignorados)
+        """
+        self.store = store
+        self.validator = validator
+        self.max_file_size = max_file_size
+        self.pending = {}  # Nome -> caminho, na ordem de chegada
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def is_current(self, filename, stat):
+        """Indica se a receita guardada corresponde a esta versão do arquivo"""
+        recipe = self.store.load_recipe(filename)
+        return bool(recipe) and recipe.get('validator') == self.validator(stat)
+
+    def schedule(self, filename, path):
+        """
+        Coloca um arquivo na fila se a receita dele está ausente ou velha
+
+        Returns:
+            bool: Se o arquivo ficou esperando na fila
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size > self.max_file_size or self.is_current(filename, stat):
+            return False
+        with self.condition:
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self.run, name='fileshare-chunks',
+                                               daemon=True)
+                self.thread.start()
+            self.pending[filename] = path
+            self.condition.notify()
+        return True
+
+    def stop(self):
+        """Para a thread depois do arquivo atual (sem esperar por ele)"""
+        with self.condition:
+            self.running = False
+            self.pending.clear()
+            self.condition.notify()
+
+    def run(self):
+        """Laço da thread: divide um arquivo da fila de cada vez"""
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                filename = next(iter(self.pending))
+                path = self.pending.pop(filename)
+            try:
+                self.index(filename, path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Erro ao dividir {filename} em pedaços: {e}")
+
+    def index(self, filename, path):
+        """
+        Divide um arquivo e grava a receita, se ele não mudou nesse meio tempo
+
+        Returns:
+            bool: Se a receita foi gravada
+        """
+        stat = os.stat(path)
+        if stat.st_size > self.max_file_size or self.is_current(filename, stat):
+            return False
+        print(f"🧩 Indexando pedaços de {filename}")
+        chunks = self.store.add_file(path)
+        validator = self.validator(stat)
+        if self.validator(os.stat(path)) != validator:
+            return False  # Mudou durante a leitura: a próxima versão entra na fila
+        self.store.save_recipe(filename, chunks, validator)
+        return True
@@ -0,0 +1,1145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - BIBLIOTECA DO CLIENTE
+Toda a conversa com o servidor, sem interface gráfica
+
+`FileShareClient` lista, envia, baixa e deleta arquivos reaproveitando
+conexões de um pool: uma transferência que termina bem devolve a conexão,
+e a próxima operação a usa sem abrir outro socket. Os métodos bloqueiam e
+podem ser chamados de várias threads ao mesmo tempo (cada chamada usa a sua
+conexão). `AsyncFileShareClient` oferece os mesmos métodos como corrotinas,
+rodando o cliente síncrono num pool de threads.
+
+A interface gráfica (file_client.py) e a linha de comando
+(fileshare_cli.py) são camadas finas sobre este módulo.
+
+Uso em scripts:
+    with FileShareClient(('localhost', 8888)) as client:
+        client.upload(Path('relatorio.pdf'))
+        for info in client.list_files(prefix='rel'):
+            print(info['name'], info['size'])
+"""
+
+import asyncio
+import functools
+import itertools
+import os
+import select
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from protocol import FrameConnection, FRAME_REQUEST, FRAME_RESPONSE, NOTICE_ID, parse_address
+from compression import available_codecs, negotiate, send_stream
+from parallel_download import download_segmented, DownloadError
+from download_cache import server_key
+from chunk_store import file_recipe
+from hash_cache import BlockHasher, HashingReader, BLOCK_SIZE, CHECKSUM_ALGORITHM
+from archive import FolderSink, send_archive, receive_archive, valid_name
+
+# Tentativas de uma transferência antes de desistir (reconectando entre elas)
+MAX_RETRIES = 3
+
+# Arquivos pedidos por página ao listar
+LIST_PAGE_SIZE = 5000
+
+# Itens por página da busca (o servidor aceita até 1000)
+SEARCH_PAGE_SIZE = 1000
+
+# Requisições enviadas sem esperar resposta (pipeline)
+PIPELINE_WINDOW = 128
+
+# Conexões ociosas guardadas para reaproveitar
+POOL_SIZE = 8
+
+# Na sincronização, arquivos até este tamanho vão juntos num lote
+MIRROR_BATCH_MAX = 1024 * 1024
+
+# Diferença de data de modificação tolerada na sincronização (segundos)
+MTIME_TOLERANCE = 1.0
+
+# Espera antes de reabrir a conexão de uma assinatura que caiu (segundos)
+RECONNECT_DELAY = 2.0
+
+# Leituras distribuídas entre as réplicas anunciadas pelo servidor (ver replication.py)
+REPLICAS_AUTO = 'auto'
+
+# Tempo que uma réplica que falhou fica fora do rodízio (segundos)
+REPLICA_RETRY = 30.0
+
+
+def format_size(size):
+    """Formata tamanho do arquivo para exibição"""
+    if size < 1024:
+        return f"{size:.0f} B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    else:
+        return f"{size / (1024 * 1024):.1f} MB"
+
+
+class ClientError(Exception):
+    """Erro informado pelo servidor numa resposta"""
+
+
+class ServerConnection:
+    def __init__(self, address, timeout=10):
+        """
+        Uma conexão com o servidor e o estado das suas requisições
+
+        Args:
+            address (tuple): (host, porta) do servidor
+            timeout (float): Timeout do socket
+        """
+        self.address = address
+        self.timeout = timeout
+        self.socket = None
+        self.conn = None  # Conexão com frames sobre o socket
+        self.next_request_id = 0
+        self.pending_responses = {}  # Respostas que chegaram antes de serem pedidas
+
+    def connect(self):
+        """Abre a conexão"""
+        self.socket = socket.create_connection(self.address, timeout=self.timeout)
+        self.conn = FrameConnection(self.socket)
+        self.pending_responses = {}
+
+    def reconnect(self):
+        """Reabre a conexão com o mesmo servidor"""
+        self.close()
+        self.connect()
+
+    def close(self):
+        """Fecha a conexão"""
+        if self.socket:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+            self.conn = None
+
+    def new_request_id(self):
+        """Gera o id da próxima requisição (nunca NOTICE_ID)"""
+        self.next_request_id = self.next_request_id % 0xFFFFFFFF + 1
+        return self.next_request_id
+
+    def is_stale(self):
+        """
+        Indica se uma conexão ociosa foi encerrada pelo servidor
+
+        Uma conexão sem requisições pendentes não deveria ter nada para
+        ler: dados ou fim de conexão significam que o servidor a fechou
+        (ex.: por ociosidade).
+        """
+        if self.socket is None:
+            return True
+        try:
+            readable, _, _ = select.select([self.socket], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def receive_response(self, request_id):
+        """
+        Lê a resposta de uma requisição
+
+        Args:
+            request_id (int): Id da requisição enviada
+
+        Returns:
+            dict: Resposta do servidor
+        """
+        if request_id in self.pending_responses:
+            return self.pending_responses.pop(request_id)
+        while True:
+            message = self.conn.recv_message(FRAME_RESPONSE)
+            if message is None:
+                raise ConnectionError("Servidor fechou a conexão")
+            response_id, response = message
+            if response_id == request_id:
+                return response
+            if response_id == NOTICE_ID:
+                # Aviso do servidor, ex.: conexão recusada por excesso de conexões
+                raise ClientError(response.get('message', 'Conexão recusada pelo servidor'))
+            # Resposta de outra requisição em pipeline: guarda para depois
+            self.pending_responses[response_id] = response
+
+    def call(self, request):
+        """
+        Envia uma requisição e espera a resposta (erros viram exceções)
+
+        Args:
+            request (dict): Requisição a ser enviada
+
+        Returns:
+            dict: Resposta do servidor
+        """
+        request_id = self.new_request_id()
+        self.conn.send_json(FRAME_REQUEST, request_id, request)
+        return self.receive_response(request_id)
+
+    def pipeline(self, requests, window=PIPELINE_WINDOW):
+        """
+        Envia várias requisições sem esperar cada resposta
+
+        As requisições saem em lotes (uma escrita por lote) e no máximo
+        `window` ficam sem resposta, o que mantém o volume em trânsito dentro
+        dos buffers dos sockets. O servidor atende na ordem, então centenas
+        de requisições pequenas custam poucas idas e voltas.
+
+        Args:
+            requests (list): Requisições a enviar
+            window (int): Máximo de requisições aguardando resposta
+
+        Returns:
+            list: Respostas, na mesma ordem das requisições
+        """
+        request_ids = []
+        responses = []
+        while len(responses) < len(requests):
+            outstanding = len(request_ids) - len(responses)
+            if len(request_ids) < len(requests) and outstanding <= window // 2:
+                # Completa a janela com um novo lote
+                batch = requests[len(request_ids):len(request_ids) + window - outstanding]
+                messages = [(self.new_request_id(), request) for request in batch]
+                self.conn.send_json_batch(FRAME_REQUEST, messages)
+                request_ids.extend(request_id for request_id, _ in messages)
+            else:
+                responses.append(self.receive_response(request_ids[len(responses)]))
+        return responses
+
+
+class ConnectionPool:
+    def __init__(self, address, timeout=10, max_idle=POOL_SIZE):
+        """
+        Conexões com um servidor, reaproveitadas entre operações
+
+        Args:
+            address (tuple): (host, porta) do servidor
+            timeout (float): Timeout dos sockets
+            max_idle (int): Conexões ociosas guardadas; as demais são fechadas
+        """
+        self.address = address
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.lock = threading.Lock()
+        self.idle = []
+        self.opened = 0  # Conexões abertas desde o início (para estatística)
+
+    def acquire(self):
+        """Uma conexão ociosa ou uma nova"""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                session = self.idle.pop()
+            if not session.is_stale():
+                return session
+            session.close()  # Fechada pelo servidor enquanto esperava
+        session = ServerConnection(self.address, self.timeout)
+        session.connect()
+        with self.lock:
+            self.opened += 1
+        return session
+
+    def release(self, session):
+        """Devolve uma conexão que terminou a operação em um estado limpo"""
+        if session.conn is None or session.pending_responses:
+            session.close()
+            return
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(session)
+                return
+        session.close()
+
+    @contextmanager
+    def session(self):
+        """
+        Empresta uma conexão durante o bloco `with`
+
+        Se o bloco terminar com exceção a conexão é fechada: ela pode ter
+        parado no meio de um fluxo de dados.
+        """
+        session = self.acquire()
+        try:
+            yield session
+        except BaseException:
+            session.close()
+            raise
+        self.release(session)
+
+    def close(self):
+        """Fecha as conexões ociosas"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for session in idle:
+            session.close()
+
+
+class Subscription:
+    def __init__(self, address, on_events, on_resync=None, log=None, timeout=10,
+                 options=None, resume=None):
+        """
+        Recebe os eventos de mudança da pasta do servidor numa thread própria
+
+        A assinatura usa uma conexão só dela. Se a conexão cair, ela é
+        reaberta pedindo os eventos perdidos; se o servidor não os tiver
+        mais (reiniciou, por exemplo), `on_resync` é chamada para o cliente
+        reler a listagem. As funções são chamadas na thread da assinatura.
+
+        Args:
+            address (tuple): (host, porta) do servidor
+            on_events: Função que recebe cada lista de eventos (ver FileServer.subscribe)
+            on_resync: Função sem argumentos chamada quando eventos se perderam
+            log: Função que recebe as mensagens de andamento
+            timeout (float): Timeout para conectar e assinar
+            options (dict): Campos extras do pedido de assinatura
+            resume (tuple): (epoch, seq) de uma assinatura anterior: só os
+                eventos seguintes são entregues (epoch None força on_resync
+                já na primeira assinatura)
+        """
+        self.address = address
+        self.on_events = on_events
+        self.on_resync = on_resync or (lambda: None)
+        self.log = log or (lambda message: None)
+        self.timeout = timeout
+        self.options = options or {}
+        self.session = None
+        # Sequência de eventos do servidor e último evento recebido
+        self.epoch, self.seq = resume or (None, None)
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='fileshare-subscription',
+                                       daemon=True)
+
+    def start(self):
+        """Começa a receber os eventos"""
+        self.thread.start()
+
+    def run(self):
+        """Laço da thread: assina e reconecta até close()"""
+        while not self.closed.is_set():
+            try:
+                self.listen()
+            except ClientError as e:
+                self.log(f"❌ Assinatura recusada pelo servidor: {e}")
+                return
+            except Exception as e:
+                if self.closed.is_set():
+                    return
+                self.log(f"⚠️ Assinatura interrompida ({e}), reconectando...")
+            finally:
+                if self.session:
+                    self.session.close()
+            self.closed.wait(RECONNECT_DELAY)
+
+    def listen(self):
+        """Abre a conexão, assina e entrega os eventos até a conexão cair"""
+        self.session = session = ServerConnection(self.address, self.timeout)
+        session.connect()
+        request = dict(self.options, action='subscribe')
+        if self.seq is not None:
+            request.update(epoch=self.epoch, since=self.seq)
+        response = session.call(request)
+        if response.get('status') != 'success':
+            raise ClientError(response.get('message', 'Erro desconhecido'))
+        self.epoch, self.seq = response['epoch'], response['seq']
+        if response.get('resync'):
+            self.on_resync()
+        if response.get('events'):
+            self.on_events(response['events'])
+        if self.closed.is_set():
+            return
+
+        session.socket.settimeout(None)  # Eventos chegam a qualquer momento
+        while True:
+            message = session.conn.recv_message(FRAME_RESPONSE)
+            if message is None:
+                raise ConnectionError("Servidor fechou a conexão")
+            _, update = message
+            self.seq = update.get('seq', self.seq)
+            self.on_events(update.get('events', []))
+
+    def close(self):
+        """Cancela a assinatura"""
+        self.closed.set()
+        session = self.session
+        if session and session.socket:
+            try:
+                session.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(self.timeout)
+
+
+class FileShareClient:
+    def __init__(self, address, log=None, timeout=10, pool_size=POOL_SIZE, cache=None,
+                 replicas=None):
+        """
+        Cliente do servidor de arquivos
+
+        Args:
+            address (tuple): (host, porta) do servidor
+            log: Função que recebe as mensagens de andamento (padrão: nenhuma)
+            timeout (float): Timeout dos sockets
+            pool_size (int): Conexões ociosas reaproveitadas
+            cache (DownloadCache): Cópias locais para downloads condicionais
+                (None = sempre baixa tudo)
+            replicas: Réplicas que dividem as leituras (listagem, busca e
+                downloads) com o servidor: lista de (host, porta) ou
+                REPLICAS_AUTO para as anunciadas por ele (None = só o servidor)
+        """
+        self.address = address
+        self.timeout = timeout
+        self.log = log or (lambda message: None)
+        self.pool = ConnectionPool(address, timeout, pool_size)
+        self.cache = cache
+        self.replicas = replicas
+        self.replica_pools = []  # Conexões com as réplicas em uso
+        self.replica_down = {}  # Endereço -> instante em que a réplica volta ao rodízio
+        self.replica_lock = threading.Lock()
+        self.read_turn = itertools.count()  # Rodízio das leituras
+        self.server_codecs = []  # Codecs de compressão informados pelo servidor
+        self.server_checksum = False  # Servidor confere os uploads por blocos
+        self.server_dedup = False
+        self.server_dedup_max_size = None  # Maior arquivo do envio incremental
+        self.server_subscribe = False  # Servidor envia eventos de mudança
+        self.server_conditional = False  # Servidor responde downloads condicionais
+        self.server_replicas = []  # Réplicas anunciadas pelo servidor
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connect(self):
+        """
+        Abre a primeira conexão e descobre os recursos do servidor
+
+        Raises:
+            OSError: Se o servidor não responde (socket.timeout,
+                ConnectionRefusedError...)
+        """
+        self.load_server_info()
+
+    def close(self):
+        """Fecha as conexões guardadas"""
+        self.pool.close()
+        self.use_replicas([])
+
+    def load_server_info(self):
+        """Pergunta ao servidor quais codecs de compressão e checksums ele suporta"""
+        info = self.call({'action': 'server_info'})
+        if info.get('status') == 'success':
+            self.server_codecs = info.get('compression', [])
+            self.server_checksum = (info.get('checksum') == CHECKSUM_ALGORITHM
+                                    and info.get('checksum_block_size') == BLOCK_SIZE)
+            self.server_dedup = bool(info.get('dedup'))
+            self.server_dedup_max_size = info.get('dedup_max_size')
+            self.server_subscribe = bool(info.get('subscribe'))
+            self.server_conditional = bool(info.get('conditional'))
+            self.server_replicas = [parse_address(replica)
+                                    for replica in info.get('replicas') or []]
+        else:
+            self.server_codecs = []  # Servidor antigo: sem compressão
+            self.server_checksum = False
+            self.server_dedup = False
+            self.server_dedup_max_size = None
+            self.server_subscribe = False
+            self.server_conditional = False
+            self.server_replicas = []
+        if self.server_codecs:
+            self.log(f"🗜️ Compressão disponível: {', '.join(self.server_codecs)}")
+        if self.replicas == REPLICAS_AUTO:
+            self.use_replicas(self.server_replicas)
+        elif self.replicas:
+            self.use_replicas(self.replicas)
+        return info
+
+    # === RÉPLICAS ===
+
+    def use_replicas(self, addresses):
+        """
+        Define as réplicas que dividem as leituras com o servidor
+
+        Args:
+            addresses (list): (host, porta) de cada réplica
+        """
+        addresses = [tuple(address) for address in addresses
+                     if tuple(address) != tuple(self.address)]
+        with self.replica_lock:
+            current = {pool.address: pool for pool in self.replica_pools}
+            if list(current) == list(dict.fromkeys(addresses)):
+                return
+            self.replica_pools = [
+                current.pop(address, None)
+                or ConnectionPool(address, self.timeout, self.pool.max_idle)
+                for address in dict.fromkeys(addresses)
+            ]
+        for pool in current.values():
+            pool.close()
+        if self.replica_pools:
+            self.log(f"🔁 Leituras divididas com {len(self.replica_pools)} réplica(s): "
+                     + ", ".join(server_key(pool.address) for pool in self.replica_pools))
+
+    def read_pool(self):
+        """
+        Servidor da próxima leitura, em rodízio entre o principal e as réplicas
+
+        Returns:
+            ConnectionPool: Conexões do servidor escolhido
+        """
+        now = time.monotonic()
+        with self.replica_lock:
+            pools = [self.pool] + [pool for pool in self.replica_pools
+                                   if self.replica_down.get(pool.address, 0) <= now]
+            return pools[next(self.read_turn) % len(pools)]
+
+    def replica_failed(self, pool, error):
+        """Tira do rodízio, por REPLICA_RETRY, uma réplica que não respondeu"""
+        with self.replica_lock:
+            self.replica_down[pool.address] = time.monotonic() + REPLICA_RETRY
+        pool.close()
+        self.log(f"⚠️ Réplica {server_key(pool.address)} indisponível ({error}): "
+                 f"usando o servidor principal")
+
+    def upload_codec(self, compress=True):
+        """
+        Codec usado nos envios
+
+        Returns:
+            str: Primeiro codec do servidor que também existe aqui, ou None
+        """
+        return negotiate(self.server_codecs) if compress else None
+
+    def download_codecs(self, compress=True):
+        """Codecs oferecidos nos downloads (o servidor escolhe um)"""
+        return available_codecs() if compress else None
+
+    # === REQUISIÇÕES SIMPLES ===
+
+    def call(self, request, pool=None):
+        """
+        Envia uma requisição e espera a resposta, reconectando se preciso
+
+        Args:
+            request (dict): Requisição
+            pool (ConnectionPool): Servidor usado (padrão: o principal)
+
+        Returns:
+            dict: Resposta do servidor (inclusive as de erro)
+        """
+        with (pool or self.pool).session() as session:
+            return self.run_with_retries(session, lambda: session.call(request))
+
+    def read_call(self, request):
+        """
+        Requisição somente leitura: vai para o principal ou uma réplica
+
+        Uma réplica que não responde sai do rodízio e a requisição é
+        repetida no principal.
+        """
+        pool = self.read_pool()
+        if pool is not self.pool:
+            try:
+                return self.call(request, pool)
+            except OSError as e:
+                self.replica_failed(pool, e)
+        return self.call(request)
+
+    def pipeline(self, requests):
+        """
+        Envia várias requisições numa conexão sem esperar cada resposta
+
+        Returns:
+            list: Respostas, na mesma ordem das requisições
+        """
+        with self.pool.session() as session:
+            return self.run_with_retries(session, lambda: session.pipeline(requests))
+
+    def list_request(self, prefix='', sort='name', reverse=False, page_size=LIST_PAGE_SIZE):
+        """Requisição da primeira página da lista de arquivos"""
+        request = {'action': 'list_files', 'limit': page_size}
+        if prefix:
+            request['prefix'] = prefix
+        if sort != 'name' or reverse:
+            request.update(sort=sort, reverse=reverse)
+        return request
+
+    def iter_pages(self, request=None, first_page=None):
+        """
+        Percorre a lista de arquivos página por página
+
+        Args:
+            request (dict): Requisição da primeira página (ver list_request)
+            first_page (dict): Resposta da primeira página, se já foi pedida
+
+        Yields:
+            list: Arquivos de cada página
+
+        Raises:
+            ClientError: Se o servidor recusar a listagem
+        """
+        request = dict(request or self.list_request())
+        response = first_page or self.read_call(request)
+        while True:
+            if response.get('status') != 'success':
+                raise ClientError(response.get('message', 'Erro desconhecido'))
+            yield response.get('files', [])
+            if not response.get('next_cursor'):
+                return
+            # O cursor é a chave do último item: vale em qualquer réplica
+            request['cursor'] = response['next_cursor']
+            response = self.read_call(request)
+
+    def list_files(self, prefix='', sort='name', reverse=False):
+        """
+        Lista todos os arquivos do servidor
+
+        Yields:
+            dict: name, size, modified e mtime de cada arquivo
+        """
+        for files in self.iter_pages(self.list_request(prefix, sort, reverse)):
+            yield from files
+
+    def search(self, sort='name', reverse=False, page_size=SEARCH_PAGE_SIZE, **filters):
+        """
+        Busca arquivos no índice do servidor
+
+        Args:
+            sort (str): 'name', 'size' ou 'modified'
+            reverse (bool): Ordem decrescente
+            page_size (int): Itens por página
+            **filters: prefix, glob, extensions, min_size, max_size,
+                modified_after e modified_before (ver FileServer.search)
+
+        Yields:
+            dict: name, size, modified, mtime, extension e checksum de cada arquivo
+        """
+        request = {'action': 'search', 'limit': page_size, 'sort': sort, 'reverse': reverse}
+        request.update((key, value) for key, value in filters.items() if value is not None)
+        for files in self.iter_pages(request):
+            yield from files
+
+    def subscribe(self, on_events, on_resync=None):
+        """
+        Assina os eventos de mudança da pasta do servidor
+
+        Args:
+            on_events: Função que recebe cada lista de eventos; cada evento
+                tem `event` (added, modified ou deleted), `name` e, exceto
+                nas remoções, os campos da listagem (size, mtime, modified)
+            on_resync: Função chamada quando eventos se perderam e a
+                listagem deve ser relida
+
+        Returns:
+            Subscription: Assinatura já iniciada (close() para cancelar)
+        """
+        subscription = Subscription(self.address, on_events, on_resync, self.log, self.timeout)
+        subscription.start()
+        return subscription
+
+    def stat(self, filename, checksum=False):
+        """
+        Dados de um arquivo do servidor
+
+        Returns:
+            dict: Resposta do servidor (size, mtime, validator e checksum)
+        """
+        return self.call({'action': 'stat_file', 'filename': filename, 'checksum': checksum})
+
+    def delete_files(self, filenames):
+        """
+        Deleta arquivos do servidor (todas as deleções em pipeline)
+
+        Returns:
+            list: Pares (nome, resposta)
+        """
+        requests = [{'action': 'delete_file', 'filename': filename} for filename in filenames]
+        return list(zip(filenames, self.pipeline(requests)))
+
+    # === ENVIO ===
+
+    def upload(self, file_path, codec=None, dedup=False, progress=None):
+        """
+        Envia um arquivo, retomando se a conexão cair
+
+        Args:
+            file_path (Path): Arquivo local (o nome no servidor é o mesmo)
+            codec (str): Codec de compressão negociado (ver upload_codec) ou None
+            dedup (bool): Tenta o envio incremental primeiro
+            progress: Função chamada com (bytes enviados, total); se levantar
+                uma exceção o envio para (e pode ser retomado depois)
+
+        Returns:
+            dict: Resposta final do servidor
+        """
+        file_path = Path(file_path)
+        max_size = self.server_dedup_max_size
+        if dedup and max_size is not None and file_path.stat().st_size > max_size:
+            self.log(f"ℹ️ Envio incremental indisponível: {file_path.name} passa de "
+                     f"{max_size} bytes")
+            dedup = False
+        if dedup:
+            # Calculada uma vez só: as novas tentativas reaproveitam a receita
+            self.log(f"🧩 Calculando pedaços de {file_path.name}...")
+            recipe = file_recipe(file_path)
+        with self.pool.session() as session:
+            response = None
+            if dedup:
+                # Envia só os pedaços que o servidor ainda não tem
+                response = self.run_with_retries(
+                    session, lambda: self.dedup_transfer(session, file_path, recipe, progress))
+
+            if response is None:
+                # Quedas de conexão são retomadas de onde pararam
+                response = self.run_with_retries(
+                    session, lambda: self.upload_transfer(session, file_path, codec, progress))
+            return response
+
+    def upload_transfer(self, session, file_path, codec=None, progress=None):
+        """
+        Envia um arquivo, continuando um upload interrompido se houver
+
+        Se o servidor confere checksums, os blocos são resumidos durante a
+        leitura e os resumos vão num frame logo depois dos dados.
+
+        Args:
+            session (ServerConnection): Conexão usada
+            file_path (Path): Arquivo local
+            codec (str): Codec de compressão negociado ou None
+            progress: Função chamada com (bytes enviados, total) (opcional)
+
+        Returns:
+            dict: Resposta final do servidor
+        """
+        filename = file_path.name
+        stat = file_path.stat()
+        filesize = stat.st_size
+        source = f"{stat.st_size}:{stat.st_mtime_ns}"  # Identifica esta versão do arquivo
+        checksum = self.server_checksum
+
+        # Pergunta quanto do arquivo o servidor já tem
+        status = session.call({
+            'action': 'upload_status',
+            'filename': filename,
+            'filesize': filesize,
+            'source': source,
+            'checksum': checksum
+        })
+        offset = status.get('offset', 0) if status.get('status') == 'success' else 0
+        if offset:
+            self.log(f"↪️ Retomando envio de {filename} a partir de {offset} bytes")
+
+        # Envia informações do arquivo
+        request = {
+            'action': 'upload_file',
+            'filename': filename,
+            'filesize': filesize,
+            'offset': offset,
+            'source': source,
+            'compression': codec,
+            'checksum': checksum
+        }
+
+        sent_progress = None
+        if progress:
+            progress(offset, filesize)
+            sent_progress = lambda sent: progress(offset + sent)
+
+        request_id = session.new_request_id()
+        hasher = BlockHasher() if checksum else None
+        with open(file_path, 'rb') as f, session.conn.send_lock:
+            session.conn.send_json(FRAME_REQUEST, request_id, request)
+
+            # Envia o restante do arquivo (comprimido em pedaços, se negociado)
+            source_file = HashingReader(f, hasher) if hasher else f
+            wire_bytes = send_stream(session.conn, request_id, source_file, offset,
+                                     filesize - offset, codec, progress=sent_progress)
+            if hasher:
+                session.conn.send_json(FRAME_REQUEST, request_id,
+                                       {'blocks': hasher.finish()})
+
+        if codec and filesize > offset:
+            self.log(f"🗜️ {filename} ({codec}): {wire_bytes} de {filesize - offset} bytes pela rede")
+
+        # Recebe confirmação
+        response = session.receive_response(request_id)
+        if response.get('checksum'):
+            self.log(f"🔒 {filename} conferido: sha256 {response['checksum'][:16]}…")
+        return response
+
+    def dedup_transfer(self, session, file_path, recipe, progress=None):
+        """
+        Envio incremental: manda a receita e só os pedaços que faltam
+
+        Args:
+            session (ServerConnection): Conexão usada
+            file_path (Path): Arquivo local
+            recipe (list): Receita do arquivo ([hash, tamanho, offset], ver file_recipe)
+            progress: Função chamada com (bytes enviados, total) (opcional)
+
+        Returns:
+            dict: Resposta final do servidor ou None se o servidor não
+            suporta deduplicação (o chamador faz o upload normal)
+        """
+        filename = file_path.name
+        chunks = [[digest, size] for digest, size, _ in recipe]
+
+        status = session.call({
+            'action': 'dedup_check',
+            'filename': filename,
+            'chunks': chunks
+        })
+        if status.get('status') != 'success':
+            self.log(f"ℹ️ Envio incremental indisponível: {status.get('message')}")
+            return None
+
+        # Primeira ocorrência de cada pedaço ausente, na ordem do arquivo
+        missing = set(status['missing'])
+        sending = []
+        for digest, size, offset in recipe:
+            if digest in missing:
+                missing.discard(digest)
+                sending.append((digest, size, offset))
+
+        total = sum(size for _, size, _ in sending)
+        self.log(f"🧩 {filename}: {len(sending)} de {len(chunks)} pedaço(s) novo(s) ({total} bytes)")
+        if progress:
+            progress(0, total)
+
+        request_id = session.new_request_id()
+        with open(file_path, 'rb') as f, session.conn.send_lock:
+            session.conn.send_json(FRAME_REQUEST, request_id, {
+                'action': 'dedup_upload',
+                'filename': filename,
+                'chunks': chunks,
+                'sending': [digest for digest, _, _ in sending]
+            })
+            sent = 0
+            for digest, size, offset in sending:
+                f.seek(offset)
+                session.conn.send_data(request_id, f.read(size))
+                sent += size
+                if progress:
+                    progress(sent)
+            session.conn.send_data(request_id, b'', end=True)
+
+        return session.receive_response(request_id)
+
+    def upload_batch(self, entries, codec=None, progress=None):
+        """
+        Envia vários arquivos num único fluxo (ver archive.py)
+
+        A leitura do disco roda em paralelo com o envio, e não há uma ida e
+        volta por arquivo: o lote inteiro custa uma requisição.
+
+        Args:
+            entries (list): Pares (nome no servidor, caminho local)
+            codec (str): Codec de compressão ou None
+            progress: Função chamada com (bytes enviados, total) (opcional)
+
+        Returns:
+            dict: Resposta final do servidor
+        """
+        total = sum(Path(path).stat().st_size for _, path in entries)
+        if progress:
+            progress(0, total)
+
+        with self.pool.session() as session:
+            request_id = session.new_request_id()
+            with session.conn.send_lock:
+                session.conn.send_json(FRAME_REQUEST, request_id, {
+                    'action': 'batch_upload',
+                    'count': len(entries),
+                    'compression': codec
+                })
+                send_archive(session.conn, request_id, entries, codec, progress=progress)
+            return session.receive_response(request_id)
+
+    # === DOWNLOAD ===
+
+    def download(self, filename, save_path, streams=None, compression=None, progress=None):
+        """
+        Baixa um arquivo em paralelo, continuando um download interrompido
+
+        Arquivos grandes são divididos em intervalos baixados por conexões
+        próprias (ver parallel_download); o progresso fica em
+        `<destino>.part.json` para que a retomada só aconteça se o arquivo
+        não mudou no servidor.
+
+        Com um cache de downloads o pedido é condicional: se a versão
+        guardada continua atual, o servidor só confirma e o arquivo vem do
+        cache; senão o arquivo baixado (e conferido) entra no cache.
+
+        Com réplicas o download pode vir de qualquer uma (ver read_pool);
+        se a réplica falhar ou ainda não tiver o arquivo, ele vem do principal.
+
+        Args:
+            filename (str): Nome do arquivo no servidor
+            save_path (str): Caminho local de destino
+            streams (int): Quantidade de fluxos (None escolhe pelo tamanho)
+            compression (list): Codecs aceitos ou None
+            progress: Função chamada com (bytes baixados, total); se levantar
+                uma exceção o download para (e pode ser retomado depois)
+
+        Returns:
+            dict: Resultado do download (`cached` True se veio do cache e
+            `source` com o servidor usado)
+        """
+        server = server_key(self.address)
+        entry = None
+        if self.cache and self.server_conditional:
+            entry = self.cache.lookup(server, filename)
+
+        def fetch(address, tags=None):
+            result = download_segmented(address, filename, save_path,
+                                        streams=streams, compression=compression,
+                                        timeout=max(self.timeout, 30), progress=progress,
+                                        if_none_match=tags)
+            result['source'] = server_key(address)
+            return result
+
+        pool = self.read_pool()
+        try:
+            result = fetch(pool.address, self.cache.tags(entry) if entry else None)
+        except (OSError, DownloadError) as e:
+            if pool is self.pool:
+                raise
+            if isinstance(e, DownloadError):
+                # Réplica atrasada (arquivo novo) ou arquivo mudando nela
+                self.log(f"⚠️ {filename} na réplica {server_key(pool.address)}: {e}; "
+                         f"baixando do servidor principal")
+            else:
+                self.replica_failed(pool, e)
+            result = fetch(self.address, self.cache.tags(entry) if entry else None)
+        if result.get('not_modified'):
+            if self.cache.restore(server, filename, save_path, result['validator']):
+                self.log(f"♻️ {filename} não mudou no servidor: copiado do cache")
+                if progress:
+                    progress(result['filesize'], result['filesize'])
+                result['status'] = 'success'
+                result['cached'] = True
+                return result
+            # A cópia sumiu entre a consulta e a restauração: baixa tudo
+            result = fetch(self.address)
+        if self.cache and result.get('checksum'):
+            self.cache.store(server, filename, save_path, result['validator'],
+                             result['checksum'])
+        if progress:
+            progress(result['filesize'], result['filesize'])
+        if result['resumed_from']:
+            self.log(f"↪️ Download de {filename} retomado a partir de {result['resumed_from']} bytes")
+        if result['source'] != server:
+            self.log(f"🔁 {filename} baixado da réplica {result['source']}")
+        self.log(f"📶 {filename}: {result['streams']} fluxo(s) usado(s)")
+        if result.get('compression'):
+            self.log(f"🗜️ Compressão negociada: {result['compression']}")
+        if result.get('checksum'):
+            self.log(f"🔒 {filename} conferido: sha256 {result['checksum'][:16]}…")
+        result['status'] = 'success'
+        result['cached'] = False
+        return result
+
+    def download_batch(self, filenames, folder, compression=None, progress=None):
+        """
+        Baixa vários arquivos num único fluxo (ver archive.py)
+
+        Args:
+            filenames (list): Nomes dos arquivos no servidor
+            folder (str): Pasta local de destino
+            compression (list): Codecs aceitos ou None
+            progress: Função chamada com (bytes recebidos, total) (opcional)
+
+        Returns:
+            dict: Resultado do download
+        """
+        sink = FolderSink(folder)
+        try:
+            with self.pool.session() as session:
+                request_id = session.new_request_id()
+                session.conn.send_json(FRAME_REQUEST, request_id, {
+                    'action': 'batch_download',
+                    'filenames': filenames,
+                    'compression': compression
+                })
+                response = session.receive_response(request_id)
+                if response.get('status') != 'success':
+                    return response
+                for filename in response['missing']:
+                    self.log(f"⚠️ Arquivo não encontrado no servidor: {filename}")
+
+                if progress:
+                    progress(0, response['total_size'])
+                receive_archive(session.conn, sink, response.get('compression'),
+                                progress=progress)
+            return {
+                'status': 'success',
+                'received': sink.count,
+                'missing': response['missing']
+            }
+        finally:
+            sink.abort()
+
+    # === SINCRONIZAÇÃO ===
+
+    def plan_mirror(self, folder, delete=False):
+        """
+        Compara uma pasta local com os arquivos do servidor
+
+        Só os arquivos do primeiro nível com nomes aceitos pelo servidor
+        entram. Um arquivo é enviado se não existe no servidor, se o tamanho
+        mudou ou se o local é mais novo.
+
+        Args:
+            folder (str): Pasta local
+            delete (bool): Também lista os arquivos do servidor que não
+                existem na pasta
+
+        Returns:
+            dict: 'batch' (pequenos, vão num lote) e 'single' (grandes) com
+            caminhos a enviar, 'delete' com nomes a remover, 'unchanged' e
+            'skipped' (nomes não suportados)
+        """
+        remote = {info['name']: info for info in self.list_files()}
+        plan = {'batch': [], 'single': [], 'delete': [], 'unchanged': 0, 'skipped': []}
+        local = set()
+        with os.scandir(folder) as it:
+            entries = sorted((entry for entry in it if entry.is_file()), key=lambda e: e.name)
+        for entry in entries:
+            if not valid_name(entry.name):
+                plan['skipped'].append(entry.name)
+                continue
+            local.add(entry.name)
+            stat = entry.stat()
+            info = remote.get(entry.name)
+            if (info and info['size'] == stat.st_size
+                    and stat.st_mtime <= info.get('mtime', 0) + MTIME_TOLERANCE):
+                plan['unchanged'] += 1
+                continue
+            kind = 'batch' if stat.st_size <= MIRROR_BATCH_MAX else 'single'
+            plan[kind].append(Path(entry.path))
+        if delete:
+            plan['delete'] = sorted(name for name in remote if name not in local)
+        return plan
+
+    # === AUXILIARES ===
+
+    def run_with_retries(self, session, transfer):
+        """
+        Executa uma transferência, reconectando se a conexão cair
+
+        Args:
+            session (ServerConnection): Conexão reaberta entre as tentativas
+            transfer: Função sem argumentos que faz a transferência
+
+        Returns:
+            Resultado da transferência
+        """
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                return transfer()
+            except (ConnectionError, socket.timeout) as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                self.log(f"⚠️ Conexão interrompida ({e}), tentativa {attempt + 1} de {MAX_RETRIES}...")
+                session.reconnect()
+
+
+class AsyncFileShareClient:
+    def __init__(self, address, log=None, timeout=10, max_workers=4, cache=None,
+                 replicas=None):
+        """
+        Versão asyncio do cliente: os mesmos métodos, como corrotinas
+
+        Cada chamada roda o método síncrono num pool de threads, então
+        várias transferências aguardadas com asyncio.gather andam em
+        paralelo (até `max_workers`) e reaproveitam as conexões do pool.
+        As funções de progresso são chamadas nessas threads.
+
+        Args:
+            address (tuple): (host, porta) do servidor
+            log: Função que recebe as mensagens de andamento
+            timeout (float): Timeout dos sockets
+            max_workers (int): Operações simultâneas
+            cache (DownloadCache): Cópias locais para downloads condicionais
+            replicas: Réplicas que dividem as leituras (ver FileShareClient)
+        """
+        self.client = FileShareClient(address, log, timeout, pool_size=max_workers,
+                                      cache=cache, replicas=replicas)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='fileshare-client')
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def run(self, method, *args, **kwargs):
+        """Executa um método do cliente síncrono no pool de threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          functools.partial(method, *args, **kwargs))
+
+    async def connect(self):
+        """Ver FileShareClient.connect"""
+        await self.run(self.client.connect)
+
+    async def close(self):
+        """Espera as operações em andamento e fecha as conexões"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.executor.shutdown)
+        self.client.close()
+
+    async def call(self, request):
+        """Ver FileShareClient.call"""
+        return await self.run(self.client.call, request)
+
+    async def list_files(self, prefix='', sort='name', reverse=False):
+        """Ver FileShareClient.list_files (devolve uma lista)"""
+        return await self.run(lambda: list(self.client.list_files(prefix, sort, reverse)))
+
+    async def stat(self, filename, checksum=False):
+        """Ver FileShareClient.stat"""
+        return await self.run(self.client.stat, filename, checksum)
+
+    async def delete_files(self, filenames):
+        """Ver FileShareClient.delete_files"""
+        return await self.run(self.client.delete_files, filenames)
+
+    async def upload(self, file_path, codec=None, dedup=False, progress=None):
+        """Ver FileShareClient.upload"""
+        return await self.run(self.client.upload, file_path, codec, dedup, progress)
+
+    async def upload_batch(self, entries, codec=None, progress=None):
+        """Ver FileShareClient.upload_batch"""
+        return await self.run(self.client.upload_batch, entries, codec, progress)
+
+    async def download(self, filename, save_path, streams=None, compression=None,
+                       progress=None):
+        """Ver FileShareClient.download"""
+        return await self.run(self.client.download, filename, save_path, streams,
+                              compression, progress)
+
+    async def download_batch(self, filenames, folder, compression=None, progress=None):
+        """Ver FileShareClient.download_batch"""
+        return await self.run(self.client.download_batch, filenames, folder,
+                              compression, progress)
+
+    def upload_codec(self, compress=True):
+        """Ver FileShareClient.upload_codec"""
+        return self.client.upload_codec(compress)
+
+    def download_codecs(self, compress=True):
+        """Ver FileShareClient.download_codecs"""
+        return self.client.download_codecs(compress)
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - COMPRESSÃO
+Compressão negociada e adaptativa dos fluxos de dados
+
+O cliente oferece os codecs que conhece, em ordem de preferência, e o
+servidor escolhe o primeiro que também tem. O arquivo é comprimido em
+pedaços independentes: os primeiros servem de amostra e, se não diminuírem
+o suficiente, os seguintes vão sem compressão (com novas amostras de tempos
+em tempos). Cada frame leva FLAG_COMPRESSED quando foi comprimido.
+
+Compressão e descompressão rodam numa thread separada, ligada à thread do
+socket por uma fila curta, para que o trabalho de CPU se sobreponha ao I/O
+de rede (zlib, lzma, bz2, zstd e lz4 liberam o GIL).
+"""
+
+import bz2
+import lzma
+import queue
+import threading
+import zlib
+from collections import OrderedDict
+
+from protocol import FLAG_COMPRESSED
+from transfer import send_file_data
+
+# Tamanho de cada pedaço comprimido de forma independente (também o maior
+# frame, comprimido ou não, de um fluxo com codec)
+CHUNK_SIZE = 256 * 1024
+
+# Pedaços usados como amostra antes de decidir se vale a pena comprimir
+SAMPLE_CHUNKS = 2
+
+# Economia mínima nas amostras para manter a compressão ligada
+MIN_SAVING = 0.10
+
+# Com a compressão desligada, testa de novo a cada tantos pedaços
+RECHECK_EVERY = 64
+
+# Pedaços em trânsito entre a thread de compressão e a do socket
+PIPELINE_DEPTH = 8
+
+# Com acompanhamento de progresso, o caminho sem compressão envia frames
+# deste tamanho (cada um ainda com sendfile) em vez de um frame único
+PROGRESS_STEP = 4 * 1024 * 1024
+
+
+class StreamOverflow(ValueError):
+    """Um fluxo de dados trouxe mais bytes do que o esperado"""
+
+
+class Codec:
+    def __init__(self, name, compress, decompress):
+        """
+        Par de funções de compressão de um algoritmo
+
+        Args:
+            name (str): Nome usado na negociação
+            compress: bytes -> bytes
+            decompress: bytes -> bytes (no máximo CHUNK_SIZE)
+        """
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _oversized():
+    """Erro de um frame que não descomprime num pedaço de até CHUNK_SIZE"""
+    return ValueError(f'Frame comprimido inválido ou maior que {CHUNK_SIZE} bytes')
+
+
+def _decompress_limited(decompressor, data):
+    """
+    Descomprime um frame sem produzir mais que CHUNK_SIZE bytes
+
+    Quem envia comprime pedaços de no máximo CHUNK_SIZE: um frame que
+    passe disso é recusado antes de ocupar a memória.
+
+    Args:
+        decompressor: Descompressor incremental novo (bz2, lzma ou lz4)
+        data (bytes): Frame comprimido
+
+    Returns:
+        bytes: Pedaço descomprimido
+    """
+    chunk = decompressor.decompress(data, CHUNK_SIZE)
+    if not decompressor.eof:
+        # No limite, o fim do fluxo pode não ter sido processado ainda: mais
+        # um byte de saída quer dizer frame grande demais
+        if decompressor.decompress(b'', 1) or not decompressor.eof:
+            raise _oversized()
+    return chunk
+
+
+def _zlib_decompress(data):
+    """Como _decompress_limited; o zlib devolve a entrada não usada em unconsumed_tail"""
+    decompressor = zlib.decompressobj()
+    chunk = decompressor.decompress(data, CHUNK_SIZE)
+    if not decompressor.eof:
+        if decompressor.decompress(decompressor.unconsumed_tail, 1) or not decompressor.eof:
+            raise _oversized()
+    return chunk
+
+
+def _load_codecs():
+    """Codecs disponíveis, do mais rápido para o que mais comprime"""
+    codecs = OrderedDict()
+    try:
+        import zstandard
+
+        def zstd_decompress(data):
+            # O tamanho declarado no cabeçalho do frame não é confiável:
+            # lê no máximo um byte além do limite
+            chunk = bytearray()
+            with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                while len(chunk) <= CHUNK_SIZE:
+                    piece = reader.read(CHUNK_SIZE + 1 - len(chunk))
+                    if not piece:
+                        break
+                    chunk += piece
+            if len(chunk) > CHUNK_SIZE:
+                raise _oversized()
+            return bytes(chunk)
+
+        # Compressores do zstandard não são thread-safe: um por chamada
+        codecs['zstd'] = Codec(
+            'zstd',
+            lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+            zstd_decompress
+        )
+    except ImportError:
+        pass
+    try:
+        import lz4.frame
+        codecs['lz4'] = Codec(
+            'lz4',
+            lz4.frame.compress,
+            lambda data: _decompress_limited(lz4.frame.LZ4FrameDecompressor(), data)
+        )
+    except ImportError:
+        pass
+    codecs['zlib'] = Codec('zlib', lambda data: zlib.compress(data, 3), _zlib_decompress)
+    codecs['bz2'] = Codec(
+        'bz2',
+        lambda data: bz2.compress(data, 9),
+        lambda data: _decompress_limited(bz2.BZ2Decompressor(), data)
+    )
+    codecs['lzma'] = Codec(
+        'lzma',
+        lambda data: lzma.compress(data, preset=1),
+        lambda data: _decompress_limited(lzma.LZMADecompressor(), data)
+    )
+    return codecs
+
+
+CODECS = _load_codecs()
+
+
+def available_codecs():
+    """Nomes dos codecs disponíveis nesta instalação"""
+    return list(CODECS)
+
+
+def get_codec(name):
+    """
+    Busca um codec pelo nome
+
+    Returns:
+        Codec: Codec ou None se `name` for None
+
+    Raises:
+        ValueError: Se o codec não estiver disponível
+    """
+    if name is None:
+        return None
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f'Codec de compressão indisponível: {name}')
+
+
+def negotiate(offered):
+    """
+    Escolhe o primeiro codec oferecido que também existe aqui
+
+    Args:
+        offered (list): Codecs do outro lado, em ordem de preferência
+
+    Returns:
+        str: Nome do codec ou None (sem compressão)
+    """
+    for name in offered or []:
+        if name in CODECS:
+            return name
+    return None
+
+
+class AdaptiveCompressor:
+    def __init__(self, codec, sample_chunks=SAMPLE_CHUNKS, min_saving=MIN_SAVING,
+                 recheck_every=RECHECK_EVERY):
+        """
+        Decide pedaço a pedaço se a compressão compensa
+
+        Args:
+            codec (Codec): Codec negociado
+            sample_chunks (int): Pedaços de amostra
+            min_saving (float): Economia mínima (0.1 = 10%)
+            recheck_every (int): Intervalo de novas amostras quando desligada
+        """
+        self.codec = codec
+        self.sample_chunks = sample_chunks
+        self.min_saving = min_saving
+        self.recheck_every = recheck_every
+        self.enabled = True
+        self.sampled = 0
+        self.sample_raw = 0
+        self.sample_compressed = 0
+        self.skipped = 0  # Pedaços enviados sem compressão desde a última amostra
+
+    def encode(self, chunk):
+        """
+        Comprime um pedaço se compensar
+
+        Returns:
+            tuple: (corpo do frame, flags)
+        """
+        if not self.enabled:
+            self.skipped += 1
+            if self.skipped < self.recheck_every:
+                return chunk, 0
+            # Nova amostra de um pedaço: o conteúdo pode ter mudado
+            self.skipped = 0
+            compressed = self.codec.compress(chunk)
+            self.enabled = self.worth_it(len(chunk), len(compressed))
+        else:
+            compressed = self.codec.compress(chunk)
+            if self.sampled < self.sample_chunks:
+                self.sampled += 1
+                self.sample_raw += len(chunk)
+                self.sample_compressed += len(compressed)
+                if self.sampled == self.sample_chunks:
+                    self.enabled = self.worth_it(self.sample_raw, self.sample_compressed)
+
+        if len(compressed) < len(chunk):
+            return compressed, FLAG_COMPRESSED
+        return chunk, 0
+
+    def worth_it(self, raw, compressed):
+        """Indica se a economia observada atinge o mínimo"""
+        return 1 - compressed / max(raw, 1) >= self.min_saving
+
+
+def run_pipeline(producer, consumer):
+    """
+    Roda `producer` numa thread e `consumer` na thread atual
+
+    O produtor recebe uma função `put(item)` e o consumidor recebe cada item.
+    Exceções de qualquer lado interrompem o outro e são repassadas.
+    """
+    items = queue.Queue(maxsize=PIPELINE_DEPTH)
+    done = object()
+    stop = threading.Event()
+    error = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise InterruptedError('Pipeline interrompido')
+
+    def run():
+        try:
+            producer(put)
+        except BaseException as e:
+            error.append(e)
+        finally:
+            if not stop.is_set():
+                put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item = items.get(timeout=0.1)
+            except queue.Empty:
+                if not thread.is_alive():
+                    break
+                continue
+            if item is done:
+                break
+            consumer(item)
+    finally:
+        stop.set()
+        thread.join()
+    if error and not isinstance(error[0], InterruptedError):
+        raise error[0]
+
+
+def send_stream(conn, request_id, f, offset, count, codec_name=None, zero_copy=True,
+                progress=None):
+    """
+    Envia parte de um arquivo, comprimindo se um codec foi negociado
+
+    Sem codec, usa um único frame (com sendfile quando possível). Com
+    codec, envia um frame por pedaço, comprimidos numa thread paralela.
+    Deve ser chamado com `conn.send_lock` adquirido se outros frames
+    precisarem vir junto.
+
+    Args:
+        conn (FrameConnection): Conexão de destino
+        request_id (int): Id da requisição
+        f: Arquivo aberto em modo binário
+        offset (int): Posição inicial
+        count (int): Quantidade de bytes (descomprimidos)
+        codec_name (str): Codec negociado ou None
+        zero_copy (bool): Permite sendfile no caminho sem compressão
+        progress: Função chamada com os bytes (descomprimidos) já enviados;
+            se ela levantar uma exceção o envio para no meio do fluxo
+
+    Returns:
+        int: Bytes efetivamente enviados pela rede (corpos dos frames)
+    """
+    codec = get_codec(codec_name)
+    if codec is None:
+        if progress is None:
+            send_file_data(conn, request_id, f, offset, count, zero_copy)
+            return count
+        with conn.send_lock:
+            sent = 0
+            while True:
+                step = min(PROGRESS_STEP, count - sent)
+                send_file_data(conn, request_id, f, offset + sent, step, zero_copy,
+                               end=sent + step == count)
+                sent += step
+                progress(sent)
+                if sent == count:
+                    return count
+
+    compressor = AdaptiveCompressor(codec)
+    wire_bytes = [0]
+    raw_bytes = [0]
+
+    def produce(put):
+        f.seek(offset)
+        remaining = count
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ConnectionError('Arquivo alterado durante o envio')
+            remaining -= len(chunk)
+            put(compressor.encode(chunk) + (len(chunk),))
+
+    def send(item):
+        payload, flags, raw = item
+        conn.send_data(request_id, payload, flags=flags)
+        wire_bytes[0] += len(payload)
+        raw_bytes[0] += raw
+        if progress:
+            progress(raw_bytes[0])
+
+    with conn.send_lock:
+        run_pipeline(produce, send)
+        conn.send_data(request_id, b'', end=True)
+    return wire_bytes[0]
+
+
+def receive_stream(conn, f, codec_name=None, limit=None):
+    """
+    Recebe um fluxo de dados e grava no arquivo, descomprimindo se preciso
+
+    Com codec, os frames são descomprimidos e gravados numa thread
+    paralela enquanto esta thread continua lendo o socket.
+
+    Args:
+        conn (FrameConnection): Conexão de origem
+        f: Arquivo aberto para escrita (na posição certa)
+        codec_name (str): Codec negociado ou None
+        limit (int): Máximo de bytes (descomprimidos) aceitos; o que passar
+            disso não é gravado
+
+    Returns:
+        int: Bytes gravados (descomprimidos)
+
+    Raises:
+        StreamOverflow: Se o fluxo trouxer mais que `limit` bytes (o
+            restante do fluxo pode ainda não ter sido lido)
+    """
+    codec = get_codec(codec_name)
+    written = [0]
+
+    def write(data):
+        if limit is not None and written[0] + len(data) > limit:
+            raise StreamOverflow(f'Fluxo maior que o esperado ({limit} bytes)')
+        f.write(data)
+        written[0] += len(data)
+
+    if codec is None:
+        for flags, chunk in conn.iter_data():
+            if flags & FLAG_COMPRESSED:
+                raise ValueError('Frame comprimido sem codec negociado')
+            write(chunk)
+        return written[0]
+
+    # Aqui quem produz é o socket (thread atual) e quem consome é o disco
+    items = queue.Queue(maxsize=PIPELINE_DEPTH)
+    done = object()
+    error = []
+
+    def write_worker():
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    return
+                flags, payload = item
+                write(codec.decompress(payload) if flags & FLAG_COMPRESSED else payload)
+        except BaseException as e:
+            error.append(e)
+            # Continua esvaziando a fila para não travar quem lê o socket
+            while items.get() is not done:
+                pass
+
+    thread = threading.Thread(target=write_worker, daemon=True)
+    thread.start()
+    try:
+        for item in conn.iter_data(whole_frames=True, max_length=CHUNK_SIZE):
+            items.put(item)
+    finally:
+        items.put(done)
+        thread.join()
+    if error:
+        raise error[0]
+    return written[0]
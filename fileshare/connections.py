@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - CONEXÕES
+Registro das conexões do servidor, limite de conexões e tempos de espera
+
+Cada conexão aceita entra num registro (dicionário protegido por lock:
+inclusão e remoção em O(1)). Com o servidor cheio, a conexão nova recebe
+um único frame de recusa e é fechada ali mesmo, sem ganhar thread.
+
+Os tempos de espera não usam um timer por socket: todas as conexões ficam
+numa roda de temporização (TimerWheel) percorrida por uma única thread a
+cada TICK. Quando a vez de uma conexão chega, o estado dela decide:
+
+- ociosa (esperando a próxima requisição) há mais de `idle_timeout`:
+  fechada, exceto se assina eventos da pasta (ver FileServer.subscribe);
+- parada numa leitura (requisição ou upload pela metade) há mais de
+  `read_timeout`: fechada;
+- caso contrário volta para a roda no próximo prazo.
+
+Atender uma requisição custa só duas atribuições (ClientConnection.idle e
+busy, e o início de cada recv em FrameConnection.recv_started); o relógio
+de cada conexão é conferido só quando o prazo dela vence.
+
+Fechar uma conexão é um shutdown do socket: a thread (ou tarefa) que a
+atende acorda com fim de conexão e faz a limpeza normal.
+"""
+
+import math
+import socket
+import threading
+import time
+
+from protocol import HEADER, MAGIC, FRAME_RESPONSE, NOTICE_ID, encode_json
+
+# Conexões simultâneas aceitas por padrão (0 = sem limite)
+DEFAULT_MAX_CONNECTIONS = 1000
+
+# Conexão sem requisições por este tempo é fechada (segundos)
+IDLE_TIMEOUT = 300.0
+
+# Leitura parada no meio de uma requisição por este tempo é abandonada (segundos)
+READ_TIMEOUT = 60.0
+
+# Espera pelas requisições em andamento ao parar o servidor (segundos)
+DRAIN_TIMEOUT = 30.0
+
+# Resolução da roda de temporização (segundos) e número de posições
+TICK = 1.0
+WHEEL_SLOTS = 512
+
+
+def reject(sock, message):
+    """
+    Recusa uma conexão: um frame de erro, se couber no buffer, e fechamento
+
+    Args:
+        sock: Socket recém-aceito
+        message (str): Motivo mostrado ao cliente
+    """
+    payload = encode_json({'status': 'error', 'code': 'busy', 'message': message})
+    frame = HEADER.pack(MAGIC, FRAME_RESPONSE, 0, NOTICE_ID, len(payload)) + payload
+    try:
+        sock.setblocking(False)  # Nunca espera por um cliente recusado
+        sock.send(frame)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+class TimerWheel:
+    def __init__(self, tick=TICK, slots=WHEEL_SLOTS):
+        """
+        Roda de temporização: agendar e cancelar em O(1)
+
+        Cada item fica na posição do TICK em que o prazo dele vence; prazos
+        além de uma volta da roda continuam na posição até a volta certa.
+        Os itens guardam a própria posição (`timer_slot`) e prazo
+        (`timer_deadline`).
+
+        Args:
+            tick (float): Resolução em segundos
+            slots (int): Posições da roda
+        """
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.lock = threading.Lock()
+        self.current = int(time.monotonic() / tick)  # Último TICK percorrido
+
+    def schedule(self, item, deadline):
+        """Agenda (ou reagenda) um item para o instante `deadline` (monotonic)"""
+        with self.lock:
+            self._remove(item)
+            tick = max(math.ceil(deadline / self.tick), self.current + 1)
+            item.timer_deadline = deadline
+            item.timer_slot = tick % len(self.slots)
+            self.slots[item.timer_slot].add(item)
+
+    def cancel(self, item):
+        """Tira um item da roda"""
+        with self.lock:
+            self._remove(item)
+
+    def _remove(self, item):
+        if item.timer_slot is not None:
+            self.slots[item.timer_slot].discard(item)
+            item.timer_slot = None
+
+    def advance(self, now):
+        """
+        Percorre as posições até o instante `now`
+
+        Returns:
+            list: Itens vencidos (já fora da roda)
+        """
+        expired = []
+        with self.lock:
+            target = int(now / self.tick)
+            # Depois de uma pausa longa basta uma volta completa
+            self.current = max(self.current, target - len(self.slots))
+            while self.current < target:
+                self.current += 1
+                slot = self.slots[self.current % len(self.slots)]
+                due = [item for item in slot if item.timer_deadline <= now]
+                for item in due:
+                    slot.discard(item)
+                    item.timer_slot = None
+                expired.extend(due)
+        return expired
+
+
+class ClientConnection:
+    def __init__(self, sock, address):
+        """
+        Uma conexão registrada
+
+        Args:
+            sock: Socket do cliente
+            address: Endereço do cliente
+        """
+        self.sock = sock
+        self.address = address
+        self.conn = None  # FrameConnection, criada por quem atende a conexão
+        self.opened = time.monotonic()
+        self.idle_since = self.opened  # None enquanto atende uma requisição
+        self.subscribed = False  # Assinante de eventos: nunca fica ocioso demais
+        self.replica = None  # Endereço anunciado, se a conexão é de uma réplica
+        self.closing = False
+        self.timer_slot = None
+        self.timer_deadline = None
+
+    def idle(self):
+        """Marca a espera pela próxima requisição"""
+        self.idle_since = time.monotonic()
+
+    def busy(self):
+        """Marca o início do atendimento de uma requisição"""
+        self.idle_since = None
+
+    def is_idle(self):
+        """Indica se a conexão espera uma requisição sem nada dela recebido"""
+        return self.idle_since is not None and not (self.conn and self.conn.buffered())
+
+    def shutdown(self):
+        """Encerra a conexão, acordando quem estiver lendo ou escrevendo nela"""
+        self.closing = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Já fechada
+
+
+class ConnectionRegistry:
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, idle_timeout=IDLE_TIMEOUT,
+                 read_timeout=READ_TIMEOUT):
+        """
+        Conexões ativas do servidor, com limite e tempos de espera
+
+        Args:
+            max_connections (int): Conexões simultâneas (0 = sem limite)
+            idle_timeout (float): Tempo máximo sem requisições (0 = sem limite)
+            read_timeout (float): Tempo máximo de uma leitura parada no meio
+                de uma requisição (0 = sem limite)
+        """
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self.lock = threading.Lock()
+        self.empty = threading.Condition(self.lock)
+        self.clients = {}  # socket -> ClientConnection
+        self.wheel = TimerWheel()
+        self.rejected = 0  # Conexões recusadas por limite
+        self.expired = 0  # Conexões fechadas por tempo de espera
+        self.thread = None
+        self.running = False
+
+    def __len__(self):
+        return len(self.clients)
+
+    def register(self, sock, address):
+        """
+        Admite uma conexão recém-aceita
+
+        Returns:
+            ClientConnection: Registro da conexão ou None se o servidor está
+            cheio (a conexão já foi recusada e fechada)
+        """
+        with self.lock:
+            full = self.max_connections and len(self.clients) >= self.max_connections
+            if full:
+                self.rejected += 1
+            else:
+                client = ClientConnection(sock, address)
+                self.clients[sock] = client
+        if full:
+            reject(sock, f"Servidor cheio ({self.max_connections} conexões)")
+            return None
+        if self.idle_timeout or self.read_timeout:
+            self.wheel.schedule(client, client.opened + self.check_interval())
+        return client
+
+    def unregister(self, sock):
+        """Remove uma conexão que terminou"""
+        with self.lock:
+            client = self.clients.pop(sock, None)
+            if not self.clients:
+                self.empty.notify_all()
+        if client is not None:
+            self.wheel.cancel(client)
+
+    def get(self, sock):
+        """Registro de uma conexão ativa (ou None)"""
+        return self.clients.get(sock)
+
+    def snapshot(self):
+        """Cópia da lista de conexões ativas"""
+        with self.lock:
+            return list(self.clients.values())
+
+    # === TEMPOS DE ESPERA ===
+
+    def check_interval(self):
+        """Intervalo para reconferir uma conexão que não tem prazo vencendo"""
+        return min(timeout for timeout in (self.idle_timeout, self.read_timeout) if timeout)
+
+    def deadline(self, client, now):
+        """
+        Prazo atual de uma conexão, conforme o estado dela
+
+        Returns:
+            float: Instante (monotonic) em que ela deve ser fechada se nada mudar
+        """
+        if client.is_idle():
+            if client.subscribed or not self.idle_timeout:
+                return now + self.check_interval()
+            return client.idle_since + self.idle_timeout
+        started = client.conn.recv_started if client.conn else None
+        if started is not None and self.read_timeout:
+            return started + self.read_timeout
+        # Processando ou escrevendo: escritas paradas são limitadas pelo socket
+        return now + self.check_interval()
+
+    def start(self):
+        """Começa a conferir os tempos de espera numa thread própria"""
+        if not (self.idle_timeout or self.read_timeout) or self.thread:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='fileshare-reaper', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Para a thread dos tempos de espera"""
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        """Laço da thread: percorre a roda a cada TICK"""
+        while self.running:
+            time.sleep(self.wheel.tick)
+            now = time.monotonic()
+            for client in self.wheel.advance(now):
+                if client.sock not in self.clients or client.closing:
+                    continue
+                deadline = self.deadline(client, now)
+                if deadline > now:
+                    self.wheel.schedule(client, deadline)
+                    continue
+                self.expired += 1
+                reason = "ociosa" if client.is_idle() else "leitura parada"
+                print(f"⏱️ Conexão {reason} encerrada: {client.address}")
+                client.shutdown()
+
+    # === PARADA ===
+
+    def close_idle(self):
+        """
+        Encerra as conexões que esperam a próxima requisição
+
+        Returns:
+            int: Conexões encerradas
+        """
+        idle = [client for client in self.snapshot() if client.is_idle()]
+        for client in idle:
+            client.shutdown()
+        return len(idle)
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """
+        Espera as requisições em andamento terminarem e encerra o que sobrar
+
+        Quem atende cada conexão deve parar depois da requisição atual
+        (FileServer.running falso).
+
+        Args:
+            timeout (float): Espera máxima em segundos
+
+        Returns:
+            int: Conexões encerradas à força depois do prazo
+        """
+        self.close_idle()
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while self.clients:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.empty.wait(min(remaining, self.wheel.tick))
+                # Quem terminou uma requisição e ficou esperando a próxima também sai
+                for client in list(self.clients.values()):
+                    if client.is_idle() and not client.closing:
+                        client.shutdown()
+        return self.close_all()
+
+    def close_all(self):
+        """
+        Encerra todas as conexões
+
+        Returns:
+            int: Conexões encerradas
+        """
+        clients = self.snapshot()
+        for client in clients:
+            client.shutdown()
+        return len(clients)
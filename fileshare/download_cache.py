@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - CACHE DE DOWNLOADS
+Cópias locais dos arquivos baixados, para não baixar de novo o que não mudou
+
+Cada conteúdo fica uma vez só em `objects/<checksum>` (o checksum por
+blocos de hash_cache), não importa de quantos servidores ou caminhos tenha
+vindo. Um SQLite liga (servidor, caminho) ao validador e ao checksum da
+última versão baixada; o download seguinte manda essas marcas como
+`if_none_match` e, se o servidor responder `not_modified`, o arquivo é
+restaurado do cache com um hardlink (ou uma cópia, entre discos
+diferentes) sem nenhum byte pela rede.
+
+Como o destino pode ser um hardlink para o objeto guardado, tamanho, inode
+e data de modificação de cada objeto são anotados ao guardar: um objeto
+alterado depois disso (o usuário editou o arquivo baixado, por exemplo) é
+descartado em vez de restaurado.
+
+O tamanho total dos objetos é limitado por `max_bytes`; os menos usados
+recentemente saem primeiro.
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Espaço máximo ocupado pelos objetos do cache
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def default_folder():
+    """Pasta padrão do cache (XDG_CACHE_HOME ou ~/.cache)"""
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'fileshare'
+
+
+def server_key(address):
+    """Identificação de um servidor no cache"""
+    host, port = address[:2]
+    return f"{host}:{port}"
+
+
+class DownloadCache:
+    def __init__(self, folder=None, max_bytes=DEFAULT_MAX_BYTES, link=True):
+        """
+        Cache local de downloads, limitado em tamanho
+
+        Args:
+            folder (Path): Pasta do cache (padrão: default_folder())
+            max_bytes (int): Espaço máximo dos objetos guardados
+            link (bool): Usa hardlinks entre cache e destino quando possível
+        """
+        self.folder = Path(folder) if folder else default_folder()
+        self.objects = self.folder / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.link = link
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.folder / 'index.db'), timeout=30,
+                                  check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS objects ('
+            ' digest TEXT PRIMARY KEY, size INTEGER NOT NULL,'
+            ' ino INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' server TEXT NOT NULL, path TEXT NOT NULL,'
+            ' validator TEXT NOT NULL, digest TEXT NOT NULL,'
+            ' PRIMARY KEY (server, path))'
+        )
+
+    def object_path(self, digest):
+        """Caminho do objeto com um checksum"""
+        return self.objects / digest
+
+    def _valid(self, digest):
+        """Confere se o objeto continua como foi guardado (chamado com o lock)"""
+        row = self.db.execute(
+            'SELECT size, ino, mtime_ns FROM objects WHERE digest = ?', (digest,)
+        ).fetchone()
+        if row is not None:
+            try:
+                stat = os.stat(self.object_path(digest))
+                if (stat.st_size, stat.st_ino, stat.st_mtime_ns) == tuple(row):
+                    return True
+            except OSError:
+                pass
+        self._drop(digest)
+        return False
+
+    def _drop(self, digest):
+        """Descarta um objeto e as entradas que apontam para ele (chamado com o lock)"""
+        self.db.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+        self.db.execute('DELETE FROM entries WHERE digest = ?', (digest,))
+        try:
+            os.unlink(self.object_path(digest))
+        except OSError:
+            pass
+
+    def lookup(self, server, path):
+        """
+        Marcas da versão guardada de um arquivo, para um download condicional
+
+        Args:
+            server (str): Servidor (ver server_key)
+            path (str): Nome do arquivo no servidor
+
+        Returns:
+            dict: validator e digest ou None se não há cópia válida
+        """
+        with self.lock:
+            row = self.db.execute(
+                'SELECT validator, digest FROM entries WHERE server = ? AND path = ?',
+                (server, path)
+            ).fetchone()
+            if row is None or not self._valid(row[1]):
+                return None
+        return {'validator': row[0], 'digest': row[1]}
+
+    def tags(self, entry):
+        """Marcas `if_none_match` de uma entrada (ver FileServer.send_file)"""
+        return [entry['validator'], f"sha256:{entry['digest']}"]
+
+    def store(self, server, path, source, validator, digest):
+        """
+        Guarda a versão recém-baixada de um arquivo
+
+        O objeto é um hardlink para `source` (ou uma cópia dele). Arquivos
+        maiores que o cache inteiro não são guardados.
+
+        Args:
+            server (str): Servidor (ver server_key)
+            path (str): Nome do arquivo no servidor
+            source (Path): Arquivo baixado, já conferido contra `digest`
+            validator (str): Validador informado pelo servidor
+            digest (str): Checksum do conteúdo
+
+        Returns:
+            bool: True se o arquivo ficou no cache
+        """
+        size = os.stat(source).st_size
+        if size > self.max_bytes:
+            return False
+        target = self.object_path(digest)
+        with self.lock:
+            if not self._valid(digest):
+                temp = target.with_name(f".{digest}.{threading.get_ident()}.tmp")
+                try:
+                    self._place(source, temp)
+                    os.replace(temp, target)
+                except OSError:
+                    temp.unlink(missing_ok=True)
+                    return False
+                stat = os.stat(target)
+                self.db.execute(
+                    'INSERT OR REPLACE INTO objects (digest, size, ino, mtime_ns, last_used) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (digest, stat.st_size, stat.st_ino, stat.st_mtime_ns, time.time())
+                )
+            else:
+                self._touch(digest)
+            self.db.execute(
+                'INSERT OR REPLACE INTO entries (server, path, validator, digest) '
+                'VALUES (?, ?, ?, ?)',
+                (server, path, validator, digest)
+            )
+            self._evict(keep=digest)
+        return True
+
+    def restore(self, server, path, destination, validator=None):
+        """
+        Copia (ou liga) a versão guardada de um arquivo para o destino
+
+        Args:
+            server (str): Servidor (ver server_key)
+            path (str): Nome do arquivo no servidor
+            destination (Path): Caminho local de destino
+            validator (str): Validador atual informado pelo servidor (atualiza
+                a entrada quando o conteúdo é o mesmo com outra data)
+
+        Returns:
+            bool: False se a cópia sumiu ou foi alterada (é preciso baixar)
+        """
+        destination = Path(destination)
+        with self.lock:
+            row = self.db.execute(
+                'SELECT digest FROM entries WHERE server = ? AND path = ?', (server, path)
+            ).fetchone()
+            if row is None or not self._valid(row[0]):
+                return False
+            digest = row[0]
+            source = self.object_path(digest)
+            if not (destination.exists() and os.path.samefile(source, destination)):
+                temp = destination.with_name(
+                    f".{destination.name}.{threading.get_ident()}.cache.tmp")
+                try:
+                    self._place(source, temp)
+                    os.replace(temp, destination)
+                except OSError:
+                    temp.unlink(missing_ok=True)
+                    return False
+            self._touch(digest)
+            if validator:
+                self.db.execute(
+                    'UPDATE entries SET validator = ? WHERE server = ? AND path = ?',
+                    (validator, server, path)
+                )
+        return True
+
+    def _place(self, source, target):
+        """Hardlink de `source` em `target`, ou cópia se não der"""
+        if self.link:
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass  # Outro disco ou sistema de arquivos sem hardlinks
+        shutil.copyfile(source, target)
+
+    def _touch(self, digest):
+        """Marca o uso de um objeto (chamado com o lock)"""
+        self.db.execute('UPDATE objects SET last_used = ? WHERE digest = ?',
+                        (time.time(), digest))
+
+    def _evict(self, keep=None):
+        """Descarta os objetos menos usados até caber em max_bytes (chamado com o lock)"""
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute(
+            'SELECT digest, size FROM objects ORDER BY last_used'
+        ).fetchall()
+        for digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            if digest != keep:
+                self._drop(digest)
+                total -= size
+
+    def usage(self):
+        """
+        Ocupação atual do cache
+
+        Returns:
+            tuple: (objetos, bytes)
+        """
+        with self.lock:
+            return self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects'
+            ).fetchone()
+
+    def close(self):
+        """Fecha o banco"""
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - GRAVAÇÃO DE UPLOADS
+Arquivos temporários pré-alocados, escritas grandes e política de fsync
+
+Os uploads são gravados num temporário com o espaço reservado de uma vez
+(menos fragmentação) e só aparecem com o nome final por os.replace, que é
+atômico: quem lê a pasta vê o arquivo antigo ou o novo, nunca um pedaço.
+
+Políticas de fsync, da mais rápida para a mais segura:
+
+- none: o sistema operacional grava quando quiser;
+- close: fsync do arquivo antes de publicar e da pasta depois do rename;
+- periodic: como close, e também a cada FSYNC_INTERVAL bytes, registrando
+  o progresso sincronizado para que um upload retome dali mesmo depois de
+  uma queda de energia.
+"""
+
+import os
+
+# Políticas de fsync
+FSYNC_NONE = 'none'
+FSYNC_CLOSE = 'close'
+FSYNC_PERIODIC = 'periodic'
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_CLOSE, FSYNC_PERIODIC)
+
+# Bytes gravados entre dois fsync na política periódica
+FSYNC_INTERVAL = 64 * 1024 * 1024
+
+# Buffer de escrita dos uploads: pedaços pequenos do socket viram escritas grandes
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def preallocate(fd, size):
+    """Reserva o espaço do arquivo de uma vez (evita fragmentação)"""
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # Sistema de arquivos sem suporte: só ajusta o tamanho
+    os.ftruncate(fd, size)
+
+
+def fsync_directory(path):
+    """Garante no disco as entradas de uma pasta (ex.: depois de um rename)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Windows não abre pastas: o rename já é durável lá
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def open_upload(path, size, offset=0):
+    """
+    Abre o temporário de um upload, pré-alocado para o tamanho declarado
+
+    Args:
+        path (Path): Arquivo temporário
+        size (int): Tamanho final declarado
+        offset (int): Posição onde a escrita continua (retomada)
+
+    Returns:
+        Arquivo binário com buffer grande, posicionado em `offset`
+    """
+    f = open(path, 'r+b' if offset else 'wb', buffering=WRITE_BUFFER_SIZE)
+    try:
+        preallocate(f.fileno(), size)
+        f.truncate(size)  # Uma tentativa anterior pode ter gravado além do fim
+        f.seek(offset)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def publish(temp_path, final_path, policy=FSYNC_NONE):
+    """
+    Troca o arquivo final pelo temporário de uma vez
+
+    Args:
+        temp_path (Path): Temporário completo (já fechado)
+        final_path (Path): Nome definitivo
+        policy (str): Política de fsync
+    """
+    os.replace(temp_path, final_path)
+    if policy != FSYNC_NONE:
+        fsync_directory(os.path.dirname(os.path.abspath(final_path)))
+
+
+class DurableWriter:
+    def __init__(self, f, policy=FSYNC_NONE, interval=FSYNC_INTERVAL, offset=0,
+                 on_sync=None):
+        """
+        Grava num arquivo aplicando a política de fsync
+
+        Args:
+            f: Arquivo aberto por open_upload
+            policy (str): Política de fsync
+            interval (int): Bytes entre fsync na política periódica
+            offset (int): Posição inicial (bytes já seguros de antes)
+            on_sync: Função chamada com a posição sincronizada após cada
+                fsync periódico (para registrar o progresso)
+        """
+        if policy not in FSYNC_POLICIES:
+            raise ValueError(f'Política de fsync inválida: {policy}')
+        self.f = f
+        self.policy = policy
+        self.interval = interval
+        self.on_sync = on_sync
+        self.position = offset  # Fim do que já foi entregue ao arquivo
+        self.synced = offset  # Fim do que já está garantido no disco
+
+    def write(self, data):
+        """Grava os bytes, sincronizando a cada `interval` na política periódica"""
+        n = self.f.write(data)
+        self.position += len(data)
+        if self.policy == FSYNC_PERIODIC and self.position - self.synced >= self.interval:
+            self.sync()
+            if self.on_sync:
+                self.on_sync(self.synced)
+        return n
+
+    def sync(self):
+        """Esvazia o buffer e faz fsync"""
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.synced = self.position
+
+    def finish(self):
+        """Conclui a gravação (fsync nas políticas close e periodic)"""
+        if self.policy == FSYNC_NONE:
+            self.f.flush()
+            self.synced = self.position
+        else:
+            self.sync()
+
+    def written(self):
+        """
+        Bytes que certamente chegaram ao arquivo (usado depois de um erro)
+
+        Returns:
+            int: Posição até onde os dados foram gravados
+        """
+        try:
+            self.f.flush()
+            return self.position
+        except (OSError, ValueError):
+            return self.synced
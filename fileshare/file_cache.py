@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - CACHE DE ARQUIVOS
+Conteúdo dos arquivos mais baixados mantido em memória
+
+Arquivos pequenos (miniaturas, configurações) ficam inteiros num cache LRU
+limitado em bytes; arquivos médios ficam mapeados com mmap, num LRU
+limitado em quantidade. Os dois são validados a cada pedido pelo os.stat do
+caminho (tamanho, data de modificação e inode): um arquivo trocado pelo
+servidor (os.replace cria um inode novo) ou editado no lugar é relido.
+
+O conteúdo é entregue como um MemoryFile, que se comporta como um arquivo
+aberto para quem comprime ou resume blocos e expõe `memory` para que o
+envio sem compressão mande fatias da memória direto para o socket, sem
+cópias (ver transfer.send_file_data). Arquivos grandes não passam por aqui:
+continuam com sendfile.
+
+Um mapeamento descartado do cache não é fechado: ele só some quando o
+último envio que o usa terminar.
+"""
+
+import mmap
+import os
+import threading
+from stat import S_ISREG
+from collections import OrderedDict
+
+# Memória total do cache de arquivos pequenos
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Arquivos até este tamanho vão inteiros para a memória
+DEFAULT_MAX_FILE_SIZE = 256 * 1024
+
+# Arquivos até este tamanho são servidos por mmap
+DEFAULT_MAP_MAX_SIZE = 64 * 1024 * 1024
+
+# Mapeamentos mantidos abertos
+DEFAULT_MAX_MAPS = 128
+
+
+def stat_key(stat):
+    """Versão de um arquivo: muda se ele for trocado ou alterado"""
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+class MemoryFile:
+    def __init__(self, memory, stat):
+        """
+        Conteúdo de um arquivo em memória, com a interface de leitura de um arquivo
+
+        Args:
+            memory: bytes ou mmap com o conteúdo
+            stat: os.stat da versão do arquivo
+        """
+        self.memory = memoryview(memory)
+        self.stat = stat
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def seek(self, position):
+        """Posiciona a leitura"""
+        self.position = position
+
+    def read(self, size=-1):
+        """Lê bytes a partir da posição atual"""
+        end = len(self.memory) if size is None or size < 0 else self.position + size
+        data = self.memory[self.position:end].tobytes()
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        """Lê no buffer a partir da posição atual"""
+        view = self.memory[self.position:self.position + len(buffer)]
+        buffer[:len(view)] = view
+        self.position += len(view)
+        return len(view)
+
+    def close(self):
+        """Solta a referência ao conteúdo (o mmap fecha quando ninguém mais usa)"""
+        self.memory.release()
+
+
+class FileCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_file_size=DEFAULT_MAX_FILE_SIZE,
+                 map_max_size=DEFAULT_MAP_MAX_SIZE, max_maps=DEFAULT_MAX_MAPS):
+        """
+        Cache dos arquivos servidos com mais frequência
+
+        Args:
+            max_bytes (int): Memória dos arquivos pequenos
+            max_file_size (int): Maior arquivo guardado inteiro
+            map_max_size (int): Maior arquivo servido por mmap (0 desativa)
+            max_maps (int): Mapeamentos mantidos abertos
+        """
+        self.max_bytes = max_bytes
+        self.max_file_size = min(max_file_size, max_bytes)
+        self.map_max_size = map_max_size if hasattr(mmap, 'ACCESS_READ') else 0
+        self.max_maps = max_maps
+        self.lock = threading.Lock()
+        self.files = OrderedDict()  # caminho -> (versão, bytes, stat)
+        self.maps = OrderedDict()  # caminho -> (versão, mmap, stat)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.map_hits = 0
+        self.map_misses = 0
+        self.evictions = 0
+
+    def open(self, path):
+        """
+        Conteúdo atual de um arquivo, se ele for pequeno ou médio
+
+        Args:
+            path (Path): Arquivo
+
+        Returns:
+            MemoryFile: Conteúdo ou None se o arquivo é grande (ou não é um
+            arquivo regular) e deve ser lido do disco
+
+        Raises:
+            OSError: Se o arquivo não existe ou não pode ser lido
+        """
+        stat = os.stat(path)
+        size = stat.st_size
+        if not S_ISREG(stat.st_mode) or size > max(self.max_file_size, self.map_max_size):
+            return None
+        key = str(path)
+        version = stat_key(stat)
+
+        if size <= self.max_file_size:
+            with self.lock:
+                entry = self.files.get(key)
+                if entry is not None and entry[0] == version:
+                    self.files.move_to_end(key)
+                    self.hits += 1
+                    return MemoryFile(entry[1], entry[2])
+                self.misses += 1
+            return self._load(key, path)
+
+        with self.lock:
+            entry = self.maps.get(key)
+            if entry is not None and entry[0] == version:
+                self.maps.move_to_end(key)
+                self.map_hits += 1
+                return MemoryFile(entry[1], entry[2])
+            self.map_misses += 1
+        return self._map(key, path)
+
+    def _load(self, key, path):
+        """Lê um arquivo pequeno inteiro e guarda no LRU"""
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        if len(data) != stat.st_size:
+            return None  # Mudou durante a leitura: fica para o disco
+        if stat.st_size > self.max_file_size:
+            return MemoryFile(data, stat)  # Cresceu desde o stat: não guarda
+        with self.lock:
+            old = self.files.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[1])
+            self.files[key] = (stat_key(stat), data, stat)
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self.files.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+        return MemoryFile(data, stat)
+
+    def _map(self, key, path):
+        """Mapeia um arquivo médio e guarda o mapeamento no LRU"""
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if not stat.st_size:
+                return None
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return None  # Sistema de arquivos sem suporte a mmap
+        with self.lock:
+            self.maps.pop(key, None)
+            self.maps[key] = (stat_key(stat), mapped, stat)
+            while len(self.maps) > self.max_maps:
+                self.maps.popitem(last=False)
+                self.evictions += 1
+        return MemoryFile(mapped, stat)
+
+    def invalidate(self, path):
+        """Descarta um arquivo do cache (ex.: substituído ou removido)"""
+        key = str(path)
+        with self.lock:
+            entry = self.files.pop(key, None)
+            if entry is not None:
+                self.bytes -= len(entry[1])
+            self.maps.pop(key, None)
+
+    def clear(self):
+        """Esvazia o cache"""
+        with self.lock:
+            self.files.clear()
+            self.maps.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        Contadores do cache
+
+        Returns:
+            dict: Acertos, faltas, descartes e ocupação
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'map_hits': self.map_hits,
+                'map_misses': self.map_misses,
+                'evictions': self.evictions,
+                'bytes': self.bytes,
+                'files': len(self.files),
+                'maps': len(self.maps)
+            }
@@ -3,16 +3,40 @@
 """
 Aplicativo de Compartilhamento de Arquivos - CLIENTE
 Interface gráfica para conectar ao servidor e gerenciar arquivos
+
+A conversa com o servidor fica em client_api.py; aqui só há a janela, a
+fila de transferências e as mensagens para o usuário.
 """
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import socket
-import json
 import os
+import queue
+import sqlite3
 import threading
+import datetime
+from collections import deque
 from pathlib import Path
 
+from client_api import FileShareClient, ClientError, format_size
+from download_cache import DownloadCache
+from file_view import VirtualFileView
+from archive import valid_name
+from transfer_manager import TransferManager, QUEUED, RUNNING, DONE, FAILED, CANCELLED
+
+# Intervalo de atualização do log e do progresso na interface (ms)
+UI_POLL_MS = 100
+
+# Textos dos estados das transferências
+STATUS_LABELS = {
+    QUEUED: "⏳ Na fila",
+    RUNNING: "🔄 Em andamento",
+    DONE: "✅ Concluído",
+    FAILED: "❌ Erro",
+    CANCELLED: "⛔ Cancelado"
+}
+
 class FileClient:
     def __init__(self, root):
         """
@@ -22,8 +46,11 @@ class FileClient:
             root: Janela principal do Tkinter
         """
         self.root = root
-        self.socket = None
+        self.api = None  # Cliente do servidor (conexões, transferências)
         self.connected = False
+        self.subscription = None  # Eventos de mudança da pasta do servidor
+        self.file_events = deque()  # Eventos recebidos, aplicados em poll_ui
+        self.resync_needed = False  # Eventos se perderam: reler a lista
         
         # Configuração da janela principal
         self.root.title("📁 File Sharing Client")
@@ -33,9 +60,25 @@ class FileClient:
         # Variáveis para configuração
         self.host_var = tk.StringVar(value="localhost")
         self.port_var = tk.StringVar(value="8888")
+        self.streams_var = tk.StringVar(value="auto")  # Fluxos por download
+        self.dedup_var = tk.BooleanVar(value=False)  # Envia só os pedaços novos
+        self.compress_var = tk.BooleanVar(value=True)  # Comprime quando compensa
+        self.filter_var = tk.StringVar()  # Filtro da lista de arquivos pelo nome
         
+        # Transferências rodam em threads de trabalho, fora da interface
+        self.transfers = TransferManager()
+        self.log_queue = deque()  # Mensagens ainda não exibidas (de qualquer thread)
+        
+        # Arquivos já baixados e não modificados vêm do cache local
+        try:
+            self.download_cache = DownloadCache()
+        except (OSError, sqlite3.Error) as e:
+            self.download_cache = None
+            self.log(f"⚠️ Cache de downloads indisponível: {e}")
+            
         # Cria a interface
         self.create_interface()
+        self.root.after(UI_POLL_MS, self.poll_ui)
         
     def create_interface(self):
         """Cria todos os elementos da interface gráfica"""
@@ -53,13 +96,17 @@ class FileClient:
         port_entry = ttk.Entry(connection_frame, textvariable=self.port_var, width=10)
         port_entry.grid(row=0, column=3, padx=5)
         
+        ttk.Label(connection_frame, text="Fluxos:").grid(row=0, column=4, sticky="w", padx=5)
+        streams_entry = ttk.Entry(connection_frame, textvariable=self.streams_var, width=6)
+        streams_entry.grid(row=0, column=5, padx=5)
+        
         # Botões de conexão
         self.connect_btn = ttk.Button(
             connection_frame, 
             text="🔗 Conectar", 
             command=self.connect_to_server
         )
-        self.connect_btn.grid(row=0, column=4, padx=10)
+        self.connect_btn.grid(row=0, column=6, padx=10)
         
         self.disconnect_btn = ttk.Button(
             connection_frame, 
@@ -67,47 +114,29 @@ class FileClient:
             command=self.disconnect_from_server,
             state="disabled"
         )
-        self.disconnect_btn.grid(row=0, column=5, padx=5)
+        self.disconnect_btn.grid(row=0, column=7, padx=5)
         
         # Status da conexão
         self.status_var = tk.StringVar(value="❌ Desconectado")
         status_label = ttk.Label(connection_frame, textvariable=self.status_var)
-        status_label.grid(row=1, column=0, columnspan=6, pady=5)
+        status_label.grid(row=1, column=0, columnspan=8, pady=5)
         
         # === FRAME DE ARQUIVOS ===
         files_frame = ttk.LabelFrame(self.root, text="📂 Arquivos no Servidor", padding=10)
         files_frame.pack(fill="both", expand=True, padx=10, pady=5)
         
-        # Lista de arquivos com scrollbar
+        # Filtro pelo nome (aplicado na lista em memória, sem pedir ao servidor)
+        filter_frame = ttk.Frame(files_frame)
+        filter_frame.pack(fill="x", pady=(0, 5))
+        ttk.Label(filter_frame, text="🔎 Filtrar:").pack(side="left", padx=5)
+        ttk.Entry(filter_frame, textvariable=self.filter_var, width=30).pack(side="left", padx=5)
+        self.filter_var.trace_add("write", lambda *args: self.file_view.set_filter(self.filter_var.get()))
+        
+        # Lista de arquivos com scrollbar: só as linhas visíveis existem no
+        # Treeview, então pastas enormes não pesam na interface
         list_frame = ttk.Frame(files_frame)
         list_frame.pack(fill="both", expand=True)
-        
-        # Configuração do Treeview para lista de arquivos
-        columns = ("Nome", "Tamanho", "Modificado")
-        self.files_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
-        
-        # Configuração das colunas
-        self.files_tree.heading("Nome", text="📄 Nome do Arquivo")
-        self.files_tree.heading("Tamanho", text="📊 Tamanho")
-        self.files_tree.heading("Modificado", text="📅 Última Modificação")
-        
-        self.files_tree.column("Nome", width=300)
-        self.files_tree.column("Tamanho", width=100, anchor="center")
-        self.files_tree.column("Modificado", width=200, anchor="center")
-        
-        # Scrollbars para a lista
-        v_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.files_tree.yview)
-        h_scrollbar = ttk.Scrollbar(list_frame, orient="horizontal", command=self.files_tree.xview)
-        
-        self.files_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        # Posicionamento da lista e scrollbars
-        self.files_tree.grid(row=0, column=0, sticky="nsew")
-        v_scrollbar.grid(row=0, column=1, sticky="ns")
-        h_scrollbar.grid(row=1, column=0, sticky="ew")
-        
-        list_frame.grid_rowconfigure(0, weight=1)
-        list_frame.grid_columnconfigure(0, weight=1)
+        self.file_view = VirtualFileView(list_frame, height=15)
         
         # === FRAME DE AÇÕES ===
         actions_frame = ttk.LabelFrame(self.root, text="⚡ Ações", padding=10)
@@ -138,6 +167,44 @@ class FileClient:
             command=self.delete_file
         ).grid(row=0, column=3, padx=5)
         
+        ttk.Checkbutton(
+            actions_frame,
+            text="🧩 Envio incremental",
+            variable=self.dedup_var
+        ).grid(row=0, column=4, padx=5)
+        
+        ttk.Checkbutton(
+            actions_frame,
+            text="🗜️ Compressão",
+            variable=self.compress_var
+        ).grid(row=0, column=5, padx=5)
+        
+        ttk.Button(
+            actions_frame,
+            text="📦 Enviar Pasta",
+            command=self.upload_folder
+        ).grid(row=1, column=1, padx=5, pady=(5, 0))
+        
+        # === FRAME DE TRANSFERÊNCIAS ===
+        transfers_frame = ttk.LabelFrame(self.root, text="🚚 Transferências", padding=10)
+        transfers_frame.pack(fill="x", padx=10, pady=5)
+        
+        transfer_columns = ("Arquivo", "Tipo", "Progresso", "Velocidade", "Estado")
+        self.transfers_tree = ttk.Treeview(
+            transfers_frame, columns=transfer_columns, show="headings", height=4
+        )
+        for column, width in zip(transfer_columns, (260, 80, 160, 100, 130)):
+            self.transfers_tree.heading(column, text=column)
+            self.transfers_tree.column(column, width=width,
+                                       anchor="w" if column == "Arquivo" else "center")
+        self.transfers_tree.pack(side="left", fill="x", expand=True)
+        
+        ttk.Button(
+            transfers_frame,
+            text="⛔ Cancelar",
+            command=self.cancel_transfer
+        ).pack(side="left", padx=5)
+        
         # === FRAME DE LOG ===
         log_frame = ttk.LabelFrame(self.root, text="📋 Log de Atividades", padding=10)
         log_frame.pack(fill="x", padx=10, pady=5)
@@ -153,17 +220,101 @@ class FileClient:
         """
         Adiciona uma mensagem ao log
         
+        Pode ser chamado de qualquer thread: a mensagem entra numa fila e
+        aparece na próxima atualização da interface (ver flush_log).
+        
         Args:
             message (str): Mensagem para adicionar ao log
         """
-        import datetime
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        log_message = f"[{timestamp}] {message}\n"
+        self.log_queue.append(f"[{timestamp}] {message}\n")
         
-        self.log_text.insert(tk.END, log_message)
+    def flush_log(self):
+        """Exibe as mensagens pendentes com uma única inserção no widget"""
+        if not self.log_queue:
+            return
+        lines = []
+        while self.log_queue:
+            lines.append(self.log_queue.popleft())
+        self.log_text.insert(tk.END, "".join(lines))
         self.log_text.see(tk.END)  # Scroll automático para a última linha
-        self.root.update()  # Atualiza a interface
         
+    def poll_ui(self):
+        """Atualiza log e transferências periodicamente (thread do Tkinter)"""
+        try:
+            jobs, completed = self.transfers.poll()
+            for job in completed:
+                self.transfer_finished(job)
+            self.update_transfers(jobs)
+            self.apply_file_events()
+            self.flush_log()
+        finally:
+            self.root.after(UI_POLL_MS, self.poll_ui)
+            
+    def update_transfers(self, jobs):
+        """
+        Sincroniza a lista de transferências com os trabalhos atuais
+        
+        Args:
+            jobs (list): TransferJob visíveis, em ordem de criação
+        """
+        current = set(self.transfers_tree.get_children())
+        visible = set()
+        for job in jobs:
+            item = str(job.id)
+            visible.add(item)
+            if job.total:
+                progress = (f"{format_size(job.done)} / {format_size(job.total)} "
+                            f"({100 * job.done / job.total:.0f}%)")
+            else:
+                progress = format_size(job.done)
+            values = (
+                job.name,
+                "📤 Envio" if job.kind == 'upload' else "📥 Download",
+                progress,
+                f"{format_size(job.rate)}/s" if job.status == RUNNING else "",
+                STATUS_LABELS[job.status]
+            )
+            if item in current:
+                self.transfers_tree.item(item, values=values)
+            else:
+                self.transfers_tree.insert("", "end", iid=item, values=values)
+        for item in current - visible:
+            self.transfers_tree.delete(item)
+            
+    def cancel_transfer(self):
+        """Cancela as transferências selecionadas"""
+        selection = self.transfers_tree.selection()
+        if not selection:
+            messagebox.showwarning("Aviso", "Selecione uma transferência para cancelar")
+            return
+        for item in selection:
+            if self.transfers.cancel(int(item)):
+                self.log(f"⛔ Cancelando transferência: {self.transfers_tree.item(item)['values'][0]}")
+                
+    def transfer_finished(self, job):
+        """
+        Registra o fim de uma transferência (thread do Tkinter)
+        
+        Args:
+            job (TransferJob): Trabalho concluído
+        """
+        action = "enviar" if job.kind == 'upload' else "baixar"
+        if job.status == CANCELLED:
+            self.log(f"⛔ Transferência cancelada: {job.name} (pode ser retomada)")
+        elif job.status == FAILED:
+            self.log(f"❌ Erro ao {action} arquivo {job.name}: {job.error}")
+        elif job.result.get('status') != 'success':
+            error_msg = job.result.get('message', 'Erro desconhecido')
+            self.log(f"❌ Erro ao {action} arquivo {job.name}: {error_msg}")
+        else:
+            elapsed = max(job.finished - job.started, 1e-9)
+            self.log(f"✅ {job.name}: {format_size(job.done)} em {elapsed:.1f}s "
+                     f"({format_size(job.done / elapsed)}/s)")
+            if job.kind == 'upload' and self.connected and not self.subscription:
+                self.refresh_files()  # Atualiza lista (servidor sem eventos)
+                
+
     def connect_to_server(self):
         """Conecta ao servidor de arquivos"""
         try:
@@ -176,10 +327,11 @@ class FileClient:
                 
             self.log(f"🔗 Conectando a {host}:{port}...")
             
-            # Cria socket e conecta
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(10)  # Timeout de 10 segundos
-            self.socket.connect((host, port))
+            # Conecta (timeout de 10 segundos) e descobre os recursos
+            # opcionais do servidor
+            api = FileShareClient((host, port), log=self.log, cache=self.download_cache)
+            api.connect()
+            self.api = api
             
             self.connected = True
             self.status_var.set(f"✅ Conectado a {host}:{port}")
@@ -190,6 +342,13 @@ class FileClient:
             
             self.log("✅ Conectado com sucesso!")
             
+            # Mudanças (nossas e de outros usuários) chegam como eventos;
+            # a assinatura vem antes da lista para nada se perder entre as duas
+            if api.server_subscribe:
+                self.file_events.clear()
+                self.subscription = api.subscribe(self.file_events.extend,
+                                                  self.request_resync)
+                
             # Carrega lista de arquivos
             self.refresh_files()
             
@@ -208,9 +367,12 @@ class FileClient:
     def disconnect_from_server(self):
         """Desconecta do servidor"""
         try:
-            if self.socket:
-                self.socket.close()
-                self.socket = None
+            if self.subscription:
+                self.subscription.close()
+                self.subscription = None
+            if self.api:
+                self.api.close()
+                self.api = None
                 
             self.connected = False
             self.status_var.set("❌ Desconectado")
@@ -220,159 +382,179 @@ class FileClient:
             self.disconnect_btn.config(state="disabled")
             
             # Limpa lista de arquivos
-            for item in self.files_tree.get_children():
-                self.files_tree.delete(item)
-                
+            self.file_view.clear()
+            
             self.log("👋 Desconectado do servidor")
             
         except Exception as e:
             self.log(f"❌ Erro ao desconectar: {e}")
             
-    def send_request(self, request):
+    def upload_codec(self):
         """
-        Envia uma requisição para o servidor
+        Codec usado nos envios (lê a interface: chamar na thread do Tkinter)
         
-        Args:
-            request (dict): Requisição a ser enviada
-            
         Returns:
-            dict: Resposta do servidor ou None em caso de erro
+            str: Primeiro codec do servidor que também existe aqui, ou None
+        """
+        return self.api.upload_codec(self.compress_var.get())
+        
+    def refresh_files(self, first_page=None):
+        """
+        Atualiza a lista de arquivos do servidor
+        
+        Args:
+            first_page (dict): Resposta da primeira página, se ela já foi
+                pedida junto com outras requisições (ver delete_file)
         """
-        try:
-            if not self.connected or not self.socket:
-                messagebox.showerror("Erro", "Não conectado ao servidor")
-                return None
-                
-            # Envia requisição
-            self.socket.send(json.dumps(request).encode('utf-8'))
-            
-            # Recebe resposta
-            response = self.socket.recv(4096).decode('utf-8')
-            return json.loads(response)
-            
-        except Exception as e:
-            self.log(f"❌ Erro na comunicação: {e}")
-            messagebox.showerror("Erro", f"Erro na comunicação: {e}")
-            return None
-            
-    def refresh_files(self):
-        """Atualiza a lista de arquivos do servidor"""
         if not self.connected:
             messagebox.showwarning("Aviso", "Conecte-se ao servidor primeiro")
             return
             
         self.log("🔄 Atualizando lista de arquivos...")
         
-        # Solicita lista de arquivos
-        response = self.send_request({'action': 'list_files'})
-        
-        if response and response.get('status') == 'success':
-            # Limpa lista atual
-            for item in self.files_tree.get_children():
-                self.files_tree.delete(item)
-                
-            # Adiciona arquivos à lista
-            files = response.get('files', [])
-            for file_info in files:
-                # Formata tamanho do arquivo
-                size = file_info['size']
-                if size < 1024:
-                    size_str = f"{size} B"
-                elif size < 1024 * 1024:
-                    size_str = f"{size / 1024:.1f} KB"
-                else:
-                    size_str = f"{size / (1024 * 1024):.1f} MB"
-                    
-                # Adiciona à lista
-                self.files_tree.insert("", "end", values=(
-                    file_info['name'],
-                    size_str,
-                    file_info['modified']
-                ))
+        try:
+            # Junta as páginas e troca a lista de uma vez: só as linhas que
+            # mudaram são aplicadas ao modelo
+            files = []
+            for page in self.api.iter_pages(self.list_request(), first_page):
+                files.extend(page)
+            count = self.file_view.replace(files)
                 
-            self.log(f"✅ {len(files)} arquivo(s) encontrado(s)")
-        else:
-            error_msg = response.get('message', 'Erro desconhecido') if response else 'Sem resposta'
-            self.log(f"❌ Erro ao listar arquivos: {error_msg}")
+            self.log(f"✅ {count} arquivo(s) encontrado(s)")
+        except ClientError as e:
+            self.log(f"❌ Erro ao listar arquivos: {e}")
+        except Exception as e:
+            self.log(f"❌ Erro na comunicação: {e}")
+            messagebox.showerror("Erro", f"Erro na comunicação: {e}")
             
+    def list_request(self):
+        """Requisição da primeira página da lista de arquivos"""
+        return self.api.list_request()
+        
+    def request_resync(self):
+        """Eventos se perderam (thread da assinatura): a lista é relida em poll_ui"""
+        self.resync_needed = True
+        
+    def apply_file_events(self):
+        """Aplica à lista as mudanças recebidas do servidor (thread do Tkinter)"""
+        if self.resync_needed and self.connected:
+            self.resync_needed = False
+            self.file_events.clear()
+            self.refresh_files()
+            return
+        events = []
+        while self.file_events:
+            events.append(self.file_events.popleft())
+        if events:
+            self.file_view.apply(events)  # Redesenha uma vez por lote
+        
     def upload_file(self):
-        """Envia um arquivo para o servidor"""
+        """Coloca o envio de um ou mais arquivos na fila de transferências"""
         if not self.connected:
             messagebox.showwarning("Aviso", "Conecte-se ao servidor primeiro")
             return
             
-        # Seleciona arquivo para enviar
-        file_path = filedialog.askopenfilename(
-            title="Selecione um arquivo para enviar",
+        # Seleciona arquivos para enviar
+        file_paths = filedialog.askopenfilenames(
+            title="Selecione os arquivos para enviar",
             filetypes=[("Todos os arquivos", "*.*")]
         )
         
-        if not file_path:
+        if not file_paths:
+            return
+        if len(file_paths) > 1:
+            # Vários arquivos vão num único lote
+            self.submit_batch_upload([Path(path) for path in file_paths], f"{len(file_paths)} arquivos")
             return
             
         try:
-            file_path = Path(file_path)
+            file_path = Path(file_paths[0])
             filename = file_path.name
             filesize = file_path.stat().st_size
             
-            self.log(f"📤 Enviando arquivo: {filename} ({filesize} bytes)")
-            
-            # Envia informações do arquivo
-            request = {
-                'action': 'upload_file',
-                'filename': filename,
-                'filesize': filesize
-            }
-            
-            self.socket.send(json.dumps(request).encode('utf-8'))
-            
-            # Envia o arquivo em chunks
-            with open(file_path, 'rb') as f:
-                bytes_sent = 0
-                while bytes_sent < filesize:
-                    chunk = f.read(4096)
-                    if not chunk:
-                        break
-                    self.socket.send(chunk)
-                    bytes_sent += len(chunk)
-                    
-            # Recebe confirmação
-            response = self.socket.recv(1024).decode('utf-8')
-            response = json.loads(response)
-            
-            if response.get('status') == 'success':
-                self.log("✅ Arquivo enviado com sucesso!")
-                messagebox.showinfo("Sucesso", f"Arquivo {filename} enviado com sucesso!")
-                self.refresh_files()  # Atualiza lista
-            else:
-                error_msg = response.get('message', 'Erro desconhecido')
-                self.log(f"❌ Erro ao enviar arquivo: {error_msg}")
-                messagebox.showerror("Erro", f"Erro ao enviar arquivo: {error_msg}")
-                
+            # Opções lidas aqui: variáveis do Tkinter só na thread da interface
+            dedup = self.dedup_var.get()
+            codec = self.upload_codec()
+            
+            self.transfers.submit(
+                'upload', filename,
+                lambda job: self.api.upload(file_path, codec, dedup, job.progress)
+            )
+            self.log(f"📤 Envio na fila: {filename} ({filesize} bytes)")
+            
+        except queue.Full:
+            messagebox.showwarning("Aviso", "Muitas transferências na fila. Aguarde algumas terminarem.")
         except Exception as e:
             self.log(f"❌ Erro ao enviar arquivo: {e}")
             messagebox.showerror("Erro", f"Erro ao enviar arquivo: {e}")
             
+    def upload_folder(self):
+        """Envia todos os arquivos de uma pasta (sem subpastas) num único lote"""
+        if not self.connected:
+            messagebox.showwarning("Aviso", "Conecte-se ao servidor primeiro")
+            return
+            
+        folder = filedialog.askdirectory(title="Selecione uma pasta para enviar")
+        if not folder:
+            return
+            
+        try:
+            with os.scandir(folder) as it:
+                paths = [Path(entry.path) for entry in it if entry.is_file()]
+            self.submit_batch_upload(paths, f"{Path(folder).name}/")
+        except Exception as e:
+            self.log(f"❌ Erro ao enviar pasta: {e}")
+            messagebox.showerror("Erro", f"Erro ao enviar pasta: {e}")
+            
+    def submit_batch_upload(self, paths, label):
+        """
+        Coloca o envio de vários arquivos, como um lote, na fila
+        
+        Args:
+            paths (list): Arquivos locais
+            label (str): Nome exibido na lista de transferências
+        """
+        entries = [(path.name, path) for path in paths if valid_name(path.name)]
+        skipped = len(paths) - len(entries)
+        if skipped:
+            self.log(f"⚠️ {skipped} arquivo(s) com nome não suportado ignorado(s)")
+        if not entries:
+            messagebox.showwarning("Aviso", "Nenhum arquivo para enviar")
+            return
+            
+        try:
+            codec = self.upload_codec()
+            self.transfers.submit(
+                'upload', label,
+                lambda job: self.api.upload_batch(entries, codec, job.progress)
+            )
+            self.log(f"📦 Lote na fila: {label} ({len(entries)} arquivo(s))")
+        except queue.Full:
+            messagebox.showwarning("Aviso", "Muitas transferências na fila. Aguarde algumas terminarem.")
+            
     def download_file(self):
-        """Baixa um arquivo do servidor"""
+        """Coloca o download de um arquivo na fila de transferências"""
         if not self.connected:
             messagebox.showwarning("Aviso", "Conecte-se ao servidor primeiro")
             return
             
         # Verifica se um arquivo foi selecionado
-        selection = self.files_tree.selection()
+        selection = self.file_view.selected_names()
         if not selection:
             messagebox.showwarning("Aviso", "Selecione um arquivo para baixar")
             return
+        if len(selection) > 1:
+            # Vários arquivos vêm num único lote
+            self.download_batch(selection)
+            return
             
         # Obtém nome do arquivo selecionado
-        item = self.files_tree.item(selection[0])
-        filename = item['values'][0]
+        filename = selection[0]
         
         # Seleciona pasta para salvar
         save_path = filedialog.asksaveasfilename(
             title="Salvar arquivo como",
-            initialvalue=filename,
+            initialfile=filename,
             filetypes=[("Todos os arquivos", "*.*")]
         )
         
@@ -380,83 +562,96 @@ class FileClient:
             return
             
         try:
-            self.log(f"📥 Baixando arquivo: {filename}")
-            
-            # Solicita arquivo
-            request = {
-                'action': 'download_file',
-                'filename': filename
-            }
-            
-            response = self.send_request(request)
-            
-            if response and response.get('status') == 'success':
-                filesize = response['filesize']
-                
-                # Confirma recebimento
-                self.socket.send(b'OK')
-                
-                # Recebe arquivo em chunks
-                with open(save_path, 'wb') as f:
-                    bytes_received = 0
-                    while bytes_received < filesize:
-                        chunk = self.socket.recv(min(4096, filesize - bytes_received))
-                        if not chunk:
-                            break
-                        f.write(chunk)
-                        bytes_received += len(chunk)
-                        
-                self.log("✅ Arquivo baixado com sucesso!")
-                messagebox.showinfo("Sucesso", f"Arquivo salvo em: {save_path}")
-                
-            else:
-                error_msg = response.get('message', 'Erro desconhecido') if response else 'Sem resposta'
-                self.log(f"❌ Erro ao baixar arquivo: {error_msg}")
-                messagebox.showerror("Erro", f"Erro ao baixar arquivo: {error_msg}")
-                
+            # Opções lidas aqui: variáveis do Tkinter só na thread da interface
+            streams = self.streams_var.get().strip()
+            streams = int(streams) if streams.isdigit() and int(streams) > 0 else None
+            compression = self.api.download_codecs(self.compress_var.get())
+            
+            # Quedas de conexão são retomadas de onde pararam
+            self.transfers.submit(
+                'download', filename,
+                lambda job: self.api.download(filename, save_path, streams, compression,
+                                              job.progress)
+            )
+            self.log(f"📥 Download na fila: {filename}")
+            
+        except queue.Full:
+            messagebox.showwarning("Aviso", "Muitas transferências na fila. Aguarde algumas terminarem.")
         except Exception as e:
             self.log(f"❌ Erro ao baixar arquivo: {e}")
             messagebox.showerror("Erro", f"Erro ao baixar arquivo: {e}")
             
+    def download_batch(self, filenames):
+        """
+        Coloca o download de vários arquivos, como um lote, na fila
+        
+        Args:
+            filenames (list): Nomes dos arquivos no servidor
+        """
+        folder = filedialog.askdirectory(title="Salvar arquivos na pasta")
+        if not folder:
+            return
+            
+        try:
+            compression = self.api.download_codecs(self.compress_var.get())
+            self.transfers.submit(
+                'download', f"{len(filenames)} arquivos",
+                lambda job: self.api.download_batch(filenames, folder, compression, job.progress)
+            )
+            self.log(f"📦 Download em lote na fila: {len(filenames)} arquivo(s)")
+        except queue.Full:
+            messagebox.showwarning("Aviso", "Muitas transferências na fila. Aguarde algumas terminarem.")
+            
     def delete_file(self):
         """Deleta um arquivo do servidor"""
         if not self.connected:
             messagebox.showwarning("Aviso", "Conecte-se ao servidor primeiro")
             return
             
-        # Verifica se um arquivo foi selecionado
-        selection = self.files_tree.selection()
-        if not selection:
+        # Verifica se algum arquivo foi selecionado (também fora da tela)
+        filenames = self.file_view.selected_names()
+        if not filenames:
             messagebox.showwarning("Aviso", "Selecione um arquivo para deletar")
             return
-            
-        # Obtém nome do arquivo selecionado
-        item = self.files_tree.item(selection[0])
-        filename = item['values'][0]
         
         # Confirma deleção
-        if not messagebox.askyesno("Confirmar", f"Deseja realmente deletar o arquivo '{filename}'?"):
+        if len(filenames) == 1:
+            question = f"Deseja realmente deletar o arquivo '{filenames[0]}'?"
+        else:
+            question = f"Deseja realmente deletar {len(filenames)} arquivos?"
+        if not messagebox.askyesno("Confirmar", question):
             return
             
         try:
-            self.log(f"🗑️ Deletando arquivo: {filename}")
-            
-            # Solicita deleção
-            request = {
-                'action': 'delete_file',
-                'filename': filename
-            }
-            
-            response = self.send_request(request)
-            
-            if response and response.get('status') == 'success':
-                self.log("✅ Arquivo deletado com sucesso!")
-                messagebox.showinfo("Sucesso", f"Arquivo {filename} deletado com sucesso!")
-                self.refresh_files()  # Atualiza lista
+            self.log(f"🗑️ Deletando {len(filenames)} arquivo(s): {', '.join(filenames[:5])}"
+                     + ("..." if len(filenames) > 5 else ""))
+            
+            # Todas as deleções (e a nova listagem, se o servidor não envia
+            # eventos) saem em pipeline
+            requests = [{'action': 'delete_file', 'filename': filename} for filename in filenames]
+            if self.subscription:
+                responses = self.api.pipeline(requests)
+                first_page = None
+            else:
+                responses = self.api.pipeline(requests + [self.list_request()])
+                first_page = responses.pop()
+            
+            failed = [(filename, response.get('message', 'Erro desconhecido'))
+                      for filename, response in zip(filenames, responses)
+                      if response.get('status') != 'success']
+            deleted = len(filenames) - len(failed)
+            if deleted:
+                self.log(f"✅ {deleted} arquivo(s) deletado(s) com sucesso!")
+                if first_page:
+                    self.refresh_files(first_page)  # Atualiza lista
+            if failed:
+                for filename, error_msg in failed:
+                    self.log(f"❌ Erro ao deletar {filename}: {error_msg}")
+                messagebox.showerror("Erro", f"Erro ao deletar {len(failed)} arquivo(s): {failed[0][1]}")
+            elif len(filenames) == 1:
+                messagebox.showinfo("Sucesso", f"Arquivo {filenames[0]} deletado com sucesso!")
             else:
-                error_msg = response.get('message', 'Erro desconhecido') if response else 'Sem resposta'
-                self.log(f"❌ Erro ao deletar arquivo: {error_msg}")
-                messagebox.showerror("Erro", f"Erro ao deletar arquivo: {error_msg}")
+                messagebox.showinfo("Sucesso", f"{deleted} arquivos deletados com sucesso!")
                 
         except Exception as e:
             self.log(f"❌ Erro ao deletar arquivo: {e}")
@@ -464,8 +659,14 @@ class FileClient:
             
     def on_closing(self):
         """Função chamada quando a janela está sendo fechada"""
+        if self.transfers.active() and not messagebox.askyesno(
+                "Confirmar", "Há transferências em andamento. Cancelar e sair?"):
+            return
+        self.transfers.shutdown()
         if self.connected:
             self.disconnect_from_server()
+        if self.download_cache:
+            self.download_cache.close()
         self.root.destroy()
 
 def main():
@@ -5,62 +5,488 @@ Aplicativo de Compartilhamento de Arquivos - SERVIDOR
 Permite o compartilhamento de arquivos através da rede local
 """
 
+import argparse
+import select
 import socket
 import threading
 import os
 import json
+import struct
+import sys
 import time
 from pathlib import Path
-import hashlib
+
+from protocol import (
+    FrameConnection, ProtocolError, FRAME_REQUEST, FRAME_RESPONSE, decode_json, parse_address
+)
+from compression import (available_codecs, negotiate, send_stream, receive_stream,
+                         StreamOverflow)
+from chunk_store import ChunkStore, ChunkIndexer
+from listing import ListingCache
+from metadata_index import MetadataIndex
+from watcher import FolderWatcher
+from connections import (
+    ConnectionRegistry, DEFAULT_MAX_CONNECTIONS, IDLE_TIMEOUT, READ_TIMEOUT, DRAIN_TIMEOUT
+)
+from file_cache import (
+    FileCache, DEFAULT_MAX_BYTES, DEFAULT_MAX_FILE_SIZE, DEFAULT_MAP_MAX_SIZE
+)
+from metrics import ServerMetrics, start_http_exporter
+from archive import FolderSink, send_archive, receive_archive, valid_name
+from hash_cache import (
+    HashCache, BlockHasher, HashingReader, HashingWriter, BLOCK_SIZE, CHECKSUM_ALGORITHM,
+    block_span, tree_digest
+)
+from durability import (
+    DurableWriter, FSYNC_NONE, FSYNC_POLICIES, FSYNC_INTERVAL, open_upload, publish
+)
+from bandwidth import (
+    BandwidthScheduler, parse_rate, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK
+)
+from replication import Replicator, advertised_address
+
+# Conexões pendentes aceitas pelo listen() por padrão
+DEFAULT_BACKLOG = 128
+
+# Pasta de arquivos compartilhados por padrão
+DEFAULT_SHARED_FOLDER = "shared_files"
+
+# Maior arquivo aceito no envio incremental (ver enable_dedup)
+DEFAULT_DEDUP_MAX_SIZE = 256 * 1024 * 1024
+
+# Tempo máximo esperando um assinante lento aceitar eventos antes de desligá-lo
+PUSH_TIMEOUT = 5.0
+
+# Eventos por frame enviado aos assinantes
+PUSH_BATCH = 200
+
+# Classe de prioridade de banda de cada ação (as demais são interativas)
+ACTION_PRIORITIES = {
+    'upload_file': PRIORITY_NORMAL,
+    'dedup_upload': PRIORITY_NORMAL,
+    'download_file': PRIORITY_NORMAL,
+    'batch_upload': PRIORITY_BULK,
+    'batch_download': PRIORITY_BULK,
+}
+
+# Ações que alteram a pasta: uma réplica as recusa (ver replication.py)
+WRITE_ACTIONS = ('upload_file', 'dedup_upload', 'batch_upload', 'delete_file')
+
+# Ações de escrita cujo conteúdo chega num fluxo de dados logo após a requisição
+STREAMED_WRITES = ('upload_file', 'dedup_upload', 'batch_upload')
+
+def set_send_timeout(sock, seconds):
+    """
+    Limita quanto tempo uma escrita no socket pode ficar parada
+    
+    Vale só para envios (SO_SNDTIMEO): leituras continuam sem limite.
+    
+    Args:
+        sock: Socket
+        seconds (float): Tempo máximo sem progresso numa escrita
+    """
+    if hasattr(sock, 'send_timeout'):
+        # Socket do servidor assíncrono: a espera é feita no event loop
+        sock.send_timeout = seconds
+        return
+    if sys.platform == 'win32':
+        value = struct.pack('I', int(seconds * 1000))
+    else:
+        value = struct.pack('ll', int(seconds), int(seconds % 1 * 1e6))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, value)
+    except OSError:
+        pass  # Sem suporte: fica só a espera por select antes de cada envio
+        
+def file_validator(stat):
+    """
+    Identifica uma versão de arquivo pelo tamanho e data de modificação
+    
+    Args:
+        stat: Resultado de os.stat/os.fstat
+        
+    Returns:
+        str: Validador comparado nas retomadas de download
+    """
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
 
 class FileServer:
-    def __init__(self, host='localhost', port=8888):
+    def __init__(self, host='localhost', port=8888, backlog=DEFAULT_BACKLOG,
+                 shared_folder=DEFAULT_SHARED_FOLDER):
         """
         Inicializa o servidor de arquivos
         
         Args:
             host (str): Endereço IP do servidor
             port (int): Porta do servidor
+            backlog (int): Tamanho da fila de conexões pendentes
+            shared_folder (str): Pasta de arquivos compartilhados
         """
         self.host = host
         self.port = port
+        self.backlog = backlog
         self.socket = None
-        self.clients = []  # Lista de clientes conectados
-        self.shared_folder = Path("shared_files")  # Pasta de arquivos compartilhados
+        self.listen_socket = None  # Socket de escuta recebido pronto (ver prefork.py)
+        self.reuse_port = False  # Divide a porta com outros processos (SO_REUSEPORT)
+        self.connections = ConnectionRegistry()  # Conexões ativas (ver limit_connections)
+        self.drain_timeout = DRAIN_TIMEOUT  # Espera pelas requisições em andamento ao parar
+        self.shared_folder = Path(shared_folder)  # Pasta de arquivos compartilhados
+        self.meta_folder = self.shared_folder / ".fileshare"  # Dados internos do servidor
+        self.uploads_folder = self.meta_folder / "uploads"  # Uploads em andamento
         self.running = False
+        self.metrics_http = None  # Endpoint HTTP do Prometheus (ver serve_metrics)
+        self.zero_copy = True  # Usa sendfile nos downloads quando disponível
+        self.fsync_policy = FSYNC_NONE  # Durabilidade dos uploads (ver durability.py)
+        self.fsync_interval = FSYNC_INTERVAL  # Bytes entre fsync na política periódica
+        self.chunk_store = None  # Armazenamento de pedaços (ver enable_dedup)
+        self.chunk_indexer = None  # Divide os arquivos publicados em segundo plano
+        self.dedup_max_size = DEFAULT_DEDUP_MAX_SIZE
+        self.listing = ListingCache(self.shared_folder)  # Cache da listagem
+        self.hashes = None  # Resumos dos arquivos (criado junto com as pastas)
+        self.index = None  # Índice de metadados da ação `search` (ver sync_index)
+        self.watcher = None  # Eventos de mudança da pasta (criado no primeiro subscribe)
+        self.watcher_lock = threading.Lock()
+        self.file_cache = None  # Arquivos pequenos e médios em memória (ver enable_file_cache)
+        self.leader = None  # Principal, se este servidor é uma réplica (ver enable_replication)
+        self.replicator = None
+        self.metrics = ServerMetrics()  # Contadores e latências (ação `stats`)
+        self.bandwidth = BandwidthScheduler()  # Limites de banda (ver limit_bandwidth)
+        self.metrics.add_gauge(
+            'connections_rejected', 'Conexões recusadas pelo limite de conexões',
+            lambda: self.connections.rejected
+        )
+        self.metrics.add_gauge(
+            'connections_expired', 'Conexões encerradas por ociosidade ou leitura parada',
+            lambda: self.connections.expired
+        )
         
         # Cria a pasta compartilhada se não existir
         self.shared_folder.mkdir(exist_ok=True)
+        self.uploads_folder.mkdir(parents=True, exist_ok=True)
+        self.hashes = HashCache(self.meta_folder / "hashes.db")
+        self.index = MetadataIndex(self.meta_folder / "index.db")
+        
+    def sync_index(self):
+        """
+        Confere o índice de metadados com a pasta compartilhada
+        
+        Feito uma vez ao iniciar (no modo pré-fork, pelo processo mestre, ver
+        prepare_folder): depois o índice é atualizado a cada upload e remoção.
+        """
+        self.update_index(self.index, self.shared_folder, self.hashes)
+        
+    @staticmethod
+    def update_index(index, shared_folder, hashes):
+        """Confere um índice de metadados com a pasta (ver sync_index)"""
+        added, removed = index.sync(shared_folder, hashes.checksum)
+        if added or removed:
+            print(f"🗂️ Índice atualizado: {added} arquivo(s) novo(s) ou alterado(s), "
+                  f"{removed} removido(s)")
+            
+    def shared_path(self, filename):
+        """
+        Caminho na pasta compartilhada de um nome enviado pelo cliente
+        
+        Só nomes simples são aceitos: nada de diretórios (nem `..`), que
+        levariam para fora da pasta, nem a pasta de dados internos.
+        
+        Args:
+            filename (str): Nome do arquivo
+            
+        Returns:
+            Path: Caminho do arquivo
+            
+        Raises:
+            ValueError: Se o nome não é de um arquivo da pasta compartilhada
+        """
+        if (not isinstance(filename, str) or filename in ('', '.', '..')
+                or '/' in filename or '\\' in filename or '\0' in filename
+                or Path(filename).name != filename
+                or filename.lower() == self.meta_folder.name.lower()):
+            raise ValueError(f'Nome de arquivo inválido: {filename!r}')
+        return self.shared_folder / filename
+        
+    def file_changed(self, filename, checksum=None):
+        """
+        Atualiza caches, índice e assinantes depois de publicar ou remover um arquivo
+        
+        Args:
+            filename (str): Nome do arquivo
+            checksum (str): Checksum da versão publicada, se conhecido
+            
+        Returns:
+            os.stat_result: Versão atual do arquivo ou None se ele não existe
+        """
+        file_path = self.shared_folder / filename
+        self.listing.invalidate()
+        if self.file_cache:
+            self.file_cache.invalidate(file_path)
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            stat = None
+        if stat:
+            self.index.update(filename, stat, checksum)
+            if self.chunk_indexer and self.chunk_store.recipe_path(filename).exists():
+                # Arquivo já usado no envio incremental: a receita da nova
+                # versão fica pronta para o próximo envio
+                self.chunk_indexer.schedule(filename, file_path)
+        else:
+            self.index.remove(filename)
+        if self.watcher:
+            self.watcher.notify(filename)
+        return stat
+        
+    def enable_dedup(self, collect_garbage=True, max_file_size=DEFAULT_DEDUP_MAX_SIZE):
+        """
+        Ativa o envio incremental (só os pedaços que o servidor não tem)
+        
+        Os pedaços ficam guardados além dos arquivos publicados: o disco
+        usado cresce, por isso só arquivos até max_file_size participam.
+        
+        Args:
+            collect_garbage (bool): Remove os pedaços sem uso antes de começar
+                (no modo pré-fork só o processo mestre faz isso)
+            max_file_size (int): Maior arquivo aceito no envio incremental
+        """
+        self.chunk_store = ChunkStore(self.meta_folder / "dedup")
+        self.chunk_indexer = ChunkIndexer(self.chunk_store, file_validator, max_file_size)
+        self.dedup_max_size = max_file_size
+        if collect_garbage:
+            self.clean_chunk_store(self.chunk_store)
+            
+    @staticmethod
+    def clean_chunk_store(store):
+        """Remove os pedaços sem uso de um armazenamento deduplicado"""
+        removed = store.collect_garbage()
+        if removed:
+            print(f"🧹 {removed} pedaço(s) sem uso removido(s)")
+            
+    @classmethod
+    def prepare_folder(cls, shared_folder=DEFAULT_SHARED_FOLDER, dedup=False):
+        """
+        Confere o índice e faz a manutenção da pasta compartilhada uma vez só
+        
+        Chamado pelo processo mestre antes de criar os processos, que então
+        pulam essa etapa (ver create_server). Nada fica aberto depois: o
+        mestre não leva conexões de banco para os processos criados.
+        
+        Args:
+            shared_folder (str): Pasta de arquivos compartilhados
+            dedup (bool): Remove os pedaços sem uso do armazenamento deduplicado
+        """
+        shared_folder = Path(shared_folder)
+        meta_folder = shared_folder / ".fileshare"
+        meta_folder.mkdir(parents=True, exist_ok=True)
+        hashes = HashCache(meta_folder / "hashes.db")
+        index = MetadataIndex(meta_folder / "index.db")
+        try:
+            cls.update_index(index, shared_folder, hashes)
+        finally:
+            index.close()
+            hashes.close()
+        if dedup:
+            cls.clean_chunk_store(ChunkStore(meta_folder / "dedup"))
+            
+    def enable_file_cache(self, max_bytes, max_file_size, map_max_size):
+        """
+        Serve os arquivos pequenos da memória e os médios por mmap
+        
+        Args:
+            max_bytes (int): Memória do cache de arquivos pequenos
+            max_file_size (int): Maior arquivo guardado inteiro na memória
+            map_max_size (int): Maior arquivo servido por mmap (0 desativa)
+        """
+        self.file_cache = FileCache(max_bytes, max_file_size, map_max_size)
+        for name, description in (
+            ('hits', 'Downloads servidos do cache de arquivos pequenos'),
+            ('misses', 'Downloads de arquivos pequenos lidos do disco'),
+            ('map_hits', 'Downloads servidos por um mmap já aberto'),
+            ('map_misses', 'Arquivos médios mapeados com mmap'),
+            ('evictions', 'Arquivos descartados do cache por falta de espaço'),
+            ('bytes', 'Memória ocupada pelo cache de arquivos pequenos')
+        ):
+            self.metrics.add_gauge(
+                f'file_cache_{name}', description,
+                lambda name=name: self.file_cache.stats()[name]
+            )
+            
+    def enable_replication(self, leader, apply_changes=True):
+        """
+        Torna este servidor uma réplica somente leitura de outro
+        
+        A réplica começa a acompanhar o principal em start_server (o
+        endereço anunciado aos clientes só é conhecido depois do bind).
+        
+        Args:
+            leader (tuple): (host, porta) do principal
+            apply_changes (bool): Aplica as mudanças do principal (no modo
+                pré-fork só um processo faz isso; os demais só recusam escritas)
+        """
+        self.leader = leader
+        if apply_changes:
+            self.replicator = Replicator(self, leader)
+            self.metrics.add_gauge(
+                'replication_lag_events', 'Eventos do principal ainda não aplicados',
+                self.replicator.lag
+            )
+            self.metrics.add_gauge(
+                'replication_fetched', 'Arquivos copiados do principal',
+                lambda: self.replicator.fetched
+            )
+            
+    def start_replication(self):
+        """Começa a acompanhar o principal (chamado depois do bind)"""
+        if self.replicator:
+            self.replicator.start()
+            
+    def replica_addresses(self):
+        """
+        Réplicas conectadas a este servidor
+        
+        Returns:
+            list: Endereços 'host:porta' anunciados pelas réplicas
+        """
+        return sorted({client.replica for client in self.connections.snapshot()
+                       if client.replica})
+        
+    def reject_write(self, request, conn):
+        """
+        Recusa uma escrita numa réplica, mantendo o protocolo sincronizado
+        
+        Args:
+            request (dict): Requisição recusada
+            conn (FrameConnection): Conexão com o cliente
+            
+        Returns:
+            dict: Erro com o endereço do principal
+        """
+        action = request.get('action')
+        if action in STREAMED_WRITES:
+            conn.discard_data()
+            if action == 'upload_file':
+                self.receive_trailer(conn, request)
+        leader = f"{self.leader[0]}:{self.leader[1]}"
+        return {
+            'status': 'error',
+            'code': 'read_only',
+            'message': f'Réplica somente leitura: envie as alterações para {leader}',
+            'leader': leader
+        }
+        
+    def limit_connections(self, max_connections=DEFAULT_MAX_CONNECTIONS,
+                          idle_timeout=IDLE_TIMEOUT, read_timeout=READ_TIMEOUT):
+        """
+        Limita as conexões simultâneas e o tempo que uma conexão pode ficar parada
+        
+        Deve ser chamado antes de start_server.
+        
+        Args:
+            max_connections (int): Conexões simultâneas; as demais são
+                recusadas na hora (0 = sem limite)
+            idle_timeout (float): Segundos sem requisições até fechar a
+                conexão; assinantes de eventos não expiram (0 = sem limite)
+            read_timeout (float): Segundos de leitura parada no meio de uma
+                requisição ou upload (0 = sem limite)
+        """
+        self.connections = ConnectionRegistry(max_connections, idle_timeout, read_timeout)
+        
+    def limit_bandwidth(self, egress=None, ingress=None, client_egress=None,
+                        client_ingress=None):
+        """
+        Limita a banda do servidor, dividida em rodízio entre os clientes
+        
+        Vale para as conexões aceitas daqui em diante. Todos os limites são
+        em bytes/s; None deixa a direção sem limite.
+        
+        Args:
+            egress (int): Envio total (downloads)
+            ingress (int): Recepção total (uploads)
+            client_egress (int): Envio para cada cliente (IP)
+            client_ingress (int): Recepção de cada cliente (IP)
+        """
+        self.bandwidth = BandwidthScheduler(egress, ingress, client_egress, client_ingress)
+        self.metrics.add_gauge(
+            'bandwidth_waiters', 'Transferências esperando a vez no limite de banda',
+            self.bandwidth.waiters
+        )
+        self.metrics.add_gauge(
+            'bandwidth_wait_seconds', 'Tempo total de espera pelo limite de banda',
+            lambda: round(self.bandwidth.waited, 3)
+        )
+        
+    def serve_metrics(self, port, host=None):
+        """
+        Publica as métricas em http://host:port/metrics para o Prometheus
+        
+        Args:
+            port (int): Porta do endpoint HTTP
+            host (str): Endereço de escuta (padrão: o mesmo do servidor)
+        """
+        self.metrics_http = start_http_exporter(self.metrics, host or self.host, port)
+        host, port = self.metrics_http.server_address[:2]
+        print(f"📊 Métricas em http://{host}:{port}/metrics")
+        
+    def create_listen_socket(self):
+        """
+        Cria o socket de escuta do servidor
+        
+        Com `listen_socket` o socket já vem pronto de outro processo; com
+        `reuse_port` vários processos escutam a mesma porta e o sistema
+        distribui as conexões entre eles.
+        
+        Returns:
+            socket.socket: Socket vinculado e escutando
+        """
+        if self.listen_socket is not None:
+            self.port = self.listen_socket.getsockname()[1]
+            return self.listen_socket
+            
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        
+        # Vincula o socket ao endereço e porta
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        
+        # Porta 0 pede ao sistema uma porta livre: guarda a escolhida
+        self.port = sock.getsockname()[1]
+        return sock
+        
+    def announce(self):
+        """Mostra as informações de início do servidor"""
+        print(f"🚀 Servidor iniciado em {self.host}:{self.port}")
+        print(f"📁 Pasta compartilhada: {self.shared_folder.absolute()}")
+        print("⏳ Aguardando conexões...")
         
     def start_server(self):
         """Inicia o servidor e fica aguardando conexões"""
         try:
             # Cria o socket do servidor
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
-            # Vincula o socket ao endereço e porta
-            self.socket.bind((self.host, self.port))
-            self.socket.listen(5)  # Permite até 5 conexões pendentes
+            self.socket = self.create_listen_socket()
             
             self.running = True
-            print(f"🚀 Servidor iniciado em {self.host}:{self.port}")
-            print(f"📁 Pasta compartilhada: {self.shared_folder.absolute()}")
-            print("⏳ Aguardando conexões...")
+            self.connections.start()
+            self.announce()
+            self.start_replication()
             
             while self.running:
                 try:
                     # Aceita conexões de clientes
                     client_socket, client_address = self.socket.accept()
-                    print(f"👤 Cliente conectado: {client_address}")
                     
-                    # Adiciona cliente à lista
-                    self.clients.append(client_socket)
+                    # Registra o cliente (servidor cheio: recusado sem criar thread)
+                    client = self.connections.register(client_socket, client_address)
+                    if client is None:
+                        continue
+                    print(f"👤 Cliente conectado: {client_address}")
                     
                     # Cria uma thread para cada cliente
                     client_thread = threading.Thread(
                         target=self.handle_client,
-                        args=(client_socket, client_address)
+                        args=(client,)
                     )
                     client_thread.daemon = True
                     client_thread.start()
@@ -72,64 +498,157 @@ class FileServer:
         except Exception as e:
             print(f"❌ Erro ao iniciar servidor: {e}")
             
-    def handle_client(self, client_socket, client_address):
+    def handle_client(self, client):
         """
         Manipula as requisições de um cliente específico
         
         Args:
-            client_socket: Socket do cliente
-            client_address: Endereço do cliente
+            client (ClientConnection): Conexão registrada do cliente
         """
+        client_socket, client_address = client.sock, client.address
+        conn = client.conn = FrameConnection(client_socket)
+        self.metrics.connection_opened(conn, client_address)
+        self.bandwidth.attach(conn, client_address)
         try:
             while self.running:
-                # Recebe dados do cliente
-                data = client_socket.recv(1024).decode('utf-8')
-                if not data:
+                client.idle()
+                if not self.serve_request(conn, client):
                     break
                     
-                # Processa a requisição
-                request = json.loads(data)
-                response = self.process_request(request, client_socket)
-                
-                # Envia resposta (se não for download de arquivo)
-                if response:
-                    client_socket.send(json.dumps(response).encode('utf-8'))
-                    
         except Exception as e:
             print(f"❌ Erro ao manipular cliente {client_address}: {e}")
         finally:
-            # Remove cliente da lista e fecha conexão
-            if client_socket in self.clients:
-                self.clients.remove(client_socket)
+            if self.watcher:
+                self.watcher.unsubscribe(conn)
+            self.bandwidth.detach(conn)
+            self.metrics.connection_closed(conn)
+            # Remove cliente do registro e fecha conexão
+            self.connections.unregister(client_socket)
             client_socket.close()
             print(f"👋 Cliente desconectado: {client_address}")
             
-    def process_request(self, request, client_socket):
+    def serve_request(self, conn, client=None):
+        """
+        Lê e atende uma requisição da conexão
+        
+        Args:
+            conn (FrameConnection): Conexão com o cliente
+            client (ClientConnection): Registro da conexão (marca que ela
+                deixou de estar ociosa)
+            
+        Returns:
+            bool: False se o cliente fechou a conexão
+        """
+        # Recebe o próximo frame do cliente (outros tipos são recusados pelo
+        # cabeçalho, sem ler o corpo)
+        frame = conn.recv_frame(FRAME_REQUEST)
+        if frame is None:
+            return False
+        if client:
+            client.busy()
+            
+        # Processa a requisição
+        request = decode_json(frame.payload)
+        action = request.get('action') if isinstance(request, dict) else None
+        started = self.metrics.request_started(conn)
+        if conn.throttle:
+            conn.throttle.priority = ACTION_PRIORITIES.get(action, PRIORITY_INTERACTIVE)
+        ok = False
+        try:
+            response = self.process_request(request, conn, frame.request_id)
+            
+            # Com a próxima requisição já no buffer (cliente em pipeline), a
+            # resposta espera para sair junto com as seguintes
+            more = conn.has_buffered_frame()
+            if more:
+                conn.cork()
+                
+            # Envia resposta (se não for download de arquivo)
+            if response:
+                conn.send_json(FRAME_RESPONSE, frame.request_id, response)
+            if not more:
+                conn.uncork()
+            ok = not response or response.get('status') != 'error'
+        finally:
+            if conn.throttle:
+                # Até a próxima requisição ser lida, a conexão é interativa
+                conn.throttle.priority = PRIORITY_INTERACTIVE
+            self.metrics.request_finished(action, started, ok)
+        return True
+        
+    def process_request(self, request, conn, request_id):
         """
         Processa diferentes tipos de requisições do cliente
         
         Args:
             request (dict): Requisição do cliente
-            client_socket: Socket do cliente
+            conn (FrameConnection): Conexão com o cliente
+            request_id (int): Id da requisição (ecoado na resposta)
             
         Returns:
             dict: Resposta para o cliente
         """
         action = request.get('action')
         
-        if action == 'list_files':
+        if self.leader and action in WRITE_ACTIONS:
+            # Réplica: só o principal aceita alterações
+            return self.reject_write(request, conn)
+            
+        if action == 'server_info':
+            # Recursos opcionais suportados pelo servidor
+            return self.server_info()
+            
+        elif action == 'stats':
+            # Métricas do servidor (JSON ou texto do Prometheus)
+            return self.stats(request)
+            
+        elif action == 'list_files':
             # Lista arquivos disponíveis
-            return self.list_files()
+            return self.list_files(request)
+            
+        elif action == 'search':
+            # Busca no índice de metadados
+            return self.search(request)
+            
+        elif action == 'subscribe':
+            # Eventos de mudança da pasta enviados por esta conexão
+            self.subscribe(request, conn, request_id)
+            return None
+            
+        elif action == 'upload_status':
+            # Quantos bytes de um upload interrompido já estão no servidor
+            return self.upload_status(request)
             
         elif action == 'upload_file':
             # Upload de arquivo
-            return self.receive_file(request, client_socket)
+            return self.receive_file(request, conn)
+            
+        elif action == 'dedup_check':
+            # Quais pedaços de um upload incremental faltam no servidor
+            return self.dedup_check(request)
+            
+        elif action == 'dedup_upload':
+            # Upload incremental: só os pedaços que faltam
+            return self.receive_chunks(request, conn)
             
         elif action == 'download_file':
             # Download de arquivo
-            self.send_file(request, client_socket)
+            self.send_file(request, conn, request_id)
+            return None
+            
+        elif action == 'batch_upload':
+            # Vários arquivos num único fluxo
+            return self.receive_batch(request, conn)
+            
+        elif action == 'batch_download':
+            # Vários arquivos num único fluxo
+            self.send_batch(request, conn, request_id)
             return None
             
+        elif action == 'stat_file':
+            # Tamanho, data e validador de um arquivo
+            return self.stat_file(request)
+            
         elif action == 'delete_file':
             # Deletar arquivo
             return self.delete_file(request)
@@ -137,28 +656,78 @@ class FileServer:
         else:
             return {'status': 'error', 'message': 'Ação não reconhecida'}
             
-    def list_files(self):
+    def server_info(self):
+        """
+        Informa os recursos opcionais do servidor para o cliente negociar
+        
+        Returns:
+            dict: Codecs de compressão, se a deduplicação está ativa, o
+            esquema de checksum e as réplicas (ou o principal, numa réplica)
+        """
+        return {
+            'status': 'success',
+            'compression': available_codecs(),
+            'dedup': self.chunk_store is not None,
+            'dedup_max_size': self.dedup_max_size if self.chunk_store else None,
+            'checksum': CHECKSUM_ALGORITHM,
+            'checksum_block_size': BLOCK_SIZE,
+            'search': True,
+            'subscribe': True,
+            'conditional': True,
+            'replicas': self.replica_addresses(),
+            'leader': f"{self.leader[0]}:{self.leader[1]}" if self.leader else None
+        }
+        
+    def stats(self, request):
+        """
+        Retorna as métricas do servidor
+        
+        Args:
+            request (dict): `format` 'json' (padrão) ou 'prometheus'
+            
+        Returns:
+            dict: Métricas em `stats` ou o texto do Prometheus em `text`
+        """
+        if request.get('format') == 'prometheus':
+            return {'status': 'success', 'text': self.metrics.prometheus_text()}
+        return {'status': 'success', 'stats': self.metrics.snapshot()}
+        
+    def list_files(self, request=None):
         """
-        Lista todos os arquivos na pasta compartilhada
+        Lista os arquivos na pasta compartilhada
         
+        A listagem vem do cache (ver listing.py). Com `limit` a resposta é
+        uma página e traz `next_cursor` para pedir a seguinte; `sort`,
+        `reverse` e `prefix` são aplicados no servidor.
+        
+        Args:
+            request (dict): Opções de paginação, ordenação e filtro
+            
         Returns:
             dict: Lista de arquivos com informações
         """
+        request = request or {}
         try:
-            files = []
-            for file_path in self.shared_folder.iterdir():
-                if file_path.is_file():
-                    # Obtém informações do arquivo
-                    stat = file_path.stat()
-                    files.append({
-                        'name': file_path.name,
-                        'size': stat.st_size,
-                        'modified': time.ctime(stat.st_mtime)
-                    })
+            entries, next_cursor, total = self.listing.page(
+                sort=request.get('sort', 'name'),
+                reverse=bool(request.get('reverse', False)),
+                prefix=request.get('prefix', ''),
+                cursor=request.get('cursor'),
+                limit=request.get('limit')
+            )
+            
+            files = [{
+                'name': name,
+                'size': size,
+                'modified': time.ctime(mtime),
+                'mtime': mtime
+            } for name, size, mtime in entries]
                     
             return {
                 'status': 'success',
-                'files': files
+                'files': files,
+                'next_cursor': next_cursor,
+                'total': total
             }
         except Exception as e:
             return {
@@ -166,95 +735,816 @@ class FileServer:
                 'message': f'Erro ao listar arquivos: {e}'
             }
             
-    def receive_file(self, request, client_socket):
+    def search(self, request):
+        """
+        Busca arquivos no índice de metadados, sem ler a pasta
+        
+        Filtros opcionais: `prefix`, `glob`, `extensions`, `min_size`,
+        `max_size`, `modified_after` e `modified_before` (epoch). A
+        paginação segue a de list_files (`sort`, `reverse`, `limit` e
+        `cursor`); com `count` a resposta traz o total de resultados.
+        
+        Args:
+            request (dict): Filtros e paginação
+            
+        Returns:
+            dict: Arquivos encontrados
+        """
+        try:
+            extensions = request.get('extensions')
+            if isinstance(extensions, str):
+                extensions = [extensions]
+            entries, next_cursor, total = self.index.search(
+                prefix=request.get('prefix', ''),
+                glob=request.get('glob'),
+                extensions=extensions,
+                min_size=request.get('min_size'),
+                max_size=request.get('max_size'),
+                modified_after=request.get('modified_after'),
+                modified_before=request.get('modified_before'),
+                sort=request.get('sort', 'name'),
+                reverse=bool(request.get('reverse', False)),
+                cursor=request.get('cursor'),
+                limit=request.get('limit'),
+                count=bool(request.get('count', False))
+            )
+            
+            files = [{
+                'name': name,
+                'size': size,
+                'modified': time.ctime(mtime),
+                'mtime': mtime,
+                'extension': ext,
+                'checksum': digest
+            } for name, size, mtime, ext, digest in entries]
+            
+            return {
+                'status': 'success',
+                'files': files,
+                'next_cursor': next_cursor,
+                'total': total
+            }
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Erro na busca: {e}'
+            }
+            
+    def start_watcher(self):
+        """Observador da pasta, criado e iniciado na primeira assinatura"""
+        with self.watcher_lock:
+            if self.watcher is None:
+                watcher = FolderWatcher(self.shared_folder, self.listing.scan)
+                watcher.start()
+                self.watcher = watcher
+            return self.watcher
+            
+    def subscribe(self, request, conn, request_id):
+        """
+        Assina os eventos de mudança da pasta compartilhada
+        
+        A resposta traz `epoch` e `seq` (último evento já ocorrido). Depois
+        dela, cada lote de mudanças chega como outra resposta com o mesmo
+        id, trazendo `events` (added, modified ou deleted, com os campos da
+        listagem) e o `seq` do último evento do lote. Um cliente que reconecta informa `epoch`
+        e `since` para receber na primeira resposta só o que perdeu; se
+        esses eventos já foram descartados, a resposta traz `resync` e o
+        cliente deve reler a listagem. A assinatura termina quando a
+        conexão fecha. Uma réplica (ver replication.py) informa em
+        `replica` o endereço em que atende.
+        
+        Args:
+            request (dict): `epoch`, `since` e `replica` opcionais
+            conn (FrameConnection): Conexão com o cliente
+            request_id (int): Id da requisição (repetido em cada lote de eventos)
+        """
+        watcher = self.start_watcher()
+        client = self.connections.get(conn.sock)
+        if client:
+            client.subscribed = True  # Fica à espera dos eventos sem expirar
+            if request.get('replica'):
+                # Réplica: anunciada aos clientes enquanto a assinatura durar
+                client.replica = advertised_address(request['replica'], client.address)
+                print(f"🔁 Réplica conectada: {client.replica}")
+        # Uma escrita parada (cliente que não lê) falha em vez de travar o observador
+        set_send_timeout(conn.sock, PUSH_TIMEOUT)
+        
+        def push(events, seq):
+            # O observador não pode ficar preso num cliente que não lê
+            _, writable, _ = select.select([], [conn.sock], [], PUSH_TIMEOUT)
+            try:
+                if not writable:
+                    raise TimeoutError('Assinante não está recebendo os eventos')
+                for start in range(0, len(events), PUSH_BATCH):
+                    batch = events[start:start + PUSH_BATCH]
+                    conn.send_json(FRAME_RESPONSE, request_id, {
+                        'status': 'success',
+                        'events': batch,
+                        'seq': batch[-1]['seq']
+                    })
+            except Exception:
+                # Frame talvez incompleto: encerra a conexão (o cliente
+                # reconecta com `since` e recebe o que perdeu)
+                try:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                raise
+                
+        # Nenhum evento sai antes da resposta da assinatura
+        with conn.send_lock:
+            epoch, seq, missed = watcher.subscribe(conn, push, request.get('epoch'),
+                                                   request.get('since'))
+            conn.send_json(FRAME_RESPONSE, request_id, {
+                'status': 'success',
+                'epoch': epoch,
+                'seq': seq,
+                'events': missed or [],
+                'resync': missed is None
+            })
+            
+    def partial_paths(self, filename):
+        """
+        Caminhos do upload parcial de um arquivo
+        
+        Args:
+            filename (str): Nome do arquivo
+            
+        Returns:
+            tuple: (arquivo parcial, arquivo de metadados)
+            
+        Raises:
+            ValueError: Se o nome não é de um arquivo da pasta compartilhada
+        """
+        self.shared_path(filename)
+        part_path = self.uploads_folder / f"{filename}.part"
+        return part_path, part_path.with_name(part_path.name + ".json")
+        
+    def load_partial(self, filename):
+        """
+        Lê o estado de um upload interrompido
+        
+        O parcial é pré-alocado, então o tamanho dele não diz nada: os bytes
+        recebidos ficam registrados nos metadados.
+        
+        Returns:
+            tuple: (metadados, bytes já recebidos) ou (None, 0)
+        """
+        part_path, info_path = self.partial_paths(filename)
+        try:
+            info = json.loads(info_path.read_text(encoding='utf-8'))
+            size = part_path.stat().st_size
+            return info, min(info.get('received', size), size)
+        except (OSError, ValueError):
+            return None, 0
+            
+    def save_partial(self, filename, filesize, source, received=0, blocks=()):
+        """
+        Grava os metadados de um upload em andamento
+        
+        Args:
+            filename (str): Nome do arquivo
+            filesize (int): Tamanho declarado
+            source (str): Identificação da origem enviada pelo cliente
+            received (int): Bytes já gravados no parcial
+            blocks (list): Resumos dos blocos completos já recebidos
+        """
+        _, info_path = self.partial_paths(filename)
+        info_path.write_text(json.dumps({
+            'filesize': filesize,
+            'source': source,
+            'received': received,
+            'blocks': list(blocks)
+        }), encoding='utf-8')
+        
+    def receive_trailer(self, conn, request):
+        """
+        Lê o frame que o cliente manda depois dos dados de um upload com checksum
+        
+        Returns:
+            dict: Trailer com os resumos dos blocos enviados (None se o
+            upload não pediu checksum)
+        """
+        if not request.get('checksum'):
+            return None
+        message = conn.recv_message(FRAME_REQUEST)
+        if message is None:
+            raise ConnectionError('Conexão fechada antes do checksum do upload')
+        return message[1]
+        
+    def upload_status(self, request):
+        """
+        Informa quanto de um upload interrompido o servidor já tem
+        
+        Só há retomada se o tamanho declarado e a identificação da origem
+        (enviada pelo cliente) forem os mesmos do upload original. Com
+        `checksum` o offset recua até o fim do último bloco já resumido.
+        
+        Args:
+            request (dict): filename, filesize, source e checksum
+            
+        Returns:
+            dict: Offset a partir do qual o cliente deve continuar
+        """
+        try:
+            filename = request['filename']
+            filesize = request['filesize']
+            self.shared_path(filename)
+            info, received = self.load_partial(filename)
+            
+            offset = 0
+            if (info and info.get('filesize') == filesize
+                    and info.get('source') == request.get('source')):
+                offset = min(received, filesize)
+                if request.get('checksum'):
+                    offset = min(offset, len(info.get('blocks', [])) * BLOCK_SIZE)
+                
+            return {
+                'status': 'success',
+                'filename': filename,
+                'filesize': filesize,
+                'offset': offset
+            }
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Erro ao consultar upload: {e}'
+            }
+            
+    def receive_file(self, request, conn):
         """
         Recebe um arquivo enviado pelo cliente
         
+        O conteúdo chega como um fluxo de frames de dados logo após a
+        requisição; o fluxo é sempre consumido, mesmo em caso de erro.
+        Os bytes vão para um arquivo parcial pré-alocado com o tamanho
+        declarado, que só substitui o arquivo final (de forma atômica)
+        quando está completo; o fsync segue `fsync_policy`. Com `offset` o
+        upload continua de onde um envio anterior parou (ver `upload_status`).
+        
+        Com `checksum`, os blocos são resumidos enquanto são gravados e o
+        cliente manda os resumos dele num frame depois dos dados; se não
+        baterem, o arquivo é descartado em vez de publicado.
+        
         Args:
             request (dict): Informações do arquivo
-            client_socket: Socket do cliente
+            conn (FrameConnection): Conexão com o cliente
             
         Returns:
             dict: Status do upload
         """
+        streams_before = conn.data_streams
+        trailer_read = False
         try:
             filename = request['filename']
             filesize = request['filesize']
+            offset = request.get('offset', 0)
+            source = request.get('source')
+            hasher = BlockHasher() if request.get('checksum') else None
+            prefix = []  # Resumos dos blocos recebidos antes da retomada
             
             # Caminho completo do arquivo
-            file_path = self.shared_folder / filename
-            
-            print(f"📥 Recebendo arquivo: {filename} ({filesize} bytes)")
-            
-            # Recebe o arquivo em chunks
-            with open(file_path, 'wb') as f:
-                bytes_received = 0
-                while bytes_received < filesize:
-                    chunk = client_socket.recv(min(4096, filesize - bytes_received))
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                    bytes_received += len(chunk)
+            file_path = self.shared_path(filename)
+            part_path, info_path = self.partial_paths(filename)
+            part_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            if offset:
+                info, received = self.load_partial(filename)
+                if info:
+                    prefix = info.get('blocks', [])[:offset // BLOCK_SIZE]
+                if (not info or info.get('filesize') != filesize
+                        or info.get('source') != source
+                        or received < offset
+                        or (hasher and offset != len(prefix) * BLOCK_SIZE)):
+                    conn.discard_data()
+                    trailer_read = True
+                    self.receive_trailer(conn, request)
+                    return {
+                        'status': 'error',
+                        'message': 'Upload parcial não encontrado para retomar',
+                        'offset': 0
+                    }
+                print(f"📥 Retomando arquivo: {filename} a partir de {offset} bytes")
+            else:
+                self.save_partial(filename, filesize, source)
+                print(f"📥 Recebendo arquivo: {filename} ({filesize} bytes)")
+            
+            def blocks_so_far():
+                return prefix + hasher.blocks if hasher else []
+                
+            def synced(position):
+                # Política periódica: o que já está no disco pode ser retomado
+                self.save_partial(filename, filesize, source, position, blocks_so_far())
+                
+            # Recebe o arquivo a partir dos frames de dados (nunca além do
+            # tamanho declarado)
+            overflow = False
+            with open_upload(part_path, filesize, offset) as f:
+                writer = DurableWriter(f, self.fsync_policy, self.fsync_interval, offset, synced)
+                try:
+                    receive_stream(conn, HashingWriter(writer, hasher) if hasher else writer,
+                                   request.get('compression'), limit=filesize - offset)
+                    writer.finish()
+                except StreamOverflow:
+                    overflow = True
+                except BaseException:
+                    # Registra o que foi gravado para permitir a retomada
+                    self.save_partial(filename, filesize, source, writer.written(),
+                                      blocks_so_far())
+                    raise
+            if overflow:
+                # O cliente mandou mais do que declarou: o parcial não serve
+                # para retomar
+                conn.discard_data(streams_before)
+                trailer_read = True
+                self.receive_trailer(conn, request)
+                part_path.unlink(missing_ok=True)
+                info_path.unlink(missing_ok=True)
+                print(f"❌ Upload maior que o declarado: {filename} descartado")
+                return {
+                    'status': 'error',
+                    'message': f'Upload maior que o tamanho declarado ({filesize} bytes)',
+                    'offset': 0
+                }
+            bytes_received = writer.position
+            trailer_read = True
+            trailer = self.receive_trailer(conn, request)
                     
+            if bytes_received != filesize:
+                # Mantém o parcial para que o cliente possa retomar
+                self.save_partial(filename, filesize, source, min(bytes_received, filesize),
+                                  blocks_so_far())
+                return {
+                    'status': 'error',
+                    'message': f'Upload incompleto: {bytes_received} de {filesize} bytes',
+                    'offset': min(bytes_received, filesize)
+                }
+                
+            checksum = None
+            if hasher:
+                received_blocks = hasher.finish()
+                expected = trailer.get('blocks')
+                if expected is not None and expected != received_blocks:
+                    part_path.unlink(missing_ok=True)
+                    info_path.unlink(missing_ok=True)
+                    print(f"❌ Checksum divergente: {filename} descartado")
+                    return {
+                        'status': 'error',
+                        'message': 'Checksum divergente: o arquivo chegou corrompido',
+                        'offset': 0
+                    }
+                blocks = prefix + received_blocks
+                checksum = tree_digest(blocks)
+                
+            # Completo: publica o arquivo de uma vez
+            publish(part_path, file_path, self.fsync_policy)
+            info_path.unlink(missing_ok=True)
+            stat = self.file_changed(filename, checksum)
+            if hasher and stat:
+                # Downloads seguintes já encontram os resumos prontos
+                self.hashes.store(stat, 0, blocks)
+                
             print(f"✅ Arquivo recebido: {filename}")
             return {
                 'status': 'success',
-                'message': f'Arquivo {filename} enviado com sucesso'
+                'message': f'Arquivo {filename} enviado com sucesso',
+                'checksum': checksum
             }
             
+        except (ConnectionError, ProtocolError):
+            raise
         except Exception as e:
+            # Consome o restante do fluxo (se ainda não terminou) para manter
+            # o protocolo sincronizado
+            conn.discard_data(streams_before)
+            if not trailer_read:
+                self.receive_trailer(conn, request)
             return {
                 'status': 'error',
                 'message': f'Erro ao receber arquivo: {e}'
             }
             
-    def send_file(self, request, client_socket):
+    def dedup_check(self, request):
         """
-        Envia um arquivo para o cliente
+        Informa quais pedaços de um arquivo o servidor ainda não tem
+        
+        Se o arquivo já existe e mudou desde a última receita, a versão
+        atual entra na fila de divisão (ver ChunkIndexer) sem esperar: a
+        resposta considera só os pedaços já guardados.
         
         Args:
-            request (dict): Nome do arquivo solicitado
-            client_socket: Socket do cliente
+            request (dict): filename e chunks ([hash, tamanho] de cada pedaço)
+            
+        Returns:
+            dict: Hashes dos pedaços que o cliente precisa enviar
         """
+        if not self.chunk_store:
+            return {'status': 'error', 'message': 'Deduplicação desativada no servidor'}
         try:
             filename = request['filename']
-            file_path = self.shared_folder / filename
+            chunks = request['chunks']
+            file_path = self.shared_path(filename)
+            self.check_dedup_size(chunks)
             
-            if not file_path.exists():
+            if file_path.is_file():
+                self.chunk_indexer.schedule(filename, file_path)
+                    
+            missing = self.chunk_store.missing(digest for digest, _ in chunks)
+            return {
+                'status': 'success',
+                'missing': missing,
+                'total': len(chunks)
+            }
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Erro ao verificar pedaços: {e}'
+            }
+            
+    def check_dedup_size(self, chunks):
+        """
+        Confere se um arquivo cabe no envio incremental
+        
+        Raises:
+            ValueError: Se o arquivo passa do tamanho máximo
+        """
+        filesize = sum(size for _, size in chunks)
+        if filesize > self.dedup_max_size:
+            raise ValueError(f'Arquivo grande demais para o envio incremental '
+                             f'({filesize} bytes, máximo {self.dedup_max_size})')
+            
+    def receive_chunks(self, request, conn):
+        """
+        Recebe os pedaços que faltavam e monta o arquivo a partir da receita
+        
+        Os pedaços listados em `sending` chegam concatenados, nessa ordem,
+        num único fluxo de dados.
+        
+        Args:
+            request (dict): filename, chunks (receita completa) e sending
+            conn (FrameConnection): Conexão com o cliente
+            
+        Returns:
+            dict: Status do upload
+        """
+        streams_before = conn.data_streams
+        try:
+            if not self.chunk_store:
+                raise ValueError('Deduplicação desativada no servidor')
+            filename = request['filename']
+            file_path = self.shared_path(filename)
+            chunks = request['chunks']
+            sending = request['sending']
+            self.check_dedup_size(chunks)
+            sizes = {digest: size for digest, size in chunks}
+            
+            # Separa o fluxo em pedaços pelos tamanhos da receita
+            pending = bytearray()
+            index = 0
+            bytes_received = 0
+            for _, piece in conn.iter_data():
+                pending += piece
+                bytes_received += len(piece)
+                while index < len(sending) and len(pending) >= sizes[sending[index]]:
+                    size = sizes[sending[index]]
+                    self.chunk_store.put(sending[index], bytes(pending[:size]))
+                    del pending[:size]
+                    index += 1
+            
+            if index != len(sending) or pending:
+                raise ValueError('Fluxo de pedaços incompleto')
+            missing = self.chunk_store.missing(digest for digest, _ in chunks)
+            if missing:
+                return {
+                    'status': 'error',
+                    'message': f'{len(missing)} pedaço(s) ausente(s)',
+                    'missing': missing
+                }
+                
+            self.chunk_store.assemble(chunks, file_path, self.uploads_folder)
+            # Receita antes de avisar a mudança: a versão nova já está dividida
+            self.chunk_store.save_recipe(filename, chunks, file_validator(file_path.stat()))
+            self.file_changed(filename)
+            
+            print(f"✅ Arquivo recebido (incremental): {filename} "
+                  f"({bytes_received} bytes transferidos)")
+            return {
+                'status': 'success',
+                'message': f'Arquivo {filename} enviado com sucesso',
+                'bytes_received': bytes_received
+            }
+            
+        except (ConnectionError, ProtocolError):
+            raise
+        except Exception as e:
+            conn.discard_data(streams_before)
+            return {
+                'status': 'error',
+                'message': f'Erro ao receber pedaços: {e}'
+            }
+            
+    def send_file(self, request, conn, request_id):
+        """
+        Envia um arquivo (ou um intervalo dele) para o cliente
+        
+        A resposta JSON é seguida do fluxo de dados com os bytes de
+        `offset` até `offset + length`. Se `if_range` não bater com o
+        `validator` atual do arquivo, ele mudou desde a primeira parte e o
+        envio recomeça do zero (a resposta informa o offset usado). Se o
+        cliente oferecer codecs em `compression`, o servidor escolhe um e o
+        informa na resposta; os pedaços que não compensam vão sem compressão.
+        
+        Com `checksum` e um intervalo alinhado aos blocos, a resposta traz
+        os resumos dos blocos se estiverem no cache (e o envio continua com
+        sendfile); senão os blocos são resumidos durante o envio e os
+        resumos vão num frame de resposta depois dos dados.
+        
+        `if_none_match` torna o pedido condicional: se uma das marcas (o
+        `validator` ou 'sha256:<checksum>') ainda descreve o arquivo, a
+        resposta é `not_modified`, sem frames de dados, e o cliente usa a
+        cópia que já tem.
+        
+        Args:
+            request (dict): Nome do arquivo e intervalo opcional
+            conn (FrameConnection): Conexão com o cliente
+            request_id (int): Id da requisição
+        """
+        data_started = False
+        try:
+            filename = request['filename']
+            file_path = self.shared_path(filename)
+            
+            if not file_path.is_file():
                 # Arquivo não encontrado
                 response = {
                     'status': 'error',
                     'message': 'Arquivo não encontrado'
                 }
-                client_socket.send(json.dumps(response).encode('utf-8'))
+                conn.send_json(FRAME_RESPONSE, request_id, response)
                 return
                 
-            # Envia informações do arquivo
-            filesize = file_path.stat().st_size
+            # Arquivos pequenos e médios vêm do cache; os grandes, do disco
+            cached = self.file_cache.open(file_path) if self.file_cache else None
+            with cached or open(file_path, 'rb') as f:
+                # Envia informações do arquivo
+                stat = cached.stat if cached else os.fstat(f.fileno())
+                filesize = stat.st_size
+                validator = file_validator(stat)
+                
+                tags = request.get('if_none_match')
+                if tags:
+                    response = self.check_not_modified(filename, stat, validator, tags)
+                    if response:
+                        print(f"♻️ Arquivo não modificado: {filename}")
+                        conn.send_json(FRAME_RESPONSE, request_id, response)
+                        return
+                
+                offset = request.get('offset', 0)
+                if request.get('if_range') not in (None, validator):
+                    offset = 0
+                if offset < 0 or offset > filesize:
+                    conn.send_json(FRAME_RESPONSE, request_id, {
+                        'status': 'error',
+                        'message': 'Intervalo inválido'
+                    })
+                    return
+                length = request.get('length')
+                if length is None or length > filesize - offset:
+                    length = filesize - offset
+                codec = negotiate(request.get('compression'))
+                    
+                response = {
+                    'status': 'success',
+                    'filename': filename,
+                    'filesize': filesize,
+                    'offset': offset,
+                    'length': length,
+                    'validator': validator,
+                    'compression': codec
+                }
+                span = block_span(offset, length, filesize) if request.get('checksum') else None
+                hasher = None
+                if span:
+                    blocks = self.hashes.lookup(stat, *span)
+                    response['checksum'] = self.hashes.checksum(stat)
+                    response['first_block'] = span[0]
+                    if blocks is not None:
+                        response['blocks'] = blocks
+                    else:
+                        response['blocks_trailer'] = True
+                        hasher = BlockHasher()
+                
+                print(f"📤 Enviando arquivo: {filename} ({length} de {filesize} bytes)")
+                
+                # Resposta e dados saem juntos, sem intercalar com outros frames
+                with conn.send_lock:
+                    conn.send_json(FRAME_RESPONSE, request_id, response)
+                    data_started = True
+                    if hasher:
+                        # Os bytes passam pelo processo para serem resumidos
+                        wire_bytes = send_stream(conn, request_id, HashingReader(f, hasher),
+                                                 offset, length, codec, zero_copy=False)
+                        conn.send_json(FRAME_RESPONSE, request_id, {
+                            'status': 'success',
+                            'blocks': hasher.finish()
+                        })
+                    else:
+                        wire_bytes = send_stream(conn, request_id, f, offset, length,
+                                                 codec, self.zero_copy)
+                        
+                # O conteúdo em memória é uma versão fixa do arquivo
+                if hasher and (cached or file_validator(os.fstat(f.fileno())) == validator):
+                    self.hashes.store(stat, span[0], hasher.blocks)
+                    
+            if codec and length:
+                print(f"✅ Arquivo enviado: {filename} ({codec}: {wire_bytes} de "
+                      f"{length} bytes pela rede)")
+            else:
+                print(f"✅ Arquivo enviado: {filename}")
+            
+        except (ConnectionError, ProtocolError):
+            raise
+        except Exception as e:
+            print(f"❌ Erro ao enviar arquivo: {e}")
+            if data_started:
+                # Frame de dados incompleto: a conexão não pode continuar
+                raise
+            conn.send_json(FRAME_RESPONSE, request_id, {
+                'status': 'error',
+                'message': f'Erro ao enviar arquivo: {e}'
+            })
+            
+    def check_not_modified(self, filename, stat, validator, tags):
+        """
+        Confere as marcas de um download condicional com a versão atual
+        
+        O checksum só é comparado se já estiver no cache de resumos: o
+        arquivo nunca é lido só para responder a pergunta.
+        
+        Args:
+            filename (str): Nome do arquivo
+            stat: os.stat da versão atual
+            validator (str): Validador da versão atual
+            tags (list): Marcas da cópia que o cliente tem
+            
+        Returns:
+            dict: Resposta `not_modified` ou None se o arquivo deve ser enviado
+        """
+        checksum = self.hashes.checksum(stat)
+        if validator not in tags and (not checksum or f"sha256:{checksum}" not in tags):
+            return None
+        return {
+            'status': 'not_modified',
+            'filename': filename,
+            'filesize': stat.st_size,
+            'validator': validator,
+            'checksum': checksum
+        }
+        
+    def stat_file(self, request):
+        """
+        Informa os dados de um arquivo sem listar a pasta inteira
+        
+        Com `checksum` a resposta traz o checksum do arquivo, lido do
+        cache ou calculado (e guardado) se o arquivo mudou.
+        
+        Args:
+            request (dict): Nome do arquivo e checksum opcional
+            
+        Returns:
+            dict: Tamanho, data de modificação e validador
+        """
+        try:
+            filename = request['filename']
+            file_path = self.shared_path(filename)
+            stat = file_path.stat()
             response = {
                 'status': 'success',
                 'filename': filename,
-                'filesize': filesize
+                'size': stat.st_size,
+                'modified': time.ctime(stat.st_mtime),
+                'mtime': stat.st_mtime,
+                'validator': file_validator(stat)
+            }
+            if request.get('checksum'):
+                response['checksum'] = self.hashes.file_checksum(file_path)
+                self.index.update(filename, stat, response['checksum'])
+            return response
+        except FileNotFoundError:
+            return {
+                'status': 'error',
+                'message': 'Arquivo não encontrado'
+            }
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Erro ao consultar arquivo: {e}'
             }
-            client_socket.send(json.dumps(response).encode('utf-8'))
             
-            # Aguarda confirmação do cliente
-            client_socket.recv(1024)
+    def receive_batch(self, request, conn):
+        """
+        Recebe vários arquivos enviados como um lote (ver archive.py)
+        
+        Cada arquivo é publicado assim que chega por completo; se o lote
+        falhar no meio, os anteriores ficam e a resposta diz quantos foram.
+        
+        Args:
+            request (dict): Pode trazer `compression` (codec dos frames)
+            conn (FrameConnection): Conexão com o cliente
             
-            print(f"📤 Enviando arquivo: {filename} ({filesize} bytes)")
+        Returns:
+            dict: Status, arquivos e bytes recebidos
+        """
+        streams_before = conn.data_streams
+        sink = FolderSink(self.shared_folder, self.uploads_folder, self.fsync_policy)
+        try:
+            print("📦 Recebendo lote de arquivos...")
+            receive_archive(conn, sink, request.get('compression'))
+            print(f"✅ Lote recebido: {sink.count} arquivo(s), {sink.bytes} bytes")
+            return {
+                'status': 'success',
+                'message': f'{sink.count} arquivo(s) enviado(s) com sucesso',
+                'received': sink.count,
+                'bytes': sink.bytes
+            }
             
-            # Envia o arquivo em chunks
-            with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(4096)
-                    if not chunk:
-                        break
-                    client_socket.send(chunk)
+        except (ConnectionError, ProtocolError):
+            raise
+        except Exception as e:
+            conn.discard_data(streams_before)
+            return {
+                'status': 'error',
+                'message': f'Erro ao receber lote: {e}',
+                'received': sink.count,
+                'bytes': sink.bytes
+            }
+        finally:
+            sink.abort()
+            sink.sync_folder()
+            for name in sink.names:
+                self.file_changed(name)
+                
+    def send_batch(self, request, conn, request_id):
+        """
+        Envia vários arquivos como um lote (ver archive.py)
+        
+        A resposta JSON lista o que vai no lote e é seguida do fluxo de
+        dados. Os arquivos são escolhidos por `filenames` ou, se ausente,
+        por `prefix` (todos os arquivos com esse início).
+        
+        Args:
+            request (dict): filenames ou prefix, e compression opcional
+            conn (FrameConnection): Conexão com o cliente
+            request_id (int): Id da requisição
+        """
+        data_started = False
+        try:
+            filenames = request.get('filenames')
+            if filenames is None:
+                entries, _, _ = self.listing.page(prefix=request.get('prefix', ''))
+                filenames = [name for name, _, _ in entries]
+                
+            entries = []
+            missing = []
+            total_size = 0
+            for filename in filenames:
+                file_path = self.shared_folder / filename
+                if valid_name(filename) and file_path.is_file():
+                    entries.append((filename, file_path))
+                    total_size += file_path.stat().st_size
+                else:
+                    missing.append(filename)
                     
-            print(f"✅ Arquivo enviado: {filename}")
+            codec = negotiate(request.get('compression'))
+            response = {
+                'status': 'success',
+                'count': len(entries),
+                'total_size': total_size,
+                'missing': missing,
+                'compression': codec
+            }
+            
+            print(f"📦 Enviando lote: {len(entries)} arquivo(s), {total_size} bytes")
+            
+            # Resposta e dados saem juntos, sem intercalar com outros frames
+            with conn.send_lock:
+                conn.send_json(FRAME_RESPONSE, request_id, response)
+                data_started = True
+                count, sent = send_archive(conn, request_id, entries, codec)
+                
+            print(f"✅ Lote enviado: {count} arquivo(s), {sent} bytes")
             
+        except (ConnectionError, ProtocolError):
+            raise
         except Exception as e:
-            print(f"❌ Erro ao enviar arquivo: {e}")
+            print(f"❌ Erro ao enviar lote: {e}")
+            if data_started:
+                # Fluxo de dados incompleto: a conexão não pode continuar
+                raise
+            conn.send_json(FRAME_RESPONSE, request_id, {
+                'status': 'error',
+                'message': f'Erro ao enviar lote: {e}'
+            })
             
     def delete_file(self, request):
         """
@@ -268,7 +1558,7 @@ class FileServer:
         """
         try:
             filename = request['filename']
-            file_path = self.shared_folder / filename
+            file_path = self.shared_path(filename)
             
             if not file_path.exists():
                 return {
@@ -276,7 +1566,12 @@ class FileServer:
                     'message': 'Arquivo não encontrado'
                 }
                 
+            stat = file_path.stat()
             file_path.unlink()  # Deleta o arquivo
+            self.hashes.forget(stat)
+            self.file_changed(filename)
+            if self.chunk_store:
+                self.chunk_store.remove_recipe(filename)
             print(f"🗑️ Arquivo deletado: {filename}")
             
             return {
@@ -291,43 +1586,177 @@ class FileServer:
             }
             
     def stop_server(self):
-        """Para o servidor e fecha todas as conexões"""
+        """
+        Para o servidor: deixa de aceitar conexões, espera as requisições em
+        andamento (até drain_timeout) e fecha todas as conexões
+        """
         print("\n🛑 Parando servidor...")
         self.running = False
+        if self.replicator:
+            self.replicator.stop()
         
-        # Fecha conexões com clientes
-        for client in self.clients:
-            try:
-                client.close()
-            except:
-                pass
-                
-        # Fecha socket do servidor
+        # Fecha socket do servidor (um socket herdado é dividido com outros processos)
         if self.socket:
+            if self.listen_socket is None:
+                try:
+                    self.socket.shutdown(socket.SHUT_RDWR)  # Acorda o accept
+                except OSError:
+                    pass
             self.socket.close()
             
+        # Fecha as conexões ociosas e espera as que estão atendendo uma requisição
+        forced = self.connections.drain(self.drain_timeout)
+        if forced:
+            print(f"⚠️ {forced} conexão(ões) encerrada(s) sem terminar a requisição")
+        self.connections.stop()
+        if self.metrics_http:
+            self.metrics_http.shutdown()
+        if self.watcher:
+            self.watcher.stop()
+        if self.chunk_indexer:
+            self.chunk_indexer.stop()
+            
         print("✅ Servidor parado")
 
+def parse_args():
+    """Lê as opções de linha de comando (todas opcionais)"""
+    parser = argparse.ArgumentParser(description="Servidor de compartilhamento de arquivos")
+    parser.add_argument('--host', help="IP do servidor (pergunta se omitido)")
+    parser.add_argument('--port', type=int, help="Porta do servidor (pergunta se omitida)")
+    parser.add_argument('--backlog', type=int, default=DEFAULT_BACKLOG,
+                        help="Tamanho da fila de conexões pendentes")
+    parser.add_argument('--shared-folder', default=DEFAULT_SHARED_FOLDER,
+                        help="Pasta de arquivos compartilhados")
+    parser.add_argument('--mode', choices=['thread', 'async'], default='thread',
+                        help="thread: uma thread por cliente; async: event loop asyncio")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Requisições usando disco e CPU ao mesmo tempo no modo async")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Processos atendendo a mesma porta (pré-fork, ver prefork.py)")
+    parser.add_argument('--no-reuseport', action='store_true',
+                        help="No pré-fork, divide um único socket de escuta em vez de SO_REUSEPORT")
+    parser.add_argument('--no-sendfile', action='store_true',
+                        help="Desativa o envio sem cópia (sendfile) nos downloads")
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC_NONE,
+                        help="Durabilidade dos uploads: none (mais rápido), close "
+                             "(fsync antes de publicar) ou periodic (também durante o envio)")
+    parser.add_argument('--fsync-interval', type=int, default=FSYNC_INTERVAL // (1024 * 1024),
+                        help="MB gravados entre fsync na política periodic")
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="MB de memória para arquivos pequenos mais baixados (0 desativa o cache)")
+    parser.add_argument('--cache-max-file', type=int, default=DEFAULT_MAX_FILE_SIZE // 1024,
+                        help="KB: arquivos até este tamanho ficam inteiros na memória")
+    parser.add_argument('--mmap-max', type=int, default=DEFAULT_MAP_MAX_SIZE // (1024 * 1024),
+                        help="MB: arquivos até este tamanho são servidos por mmap (0 desativa)")
+    parser.add_argument('--max-connections', type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help="Conexões simultâneas (por processo); as demais são recusadas (0 = sem limite)")
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help="Segundos sem requisições até fechar a conexão (0 = sem limite)")
+    parser.add_argument('--read-timeout', type=float, default=READ_TIMEOUT,
+                        help="Segundos de leitura parada no meio de uma requisição (0 = sem limite)")
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help="Ao parar, segundos de espera pelas requisições em andamento")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Aceita envios incrementais (só os pedaços novos); os pedaços "
+                             "ocupam disco além dos arquivos")
+    parser.add_argument('--dedup-max', type=int, default=DEFAULT_DEDUP_MAX_SIZE // (1024 * 1024),
+                        help="MB: maior arquivo aceito no envio incremental")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Publica métricas do Prometheus em HTTP nesta porta")
+    parser.add_argument('--max-egress', type=parse_rate, default=None,
+                        help="Limite total de envio, ex.: 50M (bytes/s)")
+    parser.add_argument('--max-ingress', type=parse_rate, default=None,
+                        help="Limite total de recepção, ex.: 50M (bytes/s)")
+    parser.add_argument('--client-egress', type=parse_rate, default=None,
+                        help="Limite de envio para cada cliente (bytes/s)")
+    parser.add_argument('--client-ingress', type=parse_rate, default=None,
+                        help="Limite de recepção de cada cliente (bytes/s)")
+    parser.add_argument('--replicate-from', type=parse_address, default=None,
+                        metavar='HOST:PORTA',
+                        help="Réplica somente leitura deste servidor principal")
+    return parser.parse_args()
+
+def create_server(args, host, port, worker=None, workers=1):
+    """
+    Cria o servidor configurado pelas opções de linha de comando
+    
+    Args:
+        args: Opções lidas por parse_args
+        host (str): Endereço de escuta
+        port (int): Porta
+        worker (int): Número do processo no modo pré-fork (None = único)
+        workers (int): Total de processos no modo pré-fork
+        
+    Returns:
+        FileServer: Servidor pronto para start_server()
+    """
+    if args.mode == 'async':
+        from async_server import AsyncFileServer
+        server = AsyncFileServer(host, port, args.backlog, args.workers, args.shared_folder)
+    else:
+        server = FileServer(host, port, args.backlog, args.shared_folder)
+    server.zero_copy = not args.no_sendfile
+    server.fsync_policy = args.fsync
+    server.fsync_interval = max(1, args.fsync_interval) * 1024 * 1024
+    server.limit_connections(args.max_connections, args.idle_timeout, args.read_timeout)
+    server.drain_timeout = args.drain_timeout
+    if args.cache_mb > 0:
+        # Cada processo tem o seu cache (o limite vale por processo)
+        server.enable_file_cache(args.cache_mb * 1024 * 1024, args.cache_max_file * 1024,
+                                 args.mmap_max * 1024 * 1024)
+    if worker is None:
+        # No pré-fork o mestre confere o índice antes de criar os processos
+        server.sync_index()
+    if args.dedup:
+        server.enable_dedup(collect_garbage=worker is None,
+                            max_file_size=args.dedup_max * 1024 * 1024)
+    if args.replicate_from:
+        # No pré-fork só o primeiro processo aplica as mudanças do principal
+        server.enable_replication(args.replicate_from, apply_changes=not worker)
+    if args.metrics_port:
+        # Cada processo publica as suas métricas numa porta própria
+        server.serve_metrics(args.metrics_port + (worker or 0))
+    if args.max_egress or args.max_ingress or args.client_egress or args.client_ingress:
+        # Os limites totais são divididos entre os processos; os por cliente
+        # valem em cada processo (um cliente com conexões em processos
+        # diferentes pode passar do seu limite)
+        server.limit_bandwidth(args.max_egress and args.max_egress // workers,
+                               args.max_ingress and args.max_ingress // workers,
+                               args.client_egress, args.client_ingress)
+    return server
+
 def main():
     """Função principal do servidor"""
+    args = parse_args()
+    
     print("=" * 50)
     print("🚀 SERVIDOR DE COMPARTILHAMENTO DE ARQUIVOS")
     print("=" * 50)
     
     # Configurações do servidor
-    host = input("Digite o IP do servidor (Enter para localhost): ").strip()
+    host = args.host
+    if host is None:
+        host = input("Digite o IP do servidor (Enter para localhost): ").strip()
     if not host:
         host = 'localhost'
         
-    try:
-        port = input("Digite a porta (Enter para 8888): ").strip()
-        port = int(port) if port else 8888
-    except ValueError:
-        port = 8888
+    port = args.port
+    if port is None:
+        try:
+            port = input("Digite a porta (Enter para 8888): ").strip()
+            port = int(port) if port else 8888
+        except ValueError:
+            port = 8888
+        
+    if args.processes > 1:
+        # Vários processos na mesma porta, supervisionados por este
+        from prefork import PreforkServer
+        PreforkServer(args, host, port, args.processes,
+                      reuse_port=False if args.no_reuseport else None).run()
+        return
         
     # Cria e inicia o servidor
-    server = FileServer(host, port)
-    
+    server = create_server(args, host, port)
     try:
         server.start_server()
     except KeyboardInterrupt:
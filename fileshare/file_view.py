@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - LISTA DE ARQUIVOS
+Lista virtualizada para pastas com centenas de milhares de arquivos
+
+Os arquivos ficam num modelo em memória (FileListModel), ordenado e
+filtrado em Python: inclusões, alterações e remoções custam uma busca
+binária, e ordenar ou filtrar não toca em widgets. O Treeview
+(VirtualFileView) só tem as linhas que cabem na tela; rolar a lista troca
+os valores dessas linhas, e só as que mudaram são reescritas. Tamanhos e
+datas são formatados só para as linhas visíveis.
+"""
+
+from tkinter import ttk
+from bisect import bisect_left, insort
+
+from client_api import format_size
+
+# Colunas da lista: (id no Treeview, título, campo de ordenação, largura)
+COLUMNS = (
+    ("Nome", "📄 Nome do Arquivo", 'name', 300),
+    ("Tamanho", "📊 Tamanho", 'size', 100),
+    ("Modificado", "📅 Última Modificação", 'modified', 200),
+)
+
+# Linhas roladas por passo da roda do mouse
+WHEEL_ROWS = 3
+
+# Altura de linha e do cabeçalho até a primeira linha ser desenhada (pixels)
+DEFAULT_ROW_HEIGHT = 20
+DEFAULT_HEADER_HEIGHT = 25
+
+# Acima desta fração de mudanças, reordenar tudo sai mais barato que aplicar uma a uma
+REBUILD_FRACTION = 0.125
+
+# Modificadores que estendem a seleção (Shift, Control)
+EXTEND_SELECTION_MASK = 0x0001 | 0x0004
+
+
+class FileListModel:
+    def __init__(self):
+        """Arquivos da lista, ordenados e filtrados em memória"""
+        self.files = {}  # nome -> (nome, tamanho, mtime, data formatada)
+        self.sort = 'name'
+        self.reverse = False
+        self.filter = ''  # Trecho do nome (minúsculo)
+        self.keys = []  # Chaves de ordenação dos arquivos visíveis, crescentes
+
+    @staticmethod
+    def record(file_info):
+        """Registro de um arquivo a partir da listagem ou de um evento"""
+        return (file_info['name'], file_info['size'], file_info.get('mtime', 0),
+                file_info['modified'])
+
+    def sort_key(self, record):
+        """Chave de ordenação (o nome desempata e identifica o arquivo)"""
+        name, size, mtime, _ = record
+        if self.sort == 'size':
+            return (size, name)
+        if self.sort == 'modified':
+            return (mtime, name)
+        return (name,)
+
+    def matches(self, name):
+        """Indica se o arquivo passa pelo filtro"""
+        return not self.filter or self.filter in name.lower()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        """Registro na posição `index` da lista exibida"""
+        if self.reverse:
+            index = len(self.keys) - 1 - index
+        return self.files[self.keys[index][-1]]
+
+    def index(self, name):
+        """
+        Posição de um arquivo na lista exibida
+
+        Returns:
+            int: Posição ou None se o arquivo não existe ou está filtrado
+        """
+        record = self.files.get(name)
+        if record is None or not self.matches(name):
+            return None
+        index = bisect_left(self.keys, self.sort_key(record))
+        return len(self.keys) - 1 - index if self.reverse else index
+
+    def rebuild(self):
+        """Reordena e refiltra tudo (nova ordenação, filtro ou lista)"""
+        self.keys = sorted(self.sort_key(record) for name, record in self.files.items()
+                           if self.matches(name))
+
+    def put(self, record):
+        """
+        Inclui ou atualiza um arquivo
+
+        Returns:
+            bool: True se algo mudou
+        """
+        name = record[0]
+        old = self.files.get(name)
+        if old == record:
+            return False
+        visible = self.matches(name)
+        if old is not None and visible:
+            del self.keys[bisect_left(self.keys, self.sort_key(old))]
+        self.files[name] = record
+        if visible:
+            insort(self.keys, self.sort_key(record))
+        return True
+
+    def remove(self, name):
+        """
+        Remove um arquivo
+
+        Returns:
+            bool: True se ele estava na lista
+        """
+        old = self.files.pop(name, None)
+        if old is None:
+            return False
+        if self.matches(name):
+            del self.keys[bisect_left(self.keys, self.sort_key(old))]
+        return True
+
+    def apply(self, event):
+        """
+        Aplica um evento de mudança da pasta (ver FileServer.subscribe)
+
+        Returns:
+            bool: True se a lista mudou
+        """
+        if event['event'] == 'deleted':
+            return self.remove(event['name'])
+        return self.put(self.record(event))
+
+    def replace(self, files):
+        """
+        Troca o conteúdo pela listagem completa do servidor, aplicando só a diferença
+
+        Args:
+            files (list): Arquivos informados pelo servidor
+
+        Returns:
+            int: Arquivos incluídos, alterados ou removidos
+        """
+        new = {}
+        for file_info in files:
+            record = self.record(file_info)
+            new[record[0]] = record
+        removed = self.files.keys() - new.keys()
+        changed = [record for name, record in new.items() if self.files.get(name) != record]
+        if len(removed) + len(changed) > len(new) * REBUILD_FRACTION:
+            self.files = new
+            self.rebuild()
+        else:
+            for name in removed:
+                self.remove(name)
+            for record in changed:
+                self.put(record)
+        return len(removed) + len(changed)
+
+    def clear(self):
+        """Esvazia a lista"""
+        self.files = {}
+        self.keys = []
+
+    def set_sort(self, sort, reverse=False):
+        """Muda a ordenação ('name', 'size' ou 'modified')"""
+        self.sort = sort
+        self.reverse = reverse
+        self.rebuild()
+
+    def set_filter(self, text):
+        """Mostra só os arquivos cujo nome contém `text` (sem diferenciar maiúsculas)"""
+        self.filter = text.strip().lower()
+        self.rebuild()
+
+
+class VirtualFileView:
+    def __init__(self, parent, model=None, height=15):
+        """
+        Treeview que exibe um FileListModel desenhando só as linhas visíveis
+
+        Cria a lista e as barras de rolagem dentro de `parent` (com grid).
+
+        Args:
+            parent: Frame onde a lista fica
+            model (FileListModel): Modelo exibido (um novo se não informado)
+            height (int): Linhas exibidas até a janela ter tamanho
+        """
+        self.model = model if model is not None else FileListModel()
+        self.rows = height  # Linhas que cabem na tela
+        self.top = 0  # Posição no modelo da primeira linha exibida
+        self.shown = []  # Registro exibido em cada linha do Treeview
+        self.selected = set()  # Nomes selecionados (também fora da tela)
+        self.row_height = DEFAULT_ROW_HEIGHT
+        self.header_height = DEFAULT_HEADER_HEIGHT
+
+        self.tree = ttk.Treeview(parent, columns=[column[0] for column in COLUMNS],
+                                 show="headings", height=height)
+        for column, title, sort, width in COLUMNS:
+            self.tree.heading(column, text=title, command=lambda sort=sort: self.sort_by(sort))
+            self.tree.column(column, width=width, anchor="w" if sort == 'name' else "center")
+
+        # A rolagem vertical é do modelo, não do Treeview
+        self.v_scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+        h_scrollbar = ttk.Scrollbar(parent, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.v_scrollbar.grid(row=0, column=1, sticky="ns")
+        h_scrollbar.grid(row=1, column=0, sticky="ew")
+        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_columnconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<Button-1>", self.on_click)
+        self.tree.bind("<MouseWheel>", self.on_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(WHEEL_ROWS))
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", None), ("<Next>", None),
+                          ("<Home>", None), ("<End>", None)):
+            self.tree.bind(key, lambda event, key=key, step=step: self.on_key(key, step))
+
+    # === CONTEÚDO ===
+
+    def replace(self, files):
+        """
+        Troca a lista pela listagem completa do servidor
+
+        Returns:
+            int: Arquivos na lista
+        """
+        self.model.replace(files)
+        self.render()
+        return len(self.model.files)
+
+    def apply(self, events):
+        """Aplica eventos de mudança da pasta e redesenha se algo mudou"""
+        changed = False
+        for event in events:
+            changed |= self.model.apply(event)
+        if changed:
+            self.render()
+
+    def clear(self):
+        """Esvazia a lista"""
+        self.model.clear()
+        self.selected.clear()
+        self.top = 0
+        self.render()
+
+    def sort_by(self, sort):
+        """Ordena pela coluna clicada (um segundo clique inverte a ordem)"""
+        reverse = not self.model.reverse if self.model.sort == sort else False
+        self.model.set_sort(sort, reverse)
+        for column, title, column_sort, _ in COLUMNS:
+            arrow = (" ▼" if reverse else " ▲") if column_sort == sort else ""
+            self.tree.heading(column, text=title + arrow)
+        self.render()
+
+    def set_filter(self, text):
+        """Filtra a lista pelo nome"""
+        self.model.set_filter(text)
+        self.top = 0
+        self.render()
+
+    def selected_names(self):
+        """
+        Arquivos selecionados, na ordem da lista
+
+        Returns:
+            list: Nomes (inclusive os fora da tela, exceto os escondidos pelo filtro)
+        """
+        positions = []
+        for name in self.selected:
+            index = self.model.index(name)
+            if index is not None:
+                positions.append((index, name))
+        return [name for _, name in sorted(positions)]
+
+    # === DESENHO ===
+
+    def render(self):
+        """Mostra as linhas visíveis do modelo, reescrevendo só as que mudaram"""
+        total = len(self.model)
+        self.top = max(0, min(self.top, total - self.rows))
+        count = min(self.rows, total - self.top)
+        for slot in range(count):
+            record = self.model[self.top + slot]
+            if slot < len(self.shown) and self.shown[slot] == record:
+                continue
+            name, size, _, modified = record
+            values = (name, format_size(size), modified)
+            if slot < len(self.shown):
+                self.tree.item(str(slot), values=values)
+                self.shown[slot] = record
+            else:
+                self.tree.insert("", "end", iid=str(slot), values=values)
+                self.shown.append(record)
+        while len(self.shown) > count:
+            self.shown.pop()
+            self.tree.delete(str(len(self.shown)))
+
+        # A seleção acompanha os nomes, não as linhas
+        selection = tuple(str(slot) for slot, record in enumerate(self.shown)
+                          if record[0] in self.selected)
+        if set(selection) != set(self.tree.selection()):
+            self.tree.selection_set(selection)
+
+        if total > self.rows:
+            self.v_scrollbar.set(self.top / total, (self.top + count) / total)
+        else:
+            self.v_scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        """Rola a lista algumas linhas"""
+        self.top += rows
+        self.render()
+        return "break"
+
+    def yview(self, *args):
+        """Comando da barra de rolagem vertical"""
+        total = len(self.model)
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            step = self.rows if args[2] == 'pages' else 1
+            self.top += int(args[1]) * step
+        self.render()
+
+    # === EVENTOS DO TREEVIEW ===
+
+    def on_resize(self, event):
+        """Recalcula quantas linhas cabem na tela"""
+        bbox = self.tree.bbox("0") if self.shown else None
+        if bbox:
+            self.header_height, self.row_height = bbox[1], bbox[3]
+        rows = max(1, (event.height - self.header_height) // max(1, self.row_height))
+        if rows != self.rows:
+            self.rows = rows
+            self.render()
+
+    def on_click(self, event):
+        """Um clique sem Shift/Control começa uma seleção nova, também fora da tela"""
+        if not event.state & EXTEND_SELECTION_MASK:
+            self.selected.clear()
+
+    def on_select(self, event):
+        """Guarda a seleção das linhas visíveis como nomes"""
+        visible = {record[0] for record in self.shown}
+        self.selected -= visible
+        self.selected.update(self.shown[int(item)][0] for item in self.tree.selection()
+                             if int(item) < len(self.shown))
+
+    def on_wheel(self, event):
+        """Roda do mouse (Windows e macOS)"""
+        # Windows informa múltiplos de 120; o macOS, passos pequenos
+        if abs(event.delta) >= 120:
+            steps = event.delta // 120
+        else:
+            steps = (event.delta > 0) - (event.delta < 0)
+        return self.scroll(-steps * WHEEL_ROWS)
+
+    def on_key(self, key, step):
+        """Setas, Page Up/Down, Home e End movem a seleção pela lista inteira"""
+        total = len(self.model)
+        if not total:
+            return "break"
+        focus = self.tree.focus()
+        current = self.top + int(focus) if focus else self.top
+        if key == "<Prior>":
+            step = -self.rows
+        elif key == "<Next>":
+            step = self.rows
+        elif key == "<Home>":
+            step = -total
+        elif key == "<End>":
+            step = total
+        index = max(0, min(current + step, total - 1))
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+        self.selected = {self.model[index][0]}
+        self.render()
+        slot = str(index - self.top)
+        self.tree.focus(slot)
+        return "break"
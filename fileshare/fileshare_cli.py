@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - LINHA DE COMANDO
+Transferências em massa sem interface gráfica (para scripts e agendamentos)
+
+Os arquivos locais são escolhidos por padrões glob e os do servidor por
+padrões no estilo do shell ('*.log', 'relatorio_2024-??.pdf'). Cada arquivo
+é um trabalho da mesma fila de transferências usada pela interface gráfica,
+com `--jobs` trabalhos ao mesmo tempo; `--batch` manda tudo num único lote.
+
+Uso:
+    python fileshare_cli.py --host servidor ls --prefix rel
+    python fileshare_cli.py search 'rel*' --ext pdf --min-size 1M --after 2024-01-01
+    python fileshare_cli.py put 'dados/**/*.csv' --jobs 4
+    python fileshare_cli.py get '*.csv' --dest baixados --jobs 4
+    python fileshare_cli.py --replicas auto get '*.iso' --dest baixados
+    python fileshare_cli.py rm 'tmp_*'
+    python fileshare_cli.py mirror pasta_local --delete
+
+Código de saída: 0 se tudo deu certo, 1 se alguma transferência falhou e 2
+se o servidor não respondeu.
+"""
+
+import argparse
+import fnmatch
+import glob
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from client_api import FileShareClient, ClientError, REPLICAS_AUTO, format_size
+from protocol import parse_address
+from units import parse_size
+from download_cache import DownloadCache, DEFAULT_MAX_BYTES, default_folder
+from archive import valid_name
+from transfer_manager import TransferManager, DONE, CANCELLED
+
+# Intervalo entre as consultas à fila de transferências (segundos)
+POLL_INTERVAL = 0.2
+
+# Intervalo entre as linhas de progresso (segundos)
+PROGRESS_INTERVAL = 5.0
+
+
+def parse_date(text):
+    """Converte uma data como '2024-01-31' ou '2024-01-31 14:00' (hora local) em epoch"""
+    try:
+        return datetime.fromisoformat(text.strip()).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: {text}")
+
+
+def parse_byte_size(text):
+    """Converte um tamanho como '100K' ou '2G' em bytes (ver units.parse_size)"""
+    try:
+        return parse_size(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"tamanho inválido: {text}")
+
+
+def parse_replicas(text):
+    """Converte 'auto' ou 'host:porta,host:porta' na opção `replicas` do cliente"""
+    if text.strip().lower() == REPLICAS_AUTO:
+        return REPLICAS_AUTO
+    try:
+        return [parse_address(item.strip()) for item in text.split(',') if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"réplicas inválidas: {text}")
+
+
+def job_failed(job):
+    """Mensagem de erro de um trabalho concluído, ou None se deu certo"""
+    if job.status == CANCELLED:
+        return "cancelado"
+    if job.status != DONE:
+        return str(job.error)
+    if job.result.get('status') != 'success':
+        return job.result.get('message', 'Erro desconhecido')
+    return None
+
+
+def run_jobs(specs, workers, quiet=False):
+    """
+    Executa transferências na fila com `workers` ao mesmo tempo
+
+    Args:
+        specs (list): Triplas (tipo, nome, função que recebe o TransferJob)
+        workers (int): Transferências simultâneas
+        quiet (bool): Mostra só os erros
+
+    Returns:
+        int: Quantidade de transferências que falharam
+    """
+    if not specs:
+        return 0
+    manager = TransferManager(workers=workers, max_queued=0)
+    jobs = [manager.submit(kind, name, run) for kind, name, run in specs]
+    reported = 0
+    failures = 0
+    started = time.monotonic()
+    last_progress = started
+    try:
+        while reported < len(jobs):
+            time.sleep(POLL_INTERVAL)
+            _, completed = manager.poll()
+            for job in completed:
+                reported += 1
+                error = job_failed(job)
+                if error:
+                    failures += 1
+                    print(f"❌ {job.name}: {error}", file=sys.stderr)
+                elif not quiet:
+                    elapsed = max(job.finished - job.started, 1e-9)
+                    print(f"✅ {job.name}: {format_size(job.done)} em {elapsed:.1f}s "
+                          f"({format_size(job.done / elapsed)}/s)")
+            now = time.monotonic()
+            if not quiet and now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                done = sum(job.done for job in jobs)
+                print(f"📊 {reported}/{len(jobs)} concluída(s), {format_size(done)} "
+                      f"({format_size(done / (now - started))}/s)")
+    except KeyboardInterrupt:
+        print("⛔ Cancelando transferências (podem ser retomadas)...", file=sys.stderr)
+        raise
+    finally:
+        manager.shutdown()
+    return failures
+
+
+def expand_local(patterns):
+    """
+    Arquivos locais que batem com os padrões glob
+
+    Returns:
+        tuple: (lista de Path, nomes ignorados com o motivo)
+    """
+    paths = {}
+    skipped = []
+    for pattern in patterns:
+        matches = [Path(path) for path in glob.glob(pattern, recursive=True)
+                   if os.path.isfile(path)]
+        if not matches:
+            skipped.append((pattern, "nenhum arquivo encontrado"))
+        for path in matches:
+            if not valid_name(path.name):
+                skipped.append((str(path), "nome não suportado pelo servidor"))
+            elif path.name in paths and paths[path.name].resolve() != path.resolve():
+                skipped.append((str(path), f"mesmo nome que {paths[path.name]}"))
+            else:
+                paths[path.name] = path
+    return list(paths.values()), skipped
+
+
+def match_remote(client, patterns):
+    """
+    Nomes do servidor que batem com os padrões
+
+    Returns:
+        list: Nomes, em ordem
+    """
+    names = [info['name'] for info in client.list_files()]
+    return [name for name in names
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+def upload_specs(client, paths, args):
+    """Trabalhos de envio: um por arquivo ou um lote com todos"""
+    codec = client.upload_codec(not args.no_compression)
+    if args.batch:
+        entries = [(path.name, path) for path in paths]
+        return [('upload', f"lote de {len(entries)} arquivo(s)",
+                 lambda job: client.upload_batch(entries, codec, job.progress))]
+    dedup = getattr(args, 'dedup', False)
+    return [('upload', path.name,
+             lambda job, path=path: client.upload(path, codec, dedup, job.progress))
+            for path in paths]
+
+
+def command_ls(client, args):
+    """Lista os arquivos do servidor"""
+    count = total = 0
+    for info in client.list_files(prefix=args.prefix, sort=args.sort, reverse=args.reverse):
+        count += 1
+        total += info['size']
+        print(f"{format_size(info['size']):>10}  {info['modified']}  {info['name']}")
+    print(f"📂 {count} arquivo(s), {format_size(total)}")
+    return 0
+
+
+def command_search(client, args):
+    """Busca arquivos no índice do servidor"""
+    count = total = 0
+    for info in client.search(sort=args.sort, reverse=args.reverse, prefix=args.prefix,
+                              glob=args.pattern, extensions=args.ext,
+                              min_size=args.min_size, max_size=args.max_size,
+                              modified_after=args.after, modified_before=args.before):
+        count += 1
+        total += info['size']
+        print(f"{format_size(info['size']):>10}  {info['modified']}  {info['name']}")
+        if args.limit and count >= args.limit:
+            break
+    print(f"🔎 {count} arquivo(s), {format_size(total)}")
+    return 0
+
+
+def command_put(client, args):
+    """Envia os arquivos locais que batem com os padrões"""
+    paths, skipped = expand_local(args.patterns)
+    for name, reason in skipped:
+        print(f"⚠️ {name}: {reason}", file=sys.stderr)
+    if not paths:
+        print("⚠️ Nenhum arquivo para enviar", file=sys.stderr)
+        return 1
+    print(f"📤 Enviando {len(paths)} arquivo(s) "
+          f"({format_size(sum(path.stat().st_size for path in paths))})")
+    failures = run_jobs(upload_specs(client, paths, args), args.jobs, args.quiet)
+    return 1 if failures or skipped else 0
+
+
+def command_get(client, args):
+    """Baixa os arquivos do servidor que batem com os padrões"""
+    names = match_remote(client, args.patterns)
+    if not names:
+        print("⚠️ Nenhum arquivo do servidor bate com os padrões", file=sys.stderr)
+        return 1
+    dest = Path(args.dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    if not args.no_cache and not args.batch:
+        client.cache = DownloadCache(args.cache_dir, args.cache_size)
+    compression = client.download_codecs(not args.no_compression)
+    print(f"📥 Baixando {len(names)} arquivo(s) para {dest}")
+    if args.batch:
+        specs = [('download', f"lote de {len(names)} arquivo(s)",
+                  lambda job: client.download_batch(names, str(dest), compression, job.progress))]
+    else:
+        specs = [('download', name,
+                  lambda job, name=name: client.download(name, str(dest / name), args.streams,
+                                                         compression, job.progress))
+                 for name in names]
+    return 1 if run_jobs(specs, args.jobs, args.quiet) else 0
+
+
+def command_rm(client, args):
+    """Deleta os arquivos do servidor que batem com os padrões"""
+    names = match_remote(client, args.patterns)
+    if not names:
+        print("⚠️ Nenhum arquivo do servidor bate com os padrões", file=sys.stderr)
+        return 1
+    failed = 0
+    for name, response in client.delete_files(names):
+        if response.get('status') == 'success':
+            if not args.quiet:
+                print(f"🗑️ {name}")
+        else:
+            failed += 1
+            print(f"❌ {name}: {response.get('message', 'Erro desconhecido')}", file=sys.stderr)
+    print(f"✅ {len(names) - failed} arquivo(s) deletado(s)")
+    return 1 if failed else 0
+
+
+def command_mirror(client, args):
+    """Deixa o servidor com o conteúdo de uma pasta local"""
+    plan = client.plan_mirror(args.folder, delete=args.delete)
+    uploads = plan['batch'] + plan['single']
+    for name in plan['skipped']:
+        print(f"⚠️ {name}: nome não suportado pelo servidor", file=sys.stderr)
+    print(f"🔁 {len(uploads)} para enviar, {len(plan['delete'])} para deletar, "
+          f"{plan['unchanged']} sem mudança")
+    if args.dry_run:
+        for path in uploads:
+            print(f"📤 {path.name}")
+        for name in plan['delete']:
+            print(f"🗑️ {name}")
+        return 0
+
+    codec = client.upload_codec(not args.no_compression)
+    specs = []
+    if plan['batch']:
+        # Arquivos pequenos vão juntos: uma requisição para todos
+        entries = [(path.name, path) for path in plan['batch']]
+        specs.append(('upload', f"lote de {len(entries)} arquivo(s) pequeno(s)",
+                      lambda job: client.upload_batch(entries, codec, job.progress)))
+    specs += [('upload', path.name,
+               lambda job, path=path: client.upload(path, codec, False, job.progress))
+              for path in plan['single']]
+    failures = run_jobs(specs, args.jobs, args.quiet)
+
+    if plan['delete'] and not failures:
+        for name, response in client.delete_files(plan['delete']):
+            if response.get('status') != 'success':
+                failures += 1
+                print(f"❌ {name}: {response.get('message', 'Erro desconhecido')}",
+                      file=sys.stderr)
+            elif not args.quiet:
+                print(f"🗑️ {name}")
+    elif plan['delete']:
+        print("⚠️ Houve falhas no envio: nada foi deletado do servidor", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def parse_args(argv=None):
+    """Lê as opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Cliente de compartilhamento de arquivos")
+    parser.add_argument('--host', default='localhost', help="IP do servidor")
+    parser.add_argument('--port', type=int, default=8888, help="Porta do servidor")
+    parser.add_argument('--timeout', type=float, default=10, help="Timeout das conexões")
+    parser.add_argument('--replicas', type=parse_replicas, default=None,
+                        help="Divide listagens e downloads com réplicas: 'auto' (as "
+                             "anunciadas pelo servidor) ou 'host:porta,host:porta'")
+    parser.add_argument('--quiet', '-q', action='store_true', help="Mostra só os erros")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def transfer_options(command):
+        command.add_argument('--jobs', '-j', type=int, default=3,
+                             help="Transferências simultâneas")
+        command.add_argument('--no-compression', action='store_true',
+                             help="Não usa compressão")
+
+    ls = commands.add_parser('ls', help="Lista os arquivos do servidor")
+    ls.add_argument('--prefix', default='', help="Só nomes que começam com o prefixo")
+    ls.add_argument('--sort', choices=['name', 'size', 'modified'], default='name')
+    ls.add_argument('--reverse', action='store_true')
+    ls.set_defaults(run=command_ls)
+
+    search = commands.add_parser('search', help="Busca arquivos no índice do servidor")
+    search.add_argument('pattern', nargs='?', default=None,
+                        help="Padrão do nome (ex.: 'rel*.pdf', diferencia maiúsculas)")
+    search.add_argument('--prefix', default='', help="Só nomes que começam com o prefixo")
+    search.add_argument('--ext', action='append', default=None,
+                        help="Extensão aceita (pode repetir: --ext csv --ext tsv)")
+    search.add_argument('--min-size', type=parse_byte_size, default=None, help="Ex.: 100K")
+    search.add_argument('--max-size', type=parse_byte_size, default=None, help="Ex.: 2G")
+    search.add_argument('--after', type=parse_date, default=None,
+                        help="Modificados a partir da data (ex.: 2024-01-31)")
+    search.add_argument('--before', type=parse_date, default=None,
+                        help="Modificados antes da data")
+    search.add_argument('--sort', choices=['name', 'size', 'modified'], default='name')
+    search.add_argument('--reverse', action='store_true')
+    search.add_argument('--limit', type=int, default=None, help="Mostra no máximo N arquivos")
+    search.set_defaults(run=command_search)
+
+    put = commands.add_parser('put', help="Envia arquivos locais (padrões glob, ** recursivo)")
+    put.add_argument('patterns', nargs='+')
+    put.add_argument('--batch', action='store_true', help="Envia tudo num único lote")
+    put.add_argument('--dedup', action='store_true', help="Envio incremental (só pedaços novos)")
+    transfer_options(put)
+    put.set_defaults(run=command_put)
+
+    get = commands.add_parser('get', help="Baixa arquivos do servidor (padrões como '*.csv')")
+    get.add_argument('patterns', nargs='+')
+    get.add_argument('--dest', default='.', help="Pasta local de destino")
+    get.add_argument('--streams', type=int, default=None,
+                     help="Conexões por download (padrão: pelo tamanho)")
+    get.add_argument('--batch', action='store_true', help="Baixa tudo num único lote")
+    get.add_argument('--cache-dir', default=None,
+                     help=f"Cache dos downloads (padrão: {default_folder()})")
+    get.add_argument('--cache-size', type=parse_byte_size, default=DEFAULT_MAX_BYTES,
+                     help="Espaço máximo do cache (ex.: 500M)")
+    get.add_argument('--no-cache', action='store_true',
+                     help="Baixa tudo de novo, sem usar nem guardar no cache")
+    transfer_options(get)
+    get.set_defaults(run=command_get)
+
+    rm = commands.add_parser('rm', help="Deleta arquivos do servidor (padrões como 'tmp_*')")
+    rm.add_argument('patterns', nargs='+')
+    rm.set_defaults(run=command_rm)
+
+    mirror = commands.add_parser('mirror', help="Sincroniza uma pasta local com o servidor")
+    mirror.add_argument('folder', help="Pasta local (só o primeiro nível)")
+    mirror.add_argument('--delete', action='store_true',
+                        help="Deleta do servidor o que não existe na pasta")
+    mirror.add_argument('--dry-run', action='store_true',
+                        help="Só mostra o que seria feito")
+    transfer_options(mirror)
+    mirror.set_defaults(run=command_mirror)
+
+    args = parser.parse_args(argv)
+    if getattr(args, 'jobs', 1) < 1:
+        parser.error("--jobs deve ser pelo menos 1")
+    return args
+
+
+def main(argv=None):
+    """Função principal da linha de comando"""
+    args = parse_args(argv)
+    log = None if args.quiet else print
+    client = FileShareClient((args.host, args.port), log=log, timeout=args.timeout,
+                             replicas=args.replicas)
+    try:
+        client.connect()
+    except OSError as e:
+        print(f"❌ Não foi possível conectar a {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 2
+    try:
+        return args.run(client, args)
+    except ClientError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        client.close()
+        if client.cache:
+            client.cache.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
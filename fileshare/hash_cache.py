@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - CHECKSUMS
+Somas de verificação calculadas durante a transferência e cache persistente
+dos resumos no servidor
+
+O arquivo é dividido em blocos de BLOCK_SIZE e cada bloco tem o seu SHA-256;
+o checksum do arquivo é o SHA-256 da sequência de resumos dos blocos. Assim
+cada intervalo alinhado (um fluxo de um download segmentado, a parte nova de
+um upload retomado) é conferido sozinho, na ordem em que chega, sem uma
+segunda leitura do arquivo.
+
+O servidor guarda os resumos num SQLite indexado pelo inode e validado pelo
+tamanho e pela data de modificação: enquanto o arquivo não mudar, downloads
+e consultas repetidos usam os resumos guardados (e o sendfile) sem reler
+nada do disco.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+# Tamanho dos blocos com resumo próprio
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# Nome do esquema de checksum anunciado em server_info
+CHECKSUM_ALGORITHM = 'sha256-blocks'
+
+# Tamanho de um resumo SHA-256
+DIGEST_SIZE = 32
+
+# Marca de bloco ainda sem resumo no cache
+_UNKNOWN = bytes(DIGEST_SIZE)
+
+# Tamanho das leituras ao calcular o resumo de um arquivo inteiro
+READ_SIZE = 1024 * 1024
+
+
+def block_count(size):
+    """Quantidade de blocos de um arquivo com `size` bytes"""
+    return -(-size // BLOCK_SIZE)
+
+
+def block_span(offset, length, filesize):
+    """
+    Blocos cobertos por um intervalo, se ele estiver alinhado aos blocos
+
+    Args:
+        offset (int): Início do intervalo
+        length (int): Tamanho do intervalo
+        filesize (int): Tamanho do arquivo
+
+    Returns:
+        tuple: (primeiro bloco, quantidade) ou None se não estiver alinhado
+    """
+    end = offset + length
+    if offset % BLOCK_SIZE or (end != filesize and end % BLOCK_SIZE):
+        return None
+    return offset // BLOCK_SIZE, block_count(length)
+
+
+def tree_digest(blocks):
+    """
+    Checksum de um arquivo a partir dos resumos de todos os blocos
+
+    Args:
+        blocks (list): Resumos hexadecimais, em ordem
+
+    Returns:
+        str: SHA-256 hexadecimal
+    """
+    digest = hashlib.sha256()
+    for block in blocks:
+        digest.update(bytes.fromhex(block))
+    return digest.hexdigest()
+
+
+class BlockHasher:
+    def __init__(self):
+        """Calcula os resumos dos blocos de um fluxo que começa alinhado"""
+        self.blocks = []  # Resumos hexadecimais dos blocos completos
+        self._hash = hashlib.sha256()
+        self._filled = 0  # Bytes já somados no bloco atual
+
+    def update(self, data):
+        """Soma mais dados do fluxo"""
+        view = memoryview(data)
+        while view:
+            take = min(BLOCK_SIZE - self._filled, len(view))
+            self._hash.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == BLOCK_SIZE:
+                self.blocks.append(self._hash.hexdigest())
+                self._hash = hashlib.sha256()
+                self._filled = 0
+
+    def finish(self):
+        """
+        Fecha o último bloco (se incompleto) no fim do fluxo
+
+        Returns:
+            list: Resumos de todos os blocos
+        """
+        if self._filled:
+            self.blocks.append(self._hash.hexdigest())
+            self._hash = hashlib.sha256()
+            self._filled = 0
+        return self.blocks
+
+
+class HashingReader:
+    def __init__(self, f, hasher):
+        """
+        Arquivo de leitura que soma em `hasher` tudo o que é lido
+
+        Não expõe fileno(), então quem envia cai no caminho com buffer
+        (o sendfile não passaria os dados pelo processo).
+
+        Args:
+            f: Arquivo aberto em modo binário
+            hasher (BlockHasher): Recebe os bytes lidos
+        """
+        self.f = f
+        self.hasher = hasher
+        self.position = None  # Definida pelo primeiro seek
+
+    def seek(self, position):
+        """Posiciona a leitura; só aceita continuar de onde parou"""
+        if self.position is not None and position != self.position:
+            raise ValueError('Leitura fora de ordem durante o cálculo do checksum')
+        self.f.seek(position)
+        self.position = position
+
+    def read(self, size=-1):
+        """Lê e soma os bytes"""
+        data = self.f.read(size)
+        self.hasher.update(data)
+        self.position = (self.position or 0) + len(data)
+        return data
+
+    def readinto(self, buffer):
+        """Lê no buffer e soma os bytes"""
+        n = self.f.readinto(buffer)
+        if n:
+            self.hasher.update(memoryview(buffer)[:n])
+            self.position = (self.position or 0) + n
+        return n
+
+
+class HashingWriter:
+    def __init__(self, f, hasher):
+        """
+        Arquivo de escrita que soma em `hasher` tudo o que é gravado
+
+        Args:
+            f: Arquivo aberto para escrita
+            hasher (BlockHasher): Recebe os bytes gravados
+        """
+        self.f = f
+        self.hasher = hasher
+
+    def write(self, data):
+        """Grava e soma os bytes (só o que foi gravado entra na soma)"""
+        n = self.f.write(data)
+        self.hasher.update(data)
+        return n
+
+
+class HashCache:
+    def __init__(self, path):
+        """
+        Cache persistente dos resumos de blocos dos arquivos do servidor
+
+        Args:
+            path (Path): Arquivo do banco SQLite
+        """
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), timeout=30, check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS digests ('
+            ' dev INTEGER NOT NULL, ino INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,'
+            ' blocks BLOB NOT NULL,'
+            ' PRIMARY KEY (dev, ino))'
+        )
+
+    def _load(self, stat):
+        """Resumos guardados de uma versão de arquivo (chamado com o lock)"""
+        row = self.db.execute(
+            'SELECT size, mtime_ns, blocks FROM digests WHERE dev = ? AND ino = ?',
+            (stat.st_dev, stat.st_ino)
+        ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2]
+
+    def lookup(self, stat, first=0, count=None):
+        """
+        Busca os resumos de um trecho de blocos
+
+        Args:
+            stat: os.stat da versão atual do arquivo
+            first (int): Primeiro bloco
+            count (int): Quantidade de blocos (None = até o fim)
+
+        Returns:
+            list: Resumos hexadecimais ou None se algum não estiver no cache
+        """
+        if count is None:
+            count = block_count(stat.st_size) - first
+        if not count:
+            return []
+        with self.lock:
+            blob = self._load(stat)
+        if blob is None:
+            return None
+        blocks = []
+        for index in range(first, first + count):
+            digest = blob[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]
+            if len(digest) != DIGEST_SIZE or digest == _UNKNOWN:
+                return None
+            blocks.append(digest.hex())
+        return blocks
+
+    def store(self, stat, first, blocks):
+        """
+        Guarda os resumos de um trecho de blocos de uma versão de arquivo
+
+        Trechos de downloads diferentes vão se somando até o arquivo
+        inteiro estar no cache; uma versão nova descarta a anterior.
+
+        Args:
+            stat: os.stat da versão do arquivo que foi lida ou gravada
+            first (int): Primeiro bloco do trecho
+            blocks (list): Resumos hexadecimais
+        """
+        total = block_count(stat.st_size)
+        if first + len(blocks) > total:
+            return
+        with self.lock:
+            blob = bytearray(self._load(stat) or _UNKNOWN * total)
+            for i, block in enumerate(blocks):
+                start = (first + i) * DIGEST_SIZE
+                blob[start:start + DIGEST_SIZE] = bytes.fromhex(block)
+            self.db.execute(
+                'INSERT OR REPLACE INTO digests (dev, ino, size, mtime_ns, blocks) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, bytes(blob))
+            )
+
+    def forget(self, stat):
+        """Descarta os resumos de um arquivo (ex.: removido)"""
+        with self.lock:
+            self.db.execute('DELETE FROM digests WHERE dev = ? AND ino = ?',
+                            (stat.st_dev, stat.st_ino))
+
+    def checksum(self, stat):
+        """
+        Checksum do arquivo se todos os blocos estiverem no cache
+
+        Returns:
+            str: SHA-256 hexadecimal ou None
+        """
+        blocks = self.lookup(stat)
+        return tree_digest(blocks) if blocks is not None else None
+
+    def file_checksum(self, path):
+        """
+        Checksum de um arquivo, lendo-o só se o cache não tiver os resumos
+
+        Args:
+            path (Path): Arquivo
+
+        Returns:
+            str: SHA-256 hexadecimal
+        """
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            blocks = self.lookup(stat)
+            if blocks is None:
+                hasher = BlockHasher()
+                while True:
+                    data = f.read(READ_SIZE)
+                    if not data:
+                        break
+                    hasher.update(data)
+                blocks = hasher.finish()
+                # Só guarda se o arquivo não mudou durante a leitura
+                after = os.fstat(f.fileno())
+                if (after.st_size, after.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                    self.store(stat, 0, blocks)
+        return tree_digest(blocks)
+
+    def close(self):
+        """Fecha o banco"""
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - LISTAGEM
+Cache da listagem da pasta compartilhada com paginação por cursor
+
+A pasta é lida com os.scandir só quando muda (data de modificação do
+diretório, invalidação explícita do servidor ou idade máxima do cache).
+Cada ordenação é calculada uma vez por versão da pasta, e uma página é
+localizada por busca binária, custando O(log n + tamanho da página).
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+# Campos aceitos para ordenação
+SORT_KEYS = ('name', 'size', 'modified')
+
+# Idade máxima do cache: pega alterações de conteúdo feitas fora do servidor
+# (editar um arquivo no lugar não muda a data do diretório)
+MAX_AGE = 5.0
+
+# Quantas visões filtradas por prefixo ficam guardadas
+MAX_VIEWS = 32
+
+
+def encode_cursor(key):
+    """Transforma a chave do último item de uma página num cursor opaco"""
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverso de encode_cursor"""
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii'))))
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+
+
+class Snapshot:
+    def __init__(self, entries):
+        """
+        Uma versão da listagem da pasta
+
+        Args:
+            entries (dict): nome -> (tamanho, mtime em segundos)
+        """
+        self.entries = entries
+        self.views = OrderedDict()  # (ordenação, prefixo) -> chaves ordenadas
+        self.lock = threading.Lock()
+
+    def view(self, sort, prefix):
+        """
+        Chaves (valor de ordenação, nome) ordenadas, filtradas por prefixo
+
+        Returns:
+            list: Lista ordenada de tuplas
+        """
+        with self.lock:
+            key = (sort, prefix)
+            keys = self.views.get(key)
+            if keys is not None:
+                self.views.move_to_end(key)
+                return keys
+
+            if sort == 'name' and prefix and ('name', '') in self.views:
+                # Por nome, o prefixo é um intervalo contíguo da visão completa
+                full = self.views[('name', '')]
+                start = bisect_left(full, (prefix,))
+                end = bisect_left(full, (prefix + '\U0010ffff',))
+                keys = full[start:end]
+            else:
+                names = self.entries
+                if prefix:
+                    names = [name for name in names if name.startswith(prefix)]
+                if sort == 'name':
+                    keys = sorted((name,) for name in names)
+                elif sort == 'size':
+                    keys = sorted((self.entries[name][0], name) for name in names)
+                else:
+                    keys = sorted((self.entries[name][1], name) for name in names)
+
+            self.views[key] = keys
+            if len(self.views) > MAX_VIEWS:
+                self.views.popitem(last=False)
+            return keys
+
+
+class ListingCache:
+    def __init__(self, folder, max_age=MAX_AGE):
+        """
+        Cache da listagem de uma pasta
+
+        Args:
+            folder (Path): Pasta listada
+            max_age (float): Idade máxima antes de conferir de novo a pasta
+        """
+        self.folder = folder
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.dir_mtime = None
+        self.loaded_at = 0.0
+
+    def invalidate(self):
+        """Descarta a listagem (chamado quando o servidor altera a pasta)"""
+        with self.lock:
+            self.snapshot = None
+
+    def scan(self):
+        """
+        Lê a pasta com os.scandir (os dados de stat vêm da própria listagem
+        no Windows e custam uma chamada por arquivo nos demais sistemas)
+
+        Returns:
+            dict: nome -> (tamanho, mtime)
+        """
+        entries = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        entries[entry.name] = (stat.st_size, stat.st_mtime)
+                except OSError:
+                    continue  # Apagado durante a listagem
+        return entries
+
+    def current(self):
+        """
+        Retorna a versão atual da listagem, relendo a pasta se ela mudou
+
+        Returns:
+            Snapshot: Listagem atual
+        """
+        with self.lock:
+            now = time.monotonic()
+            dir_mtime = os.stat(self.folder).st_mtime_ns
+            if (self.snapshot is None or dir_mtime != self.dir_mtime
+                    or now - self.loaded_at > self.max_age):
+                self.snapshot = Snapshot(self.scan())
+                self.dir_mtime = dir_mtime
+                self.loaded_at = now
+            return self.snapshot
+
+    def page(self, sort='name', reverse=False, prefix='', cursor=None, limit=None):
+        """
+        Retorna uma página da listagem
+
+        Args:
+            sort (str): 'name', 'size' ou 'modified'
+            reverse (bool): Ordem decrescente
+            prefix (str): Só nomes que começam com este prefixo
+            cursor (str): Cursor devolvido pela página anterior
+            limit (int): Itens por página (None = todos)
+
+        Returns:
+            tuple: (lista de (nome, tamanho, mtime), próximo cursor ou None, total)
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f'Ordenação inválida: {sort}')
+        snapshot = self.current()
+        keys = snapshot.view(sort, prefix or '')
+        total = len(keys)
+
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and keys and len(after) != len(keys[0]):
+            raise ValueError('Cursor de outra ordenação')
+
+        if not reverse:
+            start = bisect_right(keys, after) if after else 0
+            end = total if limit is None else min(total, start + limit)
+            selected = keys[start:end]
+            has_more = end < total
+        else:
+            end = bisect_left(keys, after) if after else total
+            start = 0 if limit is None else max(0, end - limit)
+            selected = keys[start:end][::-1]
+            has_more = start > 0
+
+        entries = snapshot.entries
+        page = []
+        for key in selected:
+            name = key[-1]
+            size, mtime = entries[name]
+            page.append((name, size, mtime))
+
+        next_cursor = encode_cursor(selected[-1]) if has_more and selected else None
+        return page, next_cursor, total
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - ÍNDICE DE METADADOS
+Índice persistente dos arquivos compartilhados para a ação `search`
+
+Nome, tamanho, data de modificação, extensão e checksum (quando conhecido)
+de cada arquivo ficam num SQLite com índices por nome, tamanho, data e
+extensão. O servidor atualiza uma linha a cada upload ou remoção e confere
+a pasta inteira só ao iniciar (arquivos colocados na pasta por fora do
+servidor entram no índice no próximo início). Uma busca é uma consulta
+indexada com paginação por cursor, sem tocar no sistema de arquivos.
+"""
+
+import os
+import sqlite3
+import threading
+
+from listing import encode_cursor, decode_cursor
+
+# Campos aceitos para ordenação (e a coluna de cada um)
+SORT_COLUMNS = {'name': 'name', 'size': 'size', 'modified': 'mtime_ns'}
+
+# Itens por página quando o cliente não informa e o máximo aceito
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Linhas amostradas por índice ao atualizar as estatísticas do SQLite
+ANALYSIS_LIMIT = 1000
+
+# Caracteres especiais do GLOB do SQLite
+GLOB_SPECIAL = '*?['
+
+
+def extension(name):
+    """Extensão de um nome de arquivo, minúscula e sem o ponto"""
+    return os.path.splitext(name)[1][1:].lower()
+
+
+def glob_prefix(pattern):
+    """Parte literal do início de um padrão glob"""
+    for i, char in enumerate(pattern):
+        if char in GLOB_SPECIAL:
+            return pattern[:i]
+    return pattern
+
+
+class MetadataIndex:
+    def __init__(self, path):
+        """
+        Índice de metadados guardado em SQLite
+
+        Args:
+            path (Path): Arquivo do banco
+        """
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), timeout=30, check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            ' name TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,'
+            ' ext TEXT NOT NULL, digest TEXT)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS files_size ON files (size, name)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime_ns, name)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS files_ext ON files (ext, name)')
+
+    def update(self, name, stat, digest=None):
+        """
+        Registra a versão atual de um arquivo
+
+        Args:
+            name (str): Nome do arquivo
+            stat: os.stat do arquivo
+            digest (str): Checksum, se conhecido (senão mantém o anterior
+                quando o arquivo não mudou)
+        """
+        with self.lock:
+            self.db.execute(
+                'INSERT INTO files (name, size, mtime_ns, ext, digest) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET size = excluded.size,'
+                ' mtime_ns = excluded.mtime_ns, ext = excluded.ext,'
+                ' digest = CASE WHEN excluded.digest IS NOT NULL THEN excluded.digest'
+                ' WHEN files.size = excluded.size AND files.mtime_ns = excluded.mtime_ns'
+                ' THEN files.digest END',
+                (name, stat.st_size, stat.st_mtime_ns, extension(name), digest)
+            )
+
+    def remove(self, name):
+        """Tira um arquivo do índice"""
+        with self.lock:
+            self.db.execute('DELETE FROM files WHERE name = ?', (name,))
+
+    def sync(self, folder, checksum=None):
+        """
+        Confere o índice com a pasta (usado ao iniciar o servidor)
+
+        Args:
+            folder (Path): Pasta compartilhada
+            checksum: Função opcional stat -> checksum conhecido ou None,
+                usada para os arquivos novos ou alterados
+
+        Returns:
+            tuple: (arquivos incluídos ou atualizados, arquivos removidos)
+        """
+        with self.lock:
+            indexed = {name: (size, mtime_ns) for name, size, mtime_ns in
+                       self.db.execute('SELECT name, size, mtime_ns FROM files')}
+        changed = []
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Apagado durante a conferência
+                if indexed.pop(entry.name, None) != (stat.st_size, stat.st_mtime_ns):
+                    digest = checksum(stat) if checksum else None
+                    changed.append((entry.name, stat.st_size, stat.st_mtime_ns,
+                                    extension(entry.name), digest))
+        removed = list(indexed)
+
+        with self.lock:
+            # Uma transação só: ninguém busca enquanto o servidor inicia
+            with self.db:
+                self.db.execute('BEGIN')
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO files (name, size, mtime_ns, ext, digest) '
+                    'VALUES (?, ?, ?, ?, ?)', changed)
+                self.db.executemany('DELETE FROM files WHERE name = ?',
+                                    [(name,) for name in removed])
+            if changed or removed:
+                # Estatísticas (por amostragem) para o planejador escolher o
+                # índice certo, ex.: tamanho em vez de extensão
+                self.db.execute(f'PRAGMA analysis_limit={ANALYSIS_LIMIT}')
+                self.db.execute('ANALYZE')
+        return len(changed), len(removed)
+
+    def search(self, prefix='', glob=None, extensions=None, min_size=None, max_size=None,
+               modified_after=None, modified_before=None, sort='name', reverse=False,
+               cursor=None, limit=DEFAULT_LIMIT, count=False):
+        """
+        Busca arquivos pelos metadados
+
+        Args:
+            prefix (str): Nome começa com este prefixo
+            glob (str): Nome casa com o padrão (*, ? e [...], diferencia maiúsculas)
+            extensions (list): Extensões aceitas, sem o ponto
+            min_size (int): Tamanho mínimo em bytes
+            max_size (int): Tamanho máximo em bytes
+            modified_after (float): Modificado a partir deste instante (epoch)
+            modified_before (float): Modificado antes deste instante (epoch)
+            sort (str): 'name', 'size' ou 'modified'
+            reverse (bool): Ordem decrescente
+            cursor (str): Cursor devolvido pela página anterior
+            limit (int): Itens por página (até MAX_LIMIT)
+            count (bool): Conta também o total de resultados
+
+        Returns:
+            tuple: (lista de (nome, tamanho, mtime, extensão, checksum),
+            próximo cursor ou None, total ou None)
+
+        Raises:
+            ValueError: Se a ordenação ou o cursor forem inválidos
+        """
+        column = SORT_COLUMNS.get(sort)
+        if column is None:
+            raise ValueError(f'Ordenação inválida: {sort}')
+        limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+
+        where, params = [], []
+        # O prefixo (também o literal do glob) vira um intervalo do índice por nome
+        start = max(prefix or '', glob_prefix(glob) if glob else '')
+        if prefix and not start.startswith(prefix):
+            start = None  # Prefixo e glob incompatíveis: nenhum resultado
+        if start is None:
+            where.append('0')
+        elif start:
+            where.append('name >= ? AND name < ?')
+            params += [start, start + '\U0010ffff']
+        if glob:
+            where.append('name GLOB ?')
+            params.append(glob)
+        if extensions:
+            extensions = [ext.lower().lstrip('.') for ext in extensions]
+            where.append(f"ext IN ({', '.join('?' * len(extensions))})")
+            params += extensions
+        if min_size is not None:
+            where.append('size >= ?')
+            params.append(int(min_size))
+        if max_size is not None:
+            where.append('size <= ?')
+            params.append(int(max_size))
+        if modified_after is not None:
+            where.append('mtime_ns >= ?')
+            params.append(int(modified_after * 1e9))
+        if modified_before is not None:
+            where.append('mtime_ns < ?')
+            params.append(int(modified_before * 1e9))
+        filters = ' AND '.join(where) or '1'
+        filter_params = list(params)
+
+        keys = ['name'] if column == 'name' else [column, 'name']
+        if cursor:
+            after = decode_cursor(cursor)
+            if len(after) != len(keys):
+                raise ValueError('Cursor de outra ordenação')
+            where.append(f"({', '.join(keys)}) {'<' if reverse else '>'} "
+                         f"({', '.join('?' * len(keys))})")
+            params += after
+        order = ', '.join(f"{key} {'DESC' if reverse else 'ASC'}" for key in keys)
+
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT name, size, mtime_ns, ext, digest FROM files "
+                f"WHERE {' AND '.join(where) or '1'} ORDER BY {order} LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+            total = None
+            if count:
+                total = self.db.execute(f'SELECT COUNT(*) FROM files WHERE {filters}',
+                                        filter_params).fetchone()[0]
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more and rows:
+            name, size, mtime_ns = rows[-1][:3]
+            last = {'name': (name,), 'size': (size, name), 'mtime_ns': (mtime_ns, name)}
+            next_cursor = encode_cursor(last[column])
+        files = [(name, size, mtime_ns / 1e9, ext, digest)
+                 for name, size, mtime_ns, ext, digest in rows]
+        return files, next_cursor, total
+
+    def close(self):
+        """Fecha o banco"""
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - MÉTRICAS
+Contadores e histogramas de latência do servidor, consultados pela ação
+`stats` ou no formato texto do Prometheus
+
+O custo por requisição é uma leitura de relógio e duas passagens rápidas
+por um lock. Os bytes de cada conexão são contados pela própria
+FrameConnection, um frame por vez (ver `bytes_sent` e `bytes_received`).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites superiores dos baldes de latência (segundos)
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# Ações distintas acompanhadas; nomes além disso caem em 'other'
+MAX_ACTIONS = 64
+
+
+def _label(value):
+    """Escapa o valor de um rótulo no formato texto do Prometheus"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Histograma com baldes fixos (mesmo modelo do Prometheus)
+
+        Args:
+            buckets (tuple): Limites superiores em ordem crescente
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # O último é o +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Registra uma medida (chamado com o lock de ServerMetrics)"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estima um quantil pelo limite do balde onde ele cai
+
+        Returns:
+            float: Limite superior do balde (None sem medidas)
+        """
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+class ActionStats:
+    def __init__(self):
+        """Contadores de uma ação do protocolo"""
+        self.requests = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+
+class ConnectionStats:
+    def __init__(self, conn, address):
+        """
+        Dados de uma conexão ativa
+
+        Args:
+            conn (FrameConnection): Conexão acompanhada
+            address: Endereço do cliente
+        """
+        self.conn = conn
+        self.address = address
+        self.opened = time.monotonic()
+        self.requests = 0
+
+
+class ServerMetrics:
+    def __init__(self):
+        """Métricas de um servidor de arquivos"""
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.actions = {}  # nome -> ActionStats
+        self.connections = {}  # id(conn) -> ConnectionStats
+        self.connections_total = 0
+        self.in_flight = 0  # Requisições sendo atendidas agora
+        # Bytes das conexões já fechadas (as ativas somam na hora)
+        self.closed_bytes_sent = 0
+        self.closed_bytes_received = 0
+        self.gauges = {}  # nome -> (descrição, função sem argumentos)
+
+    # === REGISTRO ===
+
+    def add_gauge(self, name, description, read):
+        """
+        Registra um valor lido na hora da consulta (ex.: tamanho de uma fila)
+
+        Args:
+            name (str): Nome da métrica (sem o prefixo fileshare_)
+            description (str): Texto de ajuda
+            read: Função sem argumentos que devolve o valor atual
+        """
+        self.gauges[name] = (description, read)
+
+    def connection_opened(self, conn, address):
+        """Começa a acompanhar uma conexão"""
+        with self.lock:
+            self.connections[id(conn)] = ConnectionStats(conn, address)
+            self.connections_total += 1
+
+    def connection_closed(self, conn):
+        """Para de acompanhar uma conexão, guardando os bytes transferidos"""
+        with self.lock:
+            if self.connections.pop(id(conn), None) is not None:
+                self.closed_bytes_sent += conn.bytes_sent
+                self.closed_bytes_received += conn.bytes_received
+
+    def request_started(self, conn):
+        """
+        Marca o início de uma requisição
+
+        Returns:
+            float: Instante de início (passe para request_finished)
+        """
+        with self.lock:
+            self.in_flight += 1
+            stats = self.connections.get(id(conn))
+            if stats:
+                stats.requests += 1
+        return time.perf_counter()
+
+    def request_finished(self, action, started, ok):
+        """
+        Registra a latência e o resultado de uma requisição
+
+        Args:
+            action (str): Ação da requisição
+            started (float): Valor devolvido por request_started
+            ok (bool): False se terminou em erro
+        """
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.in_flight -= 1
+            stats = self.actions.get(action)
+            if stats is None:
+                if not isinstance(action, str) or len(self.actions) >= MAX_ACTIONS:
+                    action = 'other'
+                stats = self.actions.setdefault(action, ActionStats())
+            stats.requests += 1
+            if not ok:
+                stats.errors += 1
+            stats.latency.observe(elapsed)
+
+    # === CONSULTA ===
+
+    def read_gauges(self):
+        """Lê os valores registrados com add_gauge (erros viram None)"""
+        values = {}
+        for name, (_, read) in list(self.gauges.items()):
+            try:
+                values[name] = read()
+            except Exception:
+                values[name] = None
+        return values
+
+    def snapshot(self):
+        """
+        Copia o estado atual das métricas
+
+        Returns:
+            dict: Ações, conexões ativas, totais e filas
+        """
+        now = time.monotonic()
+        with self.lock:
+            actions = {}
+            for name, stats in self.actions.items():
+                latency = stats.latency
+                actions[name] = {
+                    'requests': stats.requests,
+                    'errors': stats.errors,
+                    'latency_avg': latency.sum / latency.count if latency.count else None,
+                    'latency_p50': latency.quantile(0.50),
+                    'latency_p90': latency.quantile(0.90),
+                    'latency_p99': latency.quantile(0.99)
+                }
+
+            connections = []
+            bytes_sent = self.closed_bytes_sent
+            bytes_received = self.closed_bytes_received
+            for stats in self.connections.values():
+                sent = stats.conn.bytes_sent
+                received = stats.conn.bytes_received
+                bytes_sent += sent
+                bytes_received += received
+                age = max(now - stats.opened, 1e-9)
+                connections.append({
+                    'address': str(stats.address),
+                    'age': round(age, 3),
+                    'requests': stats.requests,
+                    'bytes_sent': sent,
+                    'bytes_received': received,
+                    'send_rate': sent / age,  # Média desde a abertura (bytes/s)
+                    'receive_rate': received / age
+                })
+
+            result = {
+                'uptime': now - self.started,
+                'actions': actions,
+                'active_connections': len(self.connections),
+                'connections_total': self.connections_total,
+                'requests_in_flight': self.in_flight,
+                'bytes_sent': bytes_sent,
+                'bytes_received': bytes_received,
+                'connections': connections
+            }
+        result['queues'] = self.read_gauges()
+        return result
+
+    def prometheus_text(self):
+        """
+        Gera as métricas no formato texto do Prometheus
+
+        Por conexão só saem totais (um rótulo por cliente teria
+        cardinalidade ilimitada); os detalhes ficam na ação `stats`.
+
+        Returns:
+            str: Texto pronto para o endpoint /metrics
+        """
+        lines = []
+
+        def metric(name, kind, description):
+            lines.append(f'# HELP fileshare_{name} {description}')
+            lines.append(f'# TYPE fileshare_{name} {kind}')
+
+        with self.lock:
+            actions = [(_label(name), stats.requests, stats.errors, list(stats.latency.counts),
+                        stats.latency.count, stats.latency.sum)
+                       for name, stats in sorted(self.actions.items())]
+            active = len(self.connections)
+            connections_total = self.connections_total
+            in_flight = self.in_flight
+            bytes_sent = self.closed_bytes_sent + sum(
+                stats.conn.bytes_sent for stats in self.connections.values())
+            bytes_received = self.closed_bytes_received + sum(
+                stats.conn.bytes_received for stats in self.connections.values())
+
+        metric('requests_total', 'counter', 'Requisições atendidas por ação')
+        for name, requests, _, _, _, _ in actions:
+            lines.append(f'fileshare_requests_total{{action="{name}"}} {requests}')
+        metric('request_errors_total', 'counter', 'Requisições que terminaram em erro')
+        for name, _, errors, _, _, _ in actions:
+            lines.append(f'fileshare_request_errors_total{{action="{name}"}} {errors}')
+
+        metric('request_duration_seconds', 'histogram', 'Latência das requisições por ação')
+        for name, _, _, counts, count, total in actions:
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, counts):
+                cumulative += n
+                lines.append(f'fileshare_request_duration_seconds_bucket'
+                             f'{{action="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'fileshare_request_duration_seconds_bucket'
+                         f'{{action="{name}",le="+Inf"}} {count}')
+            lines.append(f'fileshare_request_duration_seconds_sum{{action="{name}"}} {total}')
+            lines.append(f'fileshare_request_duration_seconds_count{{action="{name}"}} {count}')
+
+        metric('active_connections', 'gauge', 'Conexões abertas')
+        lines.append(f'fileshare_active_connections {active}')
+        metric('connections_total', 'counter', 'Conexões aceitas desde o início')
+        lines.append(f'fileshare_connections_total {connections_total}')
+        metric('requests_in_flight', 'gauge', 'Requisições sendo atendidas')
+        lines.append(f'fileshare_requests_in_flight {in_flight}')
+        metric('bytes_sent_total', 'counter', 'Bytes enviados (frames completos)')
+        lines.append(f'fileshare_bytes_sent_total {bytes_sent}')
+        metric('bytes_received_total', 'counter', 'Bytes recebidos (frames completos)')
+        lines.append(f'fileshare_bytes_received_total {bytes_received}')
+
+        values = self.read_gauges()
+        for name, (description, _) in sorted(self.gauges.items()):
+            if values[name] is not None:
+                metric(name, 'gauge', description)
+                lines.append(f'fileshare_{name} {values[name]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def start_http_exporter(metrics, host, port):
+    """
+    Serve `GET /metrics` em HTTP numa thread de fundo para o Prometheus
+
+    Args:
+        metrics (ServerMetrics): Métricas exportadas
+        host (str): Endereço de escuta
+        port (int): Porta de escuta
+
+    Returns:
+        ThreadingHTTPServer: Servidor iniciado (use shutdown() para parar)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Uma linha por coleta só polui o console
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
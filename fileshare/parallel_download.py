@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - DOWNLOAD SEGMENTADO
+Divide um arquivo em intervalos e baixa cada um por uma conexão própria
+
+Os intervalos são gravados com escritas posicionais (os.pwrite) num arquivo
+pré-alocado, e o progresso de cada intervalo fica salvo ao lado do arquivo
+parcial para que um download interrompido continue de onde parou. Com
+compressão negociada, cada fluxo descomprime os próprios frames antes de
+gravar, então o progresso é sempre contado em bytes do arquivo.
+
+Os intervalos começam em fronteiras de bloco (ver hash_cache) e cada fluxo
+resume os blocos que recebe, comparando com os resumos enviados pelo
+servidor. Só bytes conferidos contam como baixados: se um fluxo cair ou for
+cancelado, ele recomeça do último bloco conferido.
+
+Uso sem interface gráfica:
+    python parallel_download.py localhost 8888 video.mp4 destino.mp4 --streams 4
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+from protocol import FrameConnection, FRAME_REQUEST, FRAME_RESPONSE, FLAG_COMPRESSED
+from compression import available_codecs, get_codec, CHUNK_SIZE
+from durability import preallocate
+from hash_cache import BlockHasher, BLOCK_SIZE, block_count, tree_digest
+
+# Cada fluxo deve ter pelo menos este tamanho para compensar uma conexão extra
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Limite padrão de conexões simultâneas por arquivo
+MAX_STREAMS = 8
+
+# Tentativas de cada intervalo antes de desistir
+MAX_RETRIES = 3
+
+# Intervalo entre gravações do progresso em disco (segundos)
+SAVE_INTERVAL = 1.0
+
+# Intervalo entre chamadas da função de progresso (segundos)
+PROGRESS_INTERVAL = 0.2
+
+
+class DownloadError(Exception):
+    """Erro informado pelo servidor ou arquivo alterado durante o download"""
+
+
+def choose_stream_count(filesize, max_streams=MAX_STREAMS, min_segment=MIN_SEGMENT_SIZE):
+    """
+    Escolhe quantos fluxos usar de acordo com o tamanho do arquivo
+
+    Args:
+        filesize (int): Tamanho do arquivo
+        max_streams (int): Limite de fluxos
+        min_segment (int): Tamanho mínimo de cada intervalo
+
+    Returns:
+        int: Quantidade de fluxos (pelo menos 1)
+    """
+    return max(1, min(max_streams, filesize // min_segment))
+
+
+def plan_segments(filesize, streams, align=1):
+    """
+    Divide o arquivo em intervalos contíguos de tamanhos parecidos
+
+    Args:
+        filesize (int): Tamanho do arquivo
+        streams (int): Quantidade desejada de intervalos
+        align (int): Todo intervalo começa num múltiplo deste valor
+
+    Returns:
+        list: Lista de [offset, tamanho, bytes já baixados]
+    """
+    units = -(-filesize // align)
+    streams = max(1, min(streams, units or 1))
+    base, extra = divmod(units, streams)
+    segments = []
+    offset = 0
+    for i in range(streams):
+        length = min((base + (1 if i < extra else 0)) * align, filesize - offset)
+        segments.append([offset, length, 0])
+        offset += length
+    return segments
+
+
+class PositionalWriter:
+    def __init__(self, fd):
+        """
+        Grava em posições absolutas de um arquivo a partir de várias threads
+
+        Args:
+            fd (int): Descritor do arquivo aberto para escrita
+        """
+        self.fd = fd
+        self.lock = None if hasattr(os, 'pwrite') else threading.Lock()
+
+    def write(self, data, position):
+        """Grava `data` inteiro em `position`"""
+        view = memoryview(data)
+        while view:
+            if self.lock is None:
+                n = os.pwrite(self.fd, view, position)
+            else:
+                # Sem pwrite (Windows): seek + write protegidos por lock
+                with self.lock:
+                    os.lseek(self.fd, position, os.SEEK_SET)
+                    n = os.write(self.fd, view)
+            view = view[n:]
+            position += n
+
+
+def open_connection(address, timeout):
+    """Abre uma conexão com frames para o servidor"""
+    sock = socket.create_connection(address, timeout=timeout)
+    return FrameConnection(sock)
+
+
+def request_range(conn, filename, offset, length, validator, request_id=1, compression=None,
+                  checksum=False, if_none_match=None):
+    """
+    Pede um intervalo do arquivo e valida a resposta
+    
+    Args:
+        compression (list): Codecs aceitos, em ordem de preferência
+        checksum (bool): Pede os resumos dos blocos do intervalo
+        if_none_match (list): Marcas de uma cópia local (ver download_cache)
+
+    Returns:
+        dict: Resposta do servidor (os dados vêm em seguida, exceto se o
+        status for `not_modified`)
+    """
+    request = {
+        'action': 'download_file',
+        'filename': filename,
+        'offset': offset,
+        'length': length
+    }
+    if validator:
+        request['if_range'] = validator
+    if compression:
+        request['compression'] = compression
+    if checksum:
+        request['checksum'] = True
+    if if_none_match:
+        request['if_none_match'] = if_none_match
+    conn.send_json(FRAME_REQUEST, request_id, request)
+    message = conn.recv_message(FRAME_RESPONSE)
+    if message is None:
+        raise ConnectionError("Servidor fechou a conexão")
+    response = message[1]
+    if if_none_match and response.get('status') == 'not_modified':
+        return response
+    if response.get('status') != 'success':
+        raise DownloadError(response.get('message', 'Erro desconhecido'))
+    if validator and response.get('validator') != validator:
+        raise DownloadError("Arquivo alterado no servidor durante o download")
+    return response
+
+
+def fetch_segment(address, filename, segment, validator, writer, timeout, cancel,
+                  compression=None, blocks=None):
+    """
+    Baixa um intervalo, reconectando e continuando se a conexão cair
+
+    Args:
+        segment (list): [offset, tamanho, bytes já baixados, bytes recebidos
+            ainda não conferidos] (atualizado aqui; só o terceiro é salvo)
+        cancel (threading.Event): Sinal para abandonar o download
+        compression (list): Codecs aceitos (None = sem compressão)
+        blocks (dict): Se informado, confere os blocos (índice -> resumo
+            conferido); o intervalo deve começar numa fronteira de bloco
+    """
+    offset, length = segment[0], segment[1]
+    for attempt in range(1, MAX_RETRIES + 1):
+        if blocks is not None and segment[2] < length:
+            # Só continua de fronteiras de bloco: o resto é conferido de novo
+            segment[2] = max(0, segment[2] - (offset + segment[2]) % BLOCK_SIZE)
+        if segment[2] >= length or cancel.is_set():
+            return
+        conn = None
+        start = offset + segment[2]
+        verified = start  # Fim dos bytes já conferidos
+        try:
+            conn = open_connection(address, timeout)
+            response = request_range(conn, filename, start, length - segment[2], validator,
+                                     compression=compression, checksum=blocks is not None)
+            codec = get_codec(response.get('compression'))
+            expected = response.get('blocks')
+            verify = expected is not None or response.get('blocks_trailer')
+            hasher = BlockHasher() if verify else None
+            first = start // BLOCK_SIZE
+            position = start
+            # Com codec, cada frame é um pedaço comprimido independente
+            for flags, chunk in conn.iter_data(whole_frames=codec is not None,
+                                               max_length=CHUNK_SIZE):
+                if cancel.is_set():
+                    return
+                if flags & FLAG_COMPRESSED:
+                    if codec is None:
+                        raise DownloadError("Frame comprimido sem codec negociado")
+                    chunk = codec.decompress(chunk)
+                writer.write(chunk, position)
+                position += len(chunk)
+                if hasher:
+                    hasher.update(chunk)
+                    if expected is not None:
+                        # Resumos já conhecidos: confere cada bloco ao fechar
+                        verified = check_blocks(hasher.blocks, expected, first, start, verified)
+                else:
+                    verified = position
+                segment[2] = verified - offset
+                segment[3] = position - verified
+            if hasher:
+                if response.get('blocks_trailer'):
+                    message = conn.recv_message(FRAME_RESPONSE)
+                    if message is None:
+                        raise ConnectionError("Servidor fechou a conexão")
+                    expected = message[1].get('blocks')
+                received = hasher.finish()
+                if expected is None or len(received) != len(expected):
+                    raise DownloadError("Resumos dos blocos não conferem com o intervalo")
+                check_blocks(received, expected, first, start, verified)
+                verified = position
+                for i, digest in enumerate(expected):
+                    blocks[first + i] = digest
+            return
+        except (ConnectionError, socket.timeout):
+            if attempt == MAX_RETRIES:
+                raise
+        finally:
+            # Bytes não conferidos não contam: a retomada os baixa de novo
+            segment[2] = verified - offset
+            segment[3] = 0
+            if conn:
+                conn.close()
+
+
+def check_blocks(received, expected, first, start, verified):
+    """
+    Compara os resumos dos blocos recebidos com os do servidor
+
+    Args:
+        received (list): Resumos calculados dos blocos completos
+        expected (list): Resumos enviados pelo servidor
+        first (int): Índice do primeiro bloco do intervalo
+        start (int): Offset do início do intervalo
+        verified (int): Offset até onde já foi conferido
+
+    Returns:
+        int: Novo offset até onde os bytes foram conferidos
+
+    Raises:
+        DownloadError: Se algum bloco não bate
+    """
+    for i in range((verified - start) // BLOCK_SIZE, len(received)):
+        if i >= len(expected) or received[i] != expected[i]:
+            raise DownloadError(f"Checksum divergente no bloco {first + i}")
+    return start + len(received) * BLOCK_SIZE
+
+
+def load_state(info_path, part_path):
+    """Lê o progresso salvo de um download interrompido"""
+    try:
+        state = json.loads(info_path.read_text(encoding='utf-8'))
+        if part_path.exists() and state.get('segments'):
+            return state
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def save_state(info_path, validator, filesize, segments):
+    """Grava o progresso de cada intervalo ao lado do arquivo parcial"""
+    info_path.write_text(json.dumps({
+        'validator': validator,
+        'filesize': filesize,
+        'segments': [segment[:3] for segment in segments]
+    }), encoding='utf-8')
+
+
+def download_segmented(address, filename, save_path, streams=None,
+                       max_streams=MAX_STREAMS, timeout=30, progress=None, compression=None,
+                       checksum=True, if_none_match=None):
+    """
+    Baixa um arquivo usando várias conexões paralelas
+
+    Args:
+        address (tuple): (host, porta) do servidor
+        filename (str): Nome do arquivo no servidor
+        save_path (str): Caminho local de destino
+        streams (int): Quantidade de fluxos (None escolhe pelo tamanho)
+        max_streams (int): Limite usado na escolha automática
+        timeout (float): Timeout de cada conexão
+        progress: Função chamada com (bytes baixados, total) na thread de quem
+            chamou; se ela levantar uma exceção, o download para (e pode ser
+            retomado depois)
+        compression (list): Codecs aceitos, em ordem de preferência
+        checksum (bool): Confere os blocos com os resumos do servidor
+        if_none_match (list): Marcas de uma cópia local; se o servidor
+            responder que ela continua atual, nada é baixado
+
+    Returns:
+        dict: filename, filesize, streams, resumed_from, validator, compression,
+        checksum (None se o servidor não informou todos os blocos) e blocks
+        (resumos de todos os blocos, se todos foram conferidos nesta sessão);
+        `not_modified` True se a cópia local continua atual
+    """
+    part_path = Path(f"{save_path}.part")
+    info_path = Path(f"{save_path}.part.json")
+
+    # Descobre tamanho e versão atual do arquivo com um intervalo vazio
+    conn = open_connection(address, timeout)
+    try:
+        probe = request_range(conn, filename, 0, 0, None, compression=compression,
+                              checksum=checksum, if_none_match=if_none_match)
+        if probe.get('status') != 'not_modified':
+            conn.discard_data()
+    finally:
+        conn.close()
+    filesize = probe['filesize']
+    validator = probe['validator']
+    if probe.get('status') == 'not_modified':
+        return {
+            'filename': filename,
+            'filesize': filesize,
+            'streams': 0,
+            'resumed_from': 0,
+            'validator': validator,
+            'compression': None,
+            'checksum': probe.get('checksum'),
+            'blocks': None,
+            'not_modified': True
+        }
+
+    state = load_state(info_path, part_path)
+    if state and state.get('validator') == validator and state.get('filesize') == filesize:
+        segments = state['segments']
+    else:
+        if streams is None:
+            streams = choose_stream_count(filesize, max_streams)
+        segments = plan_segments(filesize, streams, BLOCK_SIZE if checksum else 1)
+        part_path.unlink(missing_ok=True)
+    for segment in segments:
+        segment[3:] = [0]  # Recebidos e ainda não conferidos
+    resumed_from = sum(segment[2] for segment in segments)
+    blocks = {} if checksum else None  # Índice -> resumo conferido
+
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+    cancel = threading.Event()
+    errors = []
+    threads = []
+    try:
+        if os.fstat(fd).st_size != filesize:
+            preallocate(fd, filesize)
+        writer = PositionalWriter(fd)
+
+        def worker(segment):
+            try:
+                fetch_segment(address, filename, segment, validator, writer, timeout, cancel,
+                              compression, blocks)
+            except Exception as e:
+                errors.append(e)
+                cancel.set()
+
+        threads = [
+            threading.Thread(target=worker, args=(segment,), daemon=True)
+            for segment in segments if segment[2] < segment[1]
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Acompanha o progresso e salva o estado periodicamente
+        last_save = time.monotonic()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(PROGRESS_INTERVAL / max(len(threads), 1))
+            if time.monotonic() - last_save >= SAVE_INTERVAL:
+                save_state(info_path, validator, filesize, segments)
+                last_save = time.monotonic()
+            if progress:
+                progress(sum(segment[2] + segment[3] for segment in segments), filesize)
+    finally:
+        cancel.set()
+        # Espera os fluxos pararem antes de fechar o descritor que eles usam
+        for thread in threads:
+            thread.join()
+        os.close(fd)
+        save_state(info_path, validator, filesize, segments)
+
+    if errors:
+        raise errors[0]
+
+    os.replace(part_path, save_path)
+    info_path.unlink(missing_ok=True)
+    file_checksum = probe.get('checksum')
+    verified = None
+    if blocks is not None and len(blocks) == block_count(filesize):
+        # Todos os blocos foram conferidos nesta sessão
+        verified = [blocks[i] for i in range(len(blocks))]
+        file_checksum = tree_digest(verified)
+    return {
+        'filename': filename,
+        'filesize': filesize,
+        'streams': len(segments),
+        'resumed_from': resumed_from,
+        'validator': validator,
+        'compression': probe.get('compression'),
+        'checksum': file_checksum,
+        'blocks': verified
+    }
+
+
+def main():
+    """Download segmentado pela linha de comando"""
+    parser = argparse.ArgumentParser(description="Download segmentado em paralelo")
+    parser.add_argument('host')
+    parser.add_argument('port', type=int)
+    parser.add_argument('filename', help="Nome do arquivo no servidor")
+    parser.add_argument('destination', nargs='?', help="Caminho local (padrão: mesmo nome)")
+    parser.add_argument('--streams', type=int, default=None,
+                        help="Quantidade de conexões (padrão: pelo tamanho do arquivo)")
+    parser.add_argument('--max-streams', type=int, default=MAX_STREAMS,
+                        help="Limite da escolha automática de conexões")
+    parser.add_argument('--no-compression', action='store_true',
+                        help="Não pede compressão ao servidor")
+    parser.add_argument('--no-checksum', action='store_true',
+                        help="Não confere os blocos com os resumos do servidor")
+    args = parser.parse_args()
+
+    destination = args.destination or args.filename
+    last = [0.0]
+
+    def show_progress(done, total):
+        now = time.monotonic()
+        if now - last[0] >= 1:
+            last[0] = now
+            percent = 100 * done / total if total else 100
+            print(f"📥 {done}/{total} bytes ({percent:.1f}%)")
+
+    start = time.perf_counter()
+    result = download_segmented(
+        (args.host, args.port), args.filename, destination,
+        streams=args.streams, max_streams=args.max_streams, progress=show_progress,
+        compression=None if args.no_compression else available_codecs(),
+        checksum=not args.no_checksum
+    )
+    elapsed = time.perf_counter() - start
+    downloaded = result['filesize'] - result['resumed_from']
+    print(f"✅ {args.filename} salvo em {destination} "
+          f"({result['streams']} fluxos, {downloaded / max(elapsed, 1e-9) / 1e6:.1f} MB/s)")
+    if result['checksum']:
+        print(f"🔒 sha256 (blocos): {result['checksum']}")
+
+
+if __name__ == "__main__":
+    main()
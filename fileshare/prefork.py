@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - PRÉ-FORK
+Vários processos servidores atendendo a mesma porta
+
+Um processo Python só usa um núcleo por vez para compressão, checksums e
+JSON (o GIL). Aqui o processo mestre cria K processos de trabalho, cada um
+com o seu FileServer (threads ou asyncio, conforme --mode), e só cuida de
+supervisioná-los: um processo que morre é recriado.
+
+Onde o sistema distribui conexões entre sockets com SO_REUSEPORT (Linux),
+cada processo abre o seu socket de escuta na mesma porta e o kernel divide
+as conexões entre eles. Nos demais sistemas o mestre abre um único socket
+e os processos aceitam conexões dele.
+
+Os processos dividem a pasta compartilhada: a listagem percebe as mudanças
+feitas pelos outros pela data do diretório e o cache de checksums é um
+SQLite que aceita vários processos. Métricas são por processo (cada um na
+porta --metrics-port + número do processo).
+
+Uso:
+    python file_server.py --host 0.0.0.0 --port 8888 --processes 4 --mode async
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+
+from file_server import DEFAULT_BACKLOG, FileServer, create_server
+
+# Intervalo entre as verificações dos processos de trabalho (segundos)
+SUPERVISE_INTERVAL = 0.5
+
+# Reinícios tolerados dentro da janela antes de desistir (falha em laço)
+MAX_RESTARTS = 10
+RESTART_WINDOW = 60.0
+
+# Tempo dado aos processos para terminarem antes de serem mortos
+SHUTDOWN_TIMEOUT = 10.0
+
+
+def reuse_port_supported():
+    """Indica se o sistema distribui conexões entre sockets com SO_REUSEPORT"""
+    # No macOS e em BSDs antigos a opção existe, mas uma só escuta recebe tudo
+    return hasattr(socket, 'SO_REUSEPORT') and sys.platform.startswith('linux')
+
+
+def run_worker(index, args, host, port, workers, listen_socket, reuse_port):
+    """
+    Processo de trabalho: cria o servidor e atende até receber SIGTERM
+
+    Args:
+        index (int): Número do processo
+        args: Opções da linha de comando do servidor
+        host (str): Endereço de escuta
+        port (int): Porta
+        workers (int): Total de processos
+        listen_socket (socket.socket): Socket herdado do mestre (ou None)
+        reuse_port (bool): Abre o próprio socket com SO_REUSEPORT
+    """
+    # Ctrl+C chega a todo o grupo de processos: quem decide é o mestre
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # SIGTERM interrompe o accept como um Ctrl+C (parada ordenada)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    server = create_server(args, host, port, worker=index, workers=workers)
+    server.listen_socket = listen_socket
+    server.reuse_port = reuse_port
+    print(f"👷 Processo {index} iniciado (pid {os.getpid()})")
+    try:
+        server.start_server()
+    except KeyboardInterrupt:
+        server.stop_server()
+
+
+class PreforkServer:
+    def __init__(self, args, host, port, processes, reuse_port=None):
+        """
+        Processo mestre do modo pré-fork
+
+        Args:
+            args: Opções da linha de comando do servidor (ver file_server.parse_args)
+            host (str): Endereço de escuta
+            port (int): Porta (0 escolhe uma livre)
+            processes (int): Processos de trabalho
+            reuse_port (bool): Força (True) ou desativa (False) o SO_REUSEPORT;
+                None usa quando o sistema suporta
+        """
+        self.args = args
+        self.host = host
+        self.port = port
+        self.processes = processes
+        self.reuse_port = reuse_port_supported() if reuse_port is None else reuse_port
+        self.socket = None  # Socket de escuta compartilhado ou reserva da porta
+        self.workers = [None] * processes
+        self.restarts = deque()  # Momentos dos reinícios recentes
+        self.running = False
+
+    def open_socket(self):
+        """
+        Prepara a porta antes de criar os processos
+
+        Sem SO_REUSEPORT é o socket de escuta que todos dividem; com ele é
+        só uma reserva da porta (não escuta, então não recebe conexões),
+        útil quando a porta pedida é 0 e o sistema escolhe uma.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.host, self.port))
+        if not self.reuse_port:
+            sock.listen(getattr(self.args, 'backlog', DEFAULT_BACKLOG))
+        self.port = sock.getsockname()[1]
+        self.socket = sock
+
+    def spawn(self, index):
+        """Cria (ou recria) o processo de trabalho `index`"""
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(index, self.args, self.host, self.port, self.processes,
+                  None if self.reuse_port else self.socket, self.reuse_port),
+            name=f'fileshare-worker-{index}'
+        )
+        process.start()
+        self.workers[index] = process
+
+    def start(self):
+        """Abre a porta e cria os processos de trabalho"""
+        # Índice e manutenção conferidos uma vez, antes de os processos usarem a pasta
+        FileServer.prepare_folder(self.args.shared_folder, dedup=self.args.dedup)
+        self.open_socket()
+        self.running = True
+        way = "SO_REUSEPORT" if self.reuse_port else "socket compartilhado"
+        print(f"🧵 Pré-fork: {self.processes} processos em {self.host}:{self.port} ({way})")
+        for index in range(self.processes):
+            self.spawn(index)
+
+    def supervise(self):
+        """
+        Recria os processos que morrerem até o servidor ser parado
+
+        Raises:
+            RuntimeError: Se os processos estão morrendo em laço
+        """
+        while self.running:
+            time.sleep(SUPERVISE_INTERVAL)
+            for index, process in enumerate(self.workers):
+                if process.is_alive():
+                    continue
+                process.join()
+                now = time.monotonic()
+                while self.restarts and now - self.restarts[0] > RESTART_WINDOW:
+                    self.restarts.popleft()
+                if len(self.restarts) >= MAX_RESTARTS:
+                    raise RuntimeError(
+                        f"{MAX_RESTARTS} reinícios em {RESTART_WINDOW:.0f}s: desistindo")
+                self.restarts.append(now)
+                print(f"⚠️ Processo {index} (pid {process.pid}) terminou com código "
+                      f"{process.exitcode}: reiniciando")
+                self.spawn(index)
+
+    def stop(self):
+        """Pede a parada ordenada dos processos e espera por eles"""
+        self.running = False
+        print("\n🛑 Parando processos...")
+        alive = [process for process in self.workers if process and process.is_alive()]
+        for process in alive:
+            process.terminate()  # SIGTERM: o processo fecha as conexões e sai
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process in alive:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"⚠️ Processo {process.name} não parou a tempo: encerrando à força")
+                process.kill()
+                process.join()
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+        print("✅ Servidor parado")
+
+    def run(self):
+        """Inicia e supervisiona até Ctrl+C ou SIGTERM"""
+        previous = signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            self.start()
+            self.supervise()
+        except KeyboardInterrupt:
+            pass
+        except RuntimeError as e:
+            print(f"❌ {e}")
+        finally:
+            self.stop()
+            signal.signal(signal.SIGTERM, previous)
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - PROTOCOLO
+Protocolo binário com frames de tamanho prefixado usado por cliente e servidor
+
+Cada frame tem um cabeçalho fixo de 16 bytes seguido do corpo:
+
+    magic (2s) | tipo (B) | flags (B) | request_id (I) | tamanho (Q)
+
+Requisições e respostas levam JSON no corpo; o conteúdo dos arquivos vai em
+frames de dados binários, e o último frame de um fluxo leva a flag FLAG_END.
+"""
+
+import json
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+# Cabeçalho fixo: magic, tipo, flags, id da requisição e tamanho do corpo
+HEADER = struct.Struct('!2sBBIQ')
+HEADER_SIZE = HEADER.size
+MAGIC = b'FS'
+
+# Tipos de frame
+FRAME_REQUEST = 1   # Requisição do cliente (JSON)
+FRAME_RESPONSE = 2  # Resposta do servidor (JSON)
+FRAME_DATA = 3      # Bytes de arquivo
+
+# Id das mensagens do servidor que não respondem a uma requisição (ex.:
+# conexão recusada); os clientes nunca usam este id
+NOTICE_ID = 0
+
+# Flags
+FLAG_END = 0x01         # Último frame de um fluxo de dados
+FLAG_COMPRESSED = 0x02  # Corpo comprimido com o codec negociado na requisição
+
+# Limite para corpos lidos inteiros na memória (protege contra cabeçalhos
+# corrompidos ou maliciosos); corpos de dados longos são lidos em pedaços
+MAX_JSON_PAYLOAD = 256 * 1024 * 1024
+
+# Tamanho padrão do buffer de leitura
+BUFFER_SIZE = 256 * 1024
+
+# Corpos até este tamanho são juntados ao cabeçalho numa única escrita
+SMALL_FRAME = 64 * 1024
+
+# Com limite de banda, corpos são enviados em pedaços deste tamanho
+THROTTLE_STEP = 128 * 1024
+
+Frame = namedtuple('Frame', ['type', 'flags', 'request_id', 'payload'])
+
+
+class ProtocolError(Exception):
+    """Erro de protocolo (frame inválido ou fora de ordem)"""
+
+
+def encode_json(obj):
+    """Serializa um objeto em JSON UTF-8"""
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(payload):
+    """Desserializa um corpo JSON UTF-8"""
+    return json.loads(bytes(payload).decode('utf-8'))
+
+
+def parse_address(text, default_port=8888):
+    """
+    Lê um endereço 'host:porta'
+
+    Returns:
+        tuple: (host, porta)
+    """
+    host, _, port = text.rpartition(':')
+    if not host:
+        return text, default_port
+    return host.strip('[]'), int(port)
+
+
+class FrameConnection:
+    def __init__(self, sock, buffer_size=BUFFER_SIZE):
+        """
+        Envolve um socket conectado com leitura e escrita de frames
+
+        Args:
+            sock: Socket TCP conectado
+            buffer_size (int): Tamanho do buffer de leitura
+        """
+        self.sock = sock
+        self.send_lock = threading.RLock()  # Serializa escritas de várias threads
+        try:
+            # Frames já saem montados (ou juntados com `cork`): o algoritmo de
+            # Nagle só atrasaria o último pedaço de cada mensagem à espera do ACK
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, AttributeError):
+            pass  # Socket que não é TCP
+
+        # Buffer de leitura reaproveitado: [_start, _end) contém dados pendentes.
+        # É alocado sob demanda para que conexões ociosas custem pouca memória.
+        self._buffer_size = max(buffer_size, HEADER_SIZE)
+        self._buffer = None
+        self._view = None
+        self._start = 0
+        self._end = 0
+
+        # Estado do fluxo de dados em andamento (ver `discard_data`)
+        self._body_remaining = 0
+        self._data_open = False
+        self._data_flags = 0
+        self.data_streams = 0  # Fluxos de dados lidos até o fim
+
+        # Bytes transferidos, contados por frame (cabeçalho + corpo declarado)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+        # Frames pequenos acumulados para uma escrita só (ver `cork`)
+        self._corked = None
+
+        # Limite de banda (ver bandwidth.ConnectionThrottle); None = sem limite
+        self.throttle = None
+
+        # Início (monotonic) do recv em que a conexão está parada agora, ou
+        # None; conferido pelo servidor para abandonar leituras paradas
+        # (ver connections.ConnectionRegistry)
+        self.recv_started = None
+
+    # === LEITURA ===
+
+    def buffered(self):
+        """Retorna quantos bytes já recebidos ainda não foram consumidos"""
+        return self._end - self._start
+
+    def _ensure_buffer(self):
+        """Aloca o buffer de leitura se ele tiver sido liberado"""
+        if self._buffer is None:
+            self._buffer = bytearray(self._buffer_size)
+            self._view = memoryview(self._buffer)
+
+    def release_buffer(self):
+        """
+        Libera o buffer de leitura enquanto a conexão está ociosa
+
+        Returns:
+            bool: True se o buffer estava vazio e foi liberado
+        """
+        if self._start != self._end or self._body_remaining:
+            return False
+        self._buffer = None
+        self._view = None
+        self._start = self._end = 0
+        return True
+
+    def _recv_into(self, view):
+        """Recebe do socket no `view`, marcando o início da espera (recv_started)"""
+        self.recv_started = time.monotonic()
+        try:
+            return self.sock.recv_into(view)
+        finally:
+            self.recv_started = None
+
+    def recv_space(self):
+        """
+        Espaço livre no fim do buffer de leitura
+
+        Permite que a leitura do socket seja feita fora da conexão (pelo
+        event loop do servidor assíncrono); os bytes lidos são informados
+        com `recv_done`.
+
+        Returns:
+            memoryview: Espaço livre (vazio se o buffer está cheio)
+        """
+        self._ensure_buffer()
+        if self._end == len(self._buffer):
+            # Compacta o buffer movendo os dados pendentes para o início
+            pending = self._end - self._start
+            self._buffer[:pending] = self._view[self._start:self._end]
+            self._start = 0
+            self._end = pending
+        return self._view[self._end:]
+
+    def recv_done(self, n):
+        """Registra `n` bytes lidos para o espaço dado por `recv_space`"""
+        self._end += n
+        if n and self.throttle:
+            self.throttle.receiving(n)
+
+    def _recv_more(self):
+        """
+        Lê mais dados do socket para o final do buffer
+
+        Returns:
+            int: Bytes lidos (0 se a conexão foi fechada)
+        """
+        n = self._recv_into(self.recv_space())
+        self.recv_done(n)
+        return n
+
+    def _fill(self, size):
+        """
+        Garante que pelo menos `size` bytes estejam no buffer
+
+        Returns:
+            bool: False se a conexão foi fechada antes de qualquer byte
+        """
+        self._ensure_buffer()
+        if len(self._buffer) - self._start < size:
+            # Não cabe a partir da posição atual: compacta
+            pending = self._end - self._start
+            self._buffer[:pending] = self._view[self._start:self._end]
+            self._start = 0
+            self._end = pending
+        while self._end - self._start < size:
+            if not self._recv_more():
+                if self._end == self._start:
+                    return False
+                raise ConnectionError('Conexão fechada no meio de um frame')
+        return True
+
+    def recv_header(self):
+        """
+        Lê o cabeçalho do próximo frame
+
+        Returns:
+            tuple: (tipo, flags, request_id, tamanho) ou None se a conexão fechou
+        """
+        if not self._fill(HEADER_SIZE):
+            return None
+        magic, frame_type, flags, request_id, length = HEADER.unpack_from(
+            self._buffer, self._start)
+        if magic != MAGIC:
+            raise ProtocolError('Cabeçalho de frame inválido')
+        self._start += HEADER_SIZE
+        self.bytes_received += HEADER_SIZE + length
+        return frame_type, flags, request_id, length
+
+    def check_header(self, header, expected_type=None, max_length=MAX_JSON_PAYLOAD):
+        """
+        Confere o tipo e o tamanho de um frame antes de o corpo ser lido
+
+        Args:
+            header (tuple): (tipo, flags, request_id, tamanho)
+            expected_type (int): Tipo esperado (None aceita qualquer um)
+            max_length (int): Maior corpo aceito
+
+        Raises:
+            ProtocolError: Se o frame não for o esperado ou for grande demais
+        """
+        frame_type, _, _, length = header
+        if expected_type is not None and frame_type != expected_type:
+            raise ProtocolError(f'Frame inesperado: tipo {frame_type}')
+        if length > max_length:
+            raise ProtocolError(f'Frame muito grande: {length} bytes')
+
+    def peek_header(self, expected_type=None, max_length=MAX_JSON_PAYLOAD):
+        """
+        Confere o cabeçalho já no buffer sem consumi-lo (ver check_header)
+
+        Returns:
+            tuple: (tipo, flags, request_id, tamanho) ou None se o cabeçalho
+            ainda não chegou inteiro
+        """
+        if self._end - self._start < HEADER_SIZE:
+            return None
+        magic, frame_type, flags, request_id, length = HEADER.unpack_from(
+            self._buffer, self._start)
+        if magic != MAGIC:
+            raise ProtocolError('Cabeçalho de frame inválido')
+        header = (frame_type, flags, request_id, length)
+        self.check_header(header, expected_type, max_length)
+        return header
+
+    def recv_payload(self, length):
+        """
+        Lê um corpo inteiro de `length` bytes em uma única passada
+
+        Corpos maiores que o buffer são recebidos direto no destino final,
+        sem concatenar pedaços intermediários.
+
+        Args:
+            length (int): Tamanho do corpo
+
+        Returns:
+            bytearray: Corpo do frame
+        """
+        available = self._end - self._start
+        if length <= available:
+            payload = bytearray(self._view[self._start:self._start + length])
+            self._start += length
+            return payload
+
+        payload = bytearray(length)
+        out = memoryview(payload)
+        if available:
+            out[:available] = self._view[self._start:self._end]
+        self._start = self._end = 0
+        received = available
+        while received < length:
+            n = self._recv_into(out[received:])
+            if not n:
+                raise ConnectionError('Conexão fechada no meio de um frame')
+            received += n
+            if self.throttle:
+                self.throttle.receiving(n)
+        return payload
+
+    def iter_body(self, length):
+        """
+        Percorre um corpo em pedaços, sem montar tudo na memória
+
+        Cada memoryview só é válida até o próximo pedaço ser pedido.
+
+        Args:
+            length (int): Tamanho do corpo
+
+        Yields:
+            memoryview: Pedaço do corpo
+        """
+        self._body_remaining = length
+        return self._iter_remaining_body()
+
+    def _iter_remaining_body(self):
+        """Entrega o que falta do corpo atual (ver `iter_body`)"""
+        available = self._end - self._start
+        if available and self._body_remaining:
+            take = min(available, self._body_remaining)
+            chunk = self._view[self._start:self._start + take]
+            self._start += take
+            self._body_remaining -= take
+            yield chunk
+
+        if self._body_remaining:
+            self._ensure_buffer()
+        while self._body_remaining:
+            # Buffer vazio: recebe direto nele e entrega a fatia
+            self._start = self._end = 0
+            n = self._recv_into(self._view[:min(self._body_remaining, len(self._buffer))])
+            if not n:
+                raise ConnectionError('Conexão fechada no meio de um frame')
+            self._body_remaining -= n
+            if self.throttle:
+                self.throttle.receiving(n)
+            yield self._view[:n]
+
+    def recv_frame(self, expected_type=None, max_length=MAX_JSON_PAYLOAD):
+        """
+        Lê um frame completo
+
+        Tipo e tamanho são conferidos pelo cabeçalho, antes de o corpo ser
+        lido: um frame recusado não ocupa memória. Corpos de dados longos
+        devem ser lidos com `iter_data`.
+
+        Args:
+            expected_type (int): Tipo esperado (None aceita qualquer um)
+            max_length (int): Maior corpo aceito
+
+        Returns:
+            Frame: Frame recebido ou None se a conexão foi fechada
+
+        Raises:
+            ProtocolError: Se o frame não for o esperado ou for grande demais
+        """
+        header = self.recv_header()
+        if header is None:
+            return None
+        self.check_header(header, expected_type, max_length)
+        frame_type, flags, request_id, length = header
+        return Frame(frame_type, flags, request_id, self.recv_payload(length))
+
+    def recv_message(self, expected_type, max_length=MAX_JSON_PAYLOAD):
+        """
+        Lê um frame JSON do tipo esperado
+
+        Returns:
+            tuple: (request_id, objeto) ou None se a conexão foi fechada
+        """
+        frame = self.recv_frame(expected_type, max_length)
+        if frame is None:
+            return None
+        return frame.request_id, decode_json(frame.payload)
+
+    def iter_data(self, whole_frames=False, max_length=MAX_JSON_PAYLOAD):
+        """
+        Percorre um fluxo de frames de dados até a flag FLAG_END
+
+        Args:
+            whole_frames (bool): Entrega cada frame inteiro (em vez de pedaços
+                do buffer), como precisam os frames comprimidos
+            max_length (int): Maior frame entregue inteiro
+
+        Yields:
+            tuple: (flags, memoryview ou bytearray) para cada pedaço recebido
+        """
+        self._data_open = True
+        self._data_flags = 0
+        while True:
+            header = self.recv_header()
+            if header is None:
+                raise ConnectionError('Conexão fechada no meio de um fluxo de dados')
+            frame_type, flags, _, length = header
+            if frame_type != FRAME_DATA:
+                raise ProtocolError(f'Esperava frame de dados, recebeu tipo {frame_type}')
+            self._data_flags = flags
+            if whole_frames:
+                self.check_header(header, FRAME_DATA, max_length)
+                yield flags, self.recv_payload(length)
+            else:
+                for chunk in self.iter_body(length):
+                    yield flags, chunk
+            if flags & FLAG_END:
+                self._data_open = False
+                self.data_streams += 1
+                return
+
+    def discard_data(self, streams_before=None):
+        """
+        Descarta o restante de um fluxo de dados (mantém o protocolo sincronizado)
+
+        Funciona tanto antes de o fluxo começar quanto no meio dele, quando
+        quem estava lendo desistiu por um erro local (disco cheio, etc.).
+
+        Args:
+            streams_before (int): Valor de `data_streams` antes da leitura;
+                se o fluxo já foi lido até o fim, não há nada a descartar
+        """
+        if streams_before is not None and self.data_streams != streams_before:
+            return
+        if self._data_open:
+            for _ in self._iter_remaining_body():
+                pass
+            if self._data_flags & FLAG_END:
+                self._data_open = False
+                self.data_streams += 1
+                return
+            self._data_open = False
+            while True:
+                header = self.recv_header()
+                if header is None:
+                    raise ConnectionError('Conexão fechada no meio de um fluxo de dados')
+                frame_type, flags, _, length = header
+                if frame_type != FRAME_DATA:
+                    raise ProtocolError(f'Esperava frame de dados, recebeu tipo {frame_type}')
+                for _ in self.iter_body(length):
+                    pass
+                if flags & FLAG_END:
+                    self.data_streams += 1
+                    return
+        for _ in self.iter_data():
+            pass
+
+    def has_buffered_frame(self):
+        """Indica se já existe um frame completo no buffer de leitura"""
+        available = self._end - self._start
+        if available < HEADER_SIZE:
+            return False
+        length = HEADER.unpack_from(self._buffer, self._start)[4]
+        return available >= HEADER_SIZE + length
+
+    # === ESCRITA ===
+
+    def cork(self):
+        """
+        Passa a acumular frames pequenos em vez de enviá-los na hora
+
+        Usado quando várias respostas vão sair em seguida (requisições em
+        pipeline): elas vão juntas numa escrita só em `uncork`, ou antes se
+        um frame grande ou um corpo enviado por partes precisar sair.
+        """
+        with self.send_lock:
+            if self._corked is None:
+                self._corked = bytearray()
+
+    def uncork(self):
+        """Envia o que foi acumulado e volta a enviar cada frame na hora"""
+        with self.send_lock:
+            self._flush()
+            self._corked = None
+
+    def _flush(self):
+        """Envia os frames acumulados (chamado com `send_lock`)"""
+        if self._corked:
+            data = bytes(self._corked)
+            self._corked.clear()
+            self._send(data)
+
+    def _send(self, data):
+        """Escreve no socket respeitando o limite de banda, se houver"""
+        if self.throttle is None:
+            self.sock.sendall(data)
+            return
+        view = memoryview(data)
+        for start in range(0, len(view), THROTTLE_STEP):
+            part = view[start:start + THROTTLE_STEP]
+            self.throttle.sending(len(part))
+            self.sock.sendall(part)
+
+    def sendall(self, data):
+        """Envia bytes crus (use dentro de `send_lock` para não intercalar frames)"""
+        self._flush()
+        self._send(data)
+
+    def send_header(self, frame_type, request_id, length, flags=0):
+        """Envia só o cabeçalho de um frame; o corpo vem em seguida via sendall"""
+        self._flush()
+        self._send(HEADER.pack(MAGIC, frame_type, flags, request_id, length))
+        self.bytes_sent += HEADER_SIZE + length
+
+    def send_frame(self, frame_type, request_id, payload=b'', flags=0):
+        """
+        Envia um frame completo
+
+        Args:
+            frame_type (int): Tipo do frame
+            request_id (int): Id da requisição
+            payload (bytes): Corpo do frame
+            flags (int): Flags do frame
+        """
+        header = HEADER.pack(MAGIC, frame_type, flags, request_id, len(payload))
+        with self.send_lock:
+            if self._corked is not None and len(payload) <= SMALL_FRAME:
+                self._corked += header
+                self._corked += payload
+                if len(self._corked) >= BUFFER_SIZE:
+                    self._flush()
+            elif len(payload) <= SMALL_FRAME:
+                self._flush()
+                self._send(header + bytes(payload))
+            else:
+                self._flush()
+                self._send(header)
+                self._send(payload)
+            self.bytes_sent += HEADER_SIZE + len(payload)
+
+    def send_json(self, frame_type, request_id, obj):
+        """Envia um frame com corpo JSON"""
+        self.send_frame(frame_type, request_id, encode_json(obj))
+
+    def send_json_batch(self, frame_type, messages):
+        """
+        Envia vários frames JSON numa única escrita
+
+        Args:
+            frame_type (int): Tipo dos frames
+            messages: Pares (request_id, objeto)
+        """
+        with self.send_lock:
+            corked = self._corked is not None
+            self.cork()
+            try:
+                for request_id, obj in messages:
+                    self.send_frame(frame_type, request_id, encode_json(obj))
+            finally:
+                if corked:
+                    self._flush()
+                else:
+                    self.uncork()
+
+    def send_data(self, request_id, chunk, end=False, flags=0):
+        """Envia um pedaço de um fluxo de dados"""
+        if end:
+            flags |= FLAG_END
+        self.send_frame(FRAME_DATA, request_id, chunk, flags)
+
+    def close(self):
+        """Fecha o socket"""
+        try:
+            self.sock.close()
+        except OSError:
+            pass
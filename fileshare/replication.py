@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - REPLICAÇÃO
+Réplicas somente leitura de um servidor principal
+
+O log de mudanças replicado é o mesmo da ação `subscribe` (ver watcher.py):
+eventos numerados dentro de um `epoch`, com os últimos guardados no
+principal. A réplica assina esses eventos informando o próprio endereço
+(`replica`), que o principal anuncia aos clientes em server_info enquanto a
+assinatura estiver aberta, e aplica as mudanças numa thread própria, fora
+da thread que recebe os eventos:
+
+- added/modified: baixa o arquivo do principal (download segmentado com
+  checksum) para a pasta de uploads e publica com a mesma data de
+  modificação, então o validador é o mesmo nos dois servidores;
+- deleted: remove o arquivo.
+
+Arquivos que já estão iguais (tamanho e data) não são baixados de novo, o
+que torna a aplicação de um evento repetida sem custo. O último evento
+aplicado fica em `.fileshare/replica.json`: uma réplica reiniciada pede só
+o que perdeu; se o principal não tiver mais esses eventos (ou reiniciou),
+a réplica compara a listagem inteira e baixa ou remove só as diferenças.
+
+Os clientes escrevem sempre no principal: a réplica recusa envios e
+remoções (código 'read_only', com o endereço do principal). As leituras
+podem ir para qualquer réplica (ver FileShareClient, `replicas`); logo
+depois de uma escrita, uma réplica pode ainda mostrar a versão anterior.
+
+Uso (duas instâncias na mesma máquina):
+    python file_server.py --host 127.0.0.1 --port 8888
+    python file_server.py --host 127.0.0.1 --port 8889 --replicate-from 127.0.0.1:8888
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from client_api import FileShareClient, Subscription, ClientError
+from download_cache import server_key
+from durability import publish
+from parallel_download import download_segmented, DownloadError
+
+# Espera antes de uma nova comparação completa depois de uma falha (segundos)
+RETRY_DELAY = 5.0
+
+# Diferença de data de modificação aceita como "mesma versão" (segundos)
+MTIME_EPSILON = 1e-6
+
+# Endereços de escuta que não servem para os clientes (o principal usa o
+# IP de onde a réplica se conectou)
+WILDCARD_HOSTS = ('', '0.0.0.0', '::')
+
+
+class ReplicationStopped(Exception):
+    """A réplica foi parada no meio de uma cópia"""
+
+
+def advertised_address(replica, peer):
+    """
+    Endereço que o principal anuncia para uma réplica
+
+    Args:
+        replica (dict): host e port informados pela réplica
+        peer (tuple): Endereço de onde a réplica se conectou
+
+    Returns:
+        str: 'host:porta'
+    """
+    host = replica.get('host')
+    if host in WILDCARD_HOSTS or host is None:
+        host = peer[0]
+    return server_key((host, int(replica['port'])))
+
+
+class Replicator:
+    def __init__(self, server, leader, timeout=30):
+        """
+        Mantém a pasta de um servidor igual à do principal
+
+        Args:
+            server (FileServer): Servidor réplica (somente leitura)
+            leader (tuple): (host, porta) do principal
+            timeout (float): Timeout das conexões com o principal
+        """
+        self.server = server
+        self.leader = leader
+        self.timeout = timeout
+        self.state_path = server.meta_folder / "replica.json"
+        self.client = FileShareClient(leader, log=print, timeout=timeout)
+        self.subscription = None
+        self.queue = queue.Queue()  # Trabalho na ordem em que chegou
+        self.thread = None
+        self.running = False
+        self.epoch = None  # Sequência de eventos do principal
+        self.seq = None  # Último evento aplicado
+        self.received_seq = 0  # Último evento recebido
+        self.failed = False  # Alguma mudança não foi aplicada: falta comparar tudo
+        self.retry_at = None  # Próxima comparação completa depois de uma falha
+        self.fetched = 0  # Arquivos baixados do principal
+        self.removed = 0  # Arquivos removidos
+
+    # === ESTADO ===
+
+    def load_state(self):
+        """
+        Último evento aplicado numa execução anterior
+
+        Returns:
+            tuple: (epoch, seq) ou None se não há estado deste principal
+        """
+        try:
+            state = json.loads(self.state_path.read_text(encoding='utf-8'))
+            if state.get('leader') == server_key(self.leader):
+                return state['epoch'], state['seq']
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def save_state(self):
+        """Grava o último evento aplicado (ou apaga o estado, se há falhas pendentes)"""
+        if self.failed or self.seq is None:
+            # Uma réplica reiniciada agora precisa comparar tudo
+            self.state_path.unlink(missing_ok=True)
+            return
+        temp = self.state_path.with_name(self.state_path.name + ".tmp")
+        temp.write_text(json.dumps({
+            'leader': server_key(self.leader),
+            'epoch': self.epoch,
+            'seq': self.seq
+        }), encoding='utf-8')
+        publish(temp, self.state_path)
+
+    def lag(self):
+        """Eventos recebidos do principal e ainda não aplicados"""
+        return max(0, self.received_seq - (self.seq or 0))
+
+    # === CICLO DE VIDA ===
+
+    def start(self):
+        """Começa a acompanhar o principal"""
+        state = self.load_state()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='fileshare-replica', daemon=True)
+        self.thread.start()
+        self.subscription = Subscription(
+            self.leader, self.received, self.resync_needed, log=print, timeout=self.timeout,
+            options={'replica': {'host': self.server.host, 'port': self.server.port}},
+            resume=state or (None, 0)
+        )
+        self.subscription.start()
+        print(f"🔁 Réplica de {server_key(self.leader)}"
+              + (f" (retomando do evento {state[1]})" if state else ""))
+
+    def stop(self):
+        """Para de acompanhar o principal"""
+        self.running = False
+        if self.subscription:
+            self.subscription.close()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.client.close()
+
+    def received(self, events):
+        """Eventos do principal (chamado na thread da assinatura)"""
+        if events:
+            self.received_seq = max(self.received_seq, events[-1]['seq'])
+        self.queue.put(('events', self.subscription.epoch, events))
+
+    def resync_needed(self):
+        """O principal não tem mais os eventos perdidos (thread da assinatura)"""
+        self.queue.put(('resync', self.subscription.epoch, self.subscription.seq))
+
+    def run(self):
+        """Laço da thread: aplica o trabalho na ordem em que chegou"""
+        while self.running:
+            if self.retry_at is not None and time.monotonic() >= self.retry_at:
+                # Entra na fila depois dos eventos já recebidos
+                self.retry_at = None
+                self.resync_needed()
+            try:
+                kind, epoch, payload = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                if kind == 'resync':
+                    self.reconcile()
+                    self.failed = False
+                    self.epoch, self.seq = epoch, payload
+                else:
+                    for event in payload:
+                        self.apply(event)
+                    if payload:
+                        self.epoch, self.seq = epoch, payload[-1]['seq']
+            except ReplicationStopped:
+                return
+            except (OSError, ClientError) as e:
+                # Principal fora do ar ou conexão caiu: compara tudo mais tarde
+                print(f"⚠️ Réplica: falha ao aplicar mudanças ({e}), nova tentativa "
+                      f"em {RETRY_DELAY:.0f}s")
+                self.failed = True
+                self.retry_at = time.monotonic() + RETRY_DELAY
+            try:
+                self.save_state()
+            except OSError as e:
+                print(f"⚠️ Réplica: estado não gravado: {e}")
+
+    # === APLICAÇÃO ===
+
+    def current(self, name):
+        """
+        Versão local de um arquivo
+
+        Returns:
+            tuple: (tamanho, mtime) ou None se ele não existe
+        """
+        try:
+            stat = (self.server.shared_folder / name).stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def same_version(self, local, size, mtime):
+        """Indica se a cópia local é a versão descrita pelo principal"""
+        return (local is not None and local[0] == size
+                and abs(local[1] - mtime) < MTIME_EPSILON)
+
+    def apply(self, event):
+        """
+        Aplica um evento do principal
+
+        Args:
+            event (dict): Evento (ver FileServer.subscribe)
+        """
+        name = event['name']
+        if event['event'] == 'deleted':
+            if self.current(name) is not None:
+                self.remove(name)
+        elif not self.same_version(self.current(name), event['size'], event['mtime']):
+            self.fetch(name)
+
+    def reconcile(self):
+        """Compara a listagem inteira do principal e aplica só as diferenças"""
+        local = self.server.listing.scan()
+        remote = {info['name']: info for info in self.client.list_files()}
+        fetched = removed = 0
+        for name, info in remote.items():
+            if not self.same_version(local.get(name), info['size'], info['mtime']):
+                if self.fetch(name):
+                    fetched += 1
+        for name in local.keys() - remote.keys():
+            self.remove(name)
+            removed += 1
+        print(f"🔁 Réplica sincronizada com {server_key(self.leader)}: {len(remote)} "
+              f"arquivo(s), {fetched} baixado(s), {removed} removido(s)")
+
+    def fetch(self, name):
+        """
+        Baixa a versão atual de um arquivo do principal e a publica
+
+        Returns:
+            bool: False se o arquivo sumiu ou mudou de novo no principal (um
+            evento seguinte traz a nova versão)
+        """
+        temp = self.server.uploads_folder / f"{name}.replica"
+        try:
+            result = download_segmented(self.leader, name, temp, timeout=self.timeout,
+                                        progress=self.check_running)
+        except DownloadError as e:
+            print(f"⚠️ Réplica: {name} não copiado: {e}")
+            return False
+        # O validador é "tamanho:mtime_ns" (ver file_validator): a cópia fica
+        # com a mesma data, então os dois servidores têm o mesmo validador
+        mtime_ns = int(result['validator'].split(':')[1])
+        try:
+            os.utime(temp, ns=(mtime_ns, mtime_ns))
+            publish(temp, self.server.shared_folder / name, self.server.fsync_policy)
+        except OSError:
+            temp.unlink(missing_ok=True)
+            raise
+        stat = self.server.file_changed(name, result['checksum'])
+        if stat and result.get('blocks'):
+            # Downloads da réplica já encontram os resumos prontos
+            self.server.hashes.store(stat, 0, result['blocks'])
+        self.fetched += 1
+        print(f"🔁 Réplica: {name} copiado ({result['filesize']} bytes)")
+        return True
+
+    def check_running(self, done, total):
+        """Interrompe uma cópia em andamento quando a réplica é parada"""
+        if not self.running:
+            raise ReplicationStopped()
+
+    def remove(self, name):
+        """Remove um arquivo que não existe mais no principal"""
+        response = self.server.delete_file({'filename': name})
+        if response.get('status') == 'success':
+            self.removed += 1
@@ -0,0 +1,54 @@
+"""
+Configuração dos testes do fileshare
+
+Os módulos ficam soltos na pasta do aplicativo e se importam pelo nome
+(como quando rodados com `python file_server.py`): a pasta entra no path.
+"""
+
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from file_server import FileServer  # noqa: E402
+from async_server import AsyncFileServer  # noqa: E402
+
+
+def wait_listening(server, timeout=5.0):
+    """Espera o servidor aceitar conexões"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if server.running and server.port:
+            try:
+                socket.create_connection(('127.0.0.1', server.port), timeout=1).close()
+                return
+            except OSError:
+                pass
+        if time.monotonic() > deadline:
+            raise TimeoutError('Servidor não começou a escutar')
+        time.sleep(0.02)
+
+
+@pytest.fixture(params=['thread', 'async'])
+def server(request, tmp_path):
+    """Servidor (threads ou asyncio) numa porta livre, com pasta temporária"""
+    cls = AsyncFileServer if request.param == 'async' else FileServer
+    srv = cls('127.0.0.1', 0, shared_folder=tmp_path / 'shared')
+    srv.drain_timeout = 1
+    thread = threading.Thread(target=srv.start_server, daemon=True)
+    thread.start()
+    wait_listening(srv)
+    yield srv
+    srv.stop_server()
+    thread.join(5)
+
+
+@pytest.fixture
+def address(server):
+    """(host, porta) do servidor de teste"""
+    return ('127.0.0.1', server.port)
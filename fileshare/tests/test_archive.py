@@ -0,0 +1,108 @@
+"""Lotes de arquivos: separação do fluxo e limites de nomes e frames"""
+
+import socket
+import threading
+
+import pytest
+
+from archive import (ArchiveError, ArchiveParser, FolderSink, ENTRY_HEADER, receive_archive,
+                     send_archive, valid_name)
+from compression import CHUNK_SIZE
+from protocol import FrameConnection, ProtocolError, HEADER, MAGIC, FRAME_DATA, FLAG_END
+
+
+def entry(name, content, mtime=1700000000.0):
+    """Um arquivo do lote: cabeçalho, nome e conteúdo"""
+    encoded = name.encode('utf-8')
+    return ENTRY_HEADER.pack(len(encoded), len(content), mtime) + encoded + content
+
+
+def parse(stream, piece_size):
+    """Alimenta o parser em pedaços e devolve os eventos"""
+    parser = ArchiveParser()
+    events = []
+    for start in range(0, len(stream), piece_size):
+        events.extend(parser.feed(stream[start:start + piece_size]))
+    parser.finish()
+    return events
+
+
+@pytest.mark.parametrize('piece_size', [1, 7, 1 << 20])
+def test_parser_splits_entries_across_pieces(piece_size):
+    stream = entry('a.txt', b'conteudo') + entry('vazio', b'') + entry('b.bin', b'x' * 5000)
+    events = parse(stream, piece_size)
+
+    begins = [event[1:] for event in events if event[0] == 'begin']
+    assert begins == [('a.txt', 8, 1700000000.0), ('vazio', 0, 1700000000.0),
+                      ('b.bin', 5000, 1700000000.0)]
+    assert sum(1 for event in events if event[0] == 'end') == 3
+    assert b''.join(event[1] for event in events if event[0] == 'data') == b'conteudo' + b'x' * 5000
+
+
+@pytest.mark.parametrize('cut', [3, ENTRY_HEADER.size + 2, ENTRY_HEADER.size + 5 + 4])
+def test_parser_rejects_truncated_stream(cut):
+    stream = entry('a.txt', b'conteudo')[:cut]
+    with pytest.raises(ArchiveError):
+        parse(stream, 1 << 20)
+
+
+def test_parser_rejects_undecodable_name():
+    stream = ENTRY_HEADER.pack(2, 0, 0.0) + b'\xff\xfe'
+    with pytest.raises(ArchiveError):
+        list(ArchiveParser().feed(stream))
+
+
+@pytest.mark.parametrize('mtime', [float('nan'), float('inf'), float('-inf')])
+def test_parser_rejects_non_finite_mtime(mtime):
+    with pytest.raises(ArchiveError):
+        list(ArchiveParser().feed(entry('a.txt', b'x', mtime)))
+
+
+@pytest.mark.parametrize('name', ['', '.', '..', '.fileshare', '../fora', 'pasta/a',
+                                  'pasta\\a', 'a\0b'])
+def test_folder_sink_rejects_unsafe_names(name, tmp_path):
+    assert not valid_name(name)
+    with pytest.raises(ArchiveError):
+        FolderSink(tmp_path).begin(name, 0, 0.0)
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.fixture
+def pair():
+    """Duas pontas de uma conexão local"""
+    a, b = socket.socketpair()
+    a.settimeout(5)
+    b.settimeout(5)
+    yield FrameConnection(a), FrameConnection(b)
+    a.close()
+    b.close()
+
+
+def test_archive_round_trip(pair, tmp_path):
+    left, right = pair
+    source = tmp_path / 'origem'
+    source.mkdir()
+    files = {f'arquivo{i}.txt': bytes([i]) * (i * 1000) for i in range(20)}
+    for name, content in files.items():
+        (source / name).write_bytes(content)
+
+    sender = threading.Thread(target=send_archive, args=(
+        left, 1, [(name, source / name) for name in files], 'zlib'))
+    sender.start()
+    dest = tmp_path / 'destino'
+    dest.mkdir()
+    sink = FolderSink(dest)
+    receive_archive(right, sink, 'zlib')
+    sender.join()
+
+    assert sink.count == len(files)
+    assert {path.name: path.read_bytes() for path in dest.iterdir()} == files
+
+
+def test_compressed_archive_frame_bounded_by_chunk_size(pair, tmp_path):
+    left, right = pair
+    # Frame inteiro maior que CHUNK_SIZE: recusado pelo cabeçalho, sem o corpo
+    left.sock.sendall(HEADER.pack(MAGIC, FRAME_DATA, FLAG_END, 1, CHUNK_SIZE + 1))
+    with pytest.raises(ProtocolError):
+        receive_archive(right, FolderSink(tmp_path), 'zlib')
+    assert not any(tmp_path.iterdir())
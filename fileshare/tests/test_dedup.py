@@ -0,0 +1,80 @@
+"""Envio incremental: só os pedaços que o servidor não tem"""
+
+import random
+import time
+
+import pytest
+
+from chunk_store import file_recipe
+from client_api import FileShareClient
+
+
+@pytest.fixture
+def content():
+    # Semente fixa: os pedaços (e os bytes reenviados) são sempre os mesmos
+    return random.Random(6).randbytes(1024 * 1024)
+
+
+def wait_recipe(server, filename, timeout=10.0):
+    """Espera a thread de divisão gravar a receita de um arquivo"""
+    deadline = time.monotonic() + timeout
+    while server.chunk_store.load_recipe(filename) is None:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'Receita de {filename} não ficou pronta')
+        time.sleep(0.05)
+
+
+def test_dedup_round_trip(server, address, content, tmp_path):
+    server.enable_dedup()
+    local = tmp_path / 'data.bin'
+    local.write_bytes(content)
+
+    with FileShareClient(address, timeout=5) as client:
+        first = client.upload(local, dedup=True)
+        assert first['status'] == 'success'
+        assert first['bytes_received'] == len(content)
+
+        # Alguns bytes inseridos no meio: só os pedaços vizinhos mudam
+        changed = content[:500000] + b'novo' * 25 + content[500000:]
+        local.write_bytes(changed)
+        second = client.upload(local, dedup=True)
+
+    assert second['status'] == 'success'
+    assert 0 < second['bytes_received'] < len(changed) // 4
+    assert (server.shared_folder / 'data.bin').read_bytes() == changed
+
+
+def test_dedup_check_does_not_wait_for_indexing(server, address, content):
+    server.enable_dedup()
+    path = server.shared_folder / 'data.bin'
+    path.write_bytes(content)
+    chunks = [[digest, size] for digest, size, _ in file_recipe(path)]
+    request = {'action': 'dedup_check', 'filename': 'data.bin', 'chunks': chunks}
+
+    with FileShareClient(address, timeout=5) as client:
+        # Sem receita ainda: a resposta só considera os pedaços guardados
+        response = client.call(request)
+        assert response['status'] == 'success'
+        assert response['total'] == len(chunks)
+        assert response['missing']
+
+        wait_recipe(server, 'data.bin')
+        assert client.call(request)['missing'] == []
+
+
+def test_dedup_skips_files_over_the_limit(server, address, content, tmp_path):
+    server.enable_dedup(max_file_size=1000)
+    local = tmp_path / 'data.bin'
+    local.write_bytes(content)
+
+    messages = []
+    with FileShareClient(address, log=messages.append, timeout=5) as client:
+        assert client.server_dedup_max_size == 1000
+        response = client.upload(local, dedup=True)
+        chunks = [[digest, size] for digest, size, _ in file_recipe(local)]
+        refused = client.call({'action': 'dedup_check', 'filename': 'x.bin', 'chunks': chunks})
+
+    assert response['status'] == 'success'
+    assert any('indisponível' in message for message in messages)
+    assert (server.shared_folder / 'data.bin').read_bytes() == content
+    assert refused['status'] == 'error'
@@ -0,0 +1,105 @@
+"""Framing: limites conferidos pelo cabeçalho, antes de ler o corpo"""
+
+import socket
+import threading
+
+import pytest
+
+from compression import CHUNK_SIZE
+from protocol import (
+    FrameConnection, ProtocolError, HEADER, MAGIC, FRAME_REQUEST, FRAME_RESPONSE, FRAME_DATA,
+    FLAG_END, MAX_JSON_PAYLOAD, BUFFER_SIZE
+)
+
+
+@pytest.fixture
+def pair():
+    """Duas pontas de uma conexão local"""
+    a, b = socket.socketpair()
+    a.settimeout(5)
+    b.settimeout(5)
+    yield FrameConnection(a), FrameConnection(b)
+    a.close()
+    b.close()
+
+
+def send_header(conn, frame_type, length, flags=0, request_id=1):
+    """Envia só um cabeçalho, sem o corpo prometido"""
+    conn.sock.sendall(HEADER.pack(MAGIC, frame_type, flags, request_id, length))
+
+
+def test_message_round_trip(pair):
+    left, right = pair
+    left.send_json(FRAME_REQUEST, 7, {'action': 'list_files'})
+    assert right.recv_message(FRAME_REQUEST) == (7, {'action': 'list_files'})
+
+
+def test_unexpected_frame_rejected_before_body(pair):
+    left, right = pair
+    # Um corpo de 2^62 bytes nunca é alocado: o tipo é recusado antes
+    send_header(left, FRAME_DATA, 2 ** 62)
+    with pytest.raises(ProtocolError, match='inesperado'):
+        right.recv_frame(FRAME_REQUEST)
+
+
+def test_oversized_frame_rejected_before_body(pair):
+    left, right = pair
+    send_header(left, FRAME_REQUEST, MAX_JSON_PAYLOAD + 1)
+    with pytest.raises(ProtocolError, match='muito grande'):
+        right.recv_message(FRAME_REQUEST)
+
+
+def test_recv_frame_limits_data_frames_too(pair):
+    left, right = pair
+    send_header(left, FRAME_DATA, 2 ** 40)
+    with pytest.raises(ProtocolError, match='muito grande'):
+        right.recv_frame()
+
+
+def test_peek_header_does_not_consume(pair):
+    left, right = pair
+    left.send_json(FRAME_RESPONSE, 3, {'status': 'success'})
+    right.recv_done(right.sock.recv_into(right.recv_space()))
+    assert right.peek_header(FRAME_RESPONSE)[2] == 3
+    with pytest.raises(ProtocolError):
+        right.peek_header(FRAME_REQUEST)
+    assert right.recv_message(FRAME_RESPONSE) == (3, {'status': 'success'})
+
+
+def test_whole_data_frames_are_bounded(pair):
+    left, right = pair
+    send_header(left, FRAME_DATA, CHUNK_SIZE + 1, flags=FLAG_END)
+    with pytest.raises(ProtocolError, match='muito grande'):
+        list(right.iter_data(whole_frames=True, max_length=CHUNK_SIZE))
+
+
+def test_large_data_frames_are_streamed(pair):
+    left, right = pair
+    body = bytes(range(256)) * (3 * BUFFER_SIZE // 256 + 1)
+    sender = threading.Thread(
+        target=left.send_data, args=(1, body), kwargs={'end': True})
+    sender.start()
+    received = bytearray()
+    for _, chunk in right.iter_data():
+        assert len(chunk) <= BUFFER_SIZE
+        received += chunk
+    sender.join()
+    assert received == body
+
+
+@pytest.mark.parametrize('frame_type, length', [
+    (FRAME_DATA, 64 * 1024 * 1024),
+    (FRAME_DATA, 2 ** 60),
+    (FRAME_RESPONSE, 1024),
+    (FRAME_REQUEST, MAX_JSON_PAYLOAD + 1),
+])
+def test_server_drops_invalid_frames_without_reading(address, frame_type, length):
+    with socket.create_connection(address, timeout=5) as sock:
+        sock.sendall(HEADER.pack(MAGIC, frame_type, 0, 1, length))
+        assert sock.recv(1) == b''  # Conexão encerrada sem esperar o corpo
+
+    # O servidor continua atendendo
+    with socket.create_connection(address, timeout=5) as sock:
+        conn = FrameConnection(sock)
+        conn.send_json(FRAME_REQUEST, 1, {'action': 'list_files'})
+        assert conn.recv_message(FRAME_RESPONSE)[1]['status'] == 'success'
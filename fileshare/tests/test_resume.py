@@ -0,0 +1,90 @@
+"""Downloads por intervalo e retomada de uploads interrompidos"""
+
+import os
+import socket
+import time
+
+import pytest
+
+from client_api import FileShareClient
+from hash_cache import BLOCK_SIZE
+from parallel_download import DownloadError, request_range
+from protocol import FrameConnection, FRAME_REQUEST
+
+
+@pytest.fixture
+def content():
+    return os.urandom(3 * BLOCK_SIZE + 12345)
+
+
+def read_range(address, filename, offset, length, validator=None):
+    """Baixa um intervalo pela conexão crua e devolve (resposta, bytes)"""
+    with socket.create_connection(address, timeout=5) as sock:
+        conn = FrameConnection(sock)
+        response = request_range(conn, filename, offset, length, validator)
+        data = bytearray()
+        for _, chunk in conn.iter_data():
+            data += chunk
+        return response, bytes(data)
+
+
+def test_ranged_download(server, address, content):
+    (server.shared_folder / 'data.bin').write_bytes(content)
+    response, data = read_range(address, 'data.bin', 1000, 50000)
+    assert data == content[1000:51000]
+    assert response['filesize'] == len(content)
+
+    # Intervalo que passa do fim: vem só até o fim do arquivo
+    _, tail = read_range(address, 'data.bin', len(content) - 10, 1000)
+    assert tail == content[-10:]
+
+
+def test_ranged_download_refuses_changed_file(server, address, content):
+    path = server.shared_folder / 'data.bin'
+    path.write_bytes(content)
+    validator = read_range(address, 'data.bin', 0, 10)[0]['validator']
+
+    path.write_bytes(content[::-1])
+    with pytest.raises(DownloadError):
+        read_range(address, 'data.bin', 10, 10, validator)
+
+
+def test_interrupted_upload_resumes(server, address, content, tmp_path):
+    local = tmp_path / 'big.bin'
+    local.write_bytes(content)
+    stat = local.stat()
+    source = f"{stat.st_size}:{stat.st_mtime_ns}"
+    sent = 2 * BLOCK_SIZE + 777
+
+    # Upload cortado no meio: o servidor guarda o que recebeu
+    with socket.create_connection(address, timeout=5) as sock:
+        conn = FrameConnection(sock)
+        conn.send_json(FRAME_REQUEST, 1, {
+            'action': 'upload_file', 'filename': 'big.bin', 'filesize': len(content),
+            'offset': 0, 'source': source, 'checksum': True
+        })
+        conn.send_data(1, content[:sent])
+
+    messages = []
+    client = FileShareClient(address, log=messages.append, timeout=5)
+    try:
+        deadline = time.monotonic() + 5
+        while True:
+            status = client.call({
+                'action': 'upload_status', 'filename': 'big.bin',
+                'filesize': len(content), 'source': source, 'checksum': True
+            })
+            if status['offset'] or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        # Com checksum a retomada recua até o último bloco completo
+        assert status['offset'] == 2 * BLOCK_SIZE
+
+        response = client.upload(local)
+    finally:
+        client.close()
+
+    assert response['status'] == 'success'
+    assert any('Retomando' in message for message in messages)
+    assert (server.shared_folder / 'big.bin').read_bytes() == content
+    assert not any(server.uploads_folder.iterdir())
@@ -0,0 +1,46 @@
+"""Tamanhos e limites de banda escritos com unidade"""
+
+import argparse
+
+import pytest
+
+from bandwidth import parse_rate
+from bench_server import parse_sizes
+from fileshare_cli import parse_byte_size
+from units import parse_size
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('0', 0),
+    ('512', 512),
+    ('4K', 4096),
+    ('4kb', 4096),
+    (' 1.5M ', 1536 * 1024),
+    ('2G', 2 * 1024 ** 3),
+    ('1T', 1024 ** 4),
+])
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+@pytest.mark.parametrize('text', ['', 'K', 'abc', '1X', '-1', '-4K', 'inf', '-inf', 'nan',
+                                  '1e400', '1e308T'])
+def test_parse_size_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_size(text)
+
+
+def test_parse_rate():
+    assert parse_rate('10M') == 10 * 1024 ** 2
+    for text in ('0', '-1M', 'inf', 'x'):
+        with pytest.raises(ValueError):
+            parse_rate(text)
+
+
+def test_option_parsers_raise_argument_errors():
+    assert parse_byte_size('100K') == 100 * 1024
+    assert parse_sizes('4K:60,1M:40') == [(4096, 60.0), (1024 ** 2, 40.0)]
+    for parse, text in ((parse_byte_size, 'inf'), (parse_byte_size, '-1'),
+                        (parse_sizes, '1e400:10'), (parse_sizes, '4K:inf')):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse(text)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - TRANSFERÊNCIAS
+Envio do conteúdo de arquivos em frames de dados, compartilhado por
+cliente e servidor
+"""
+
+import os
+import stat
+
+from protocol import FRAME_DATA, FLAG_END, THROTTLE_STEP
+
+# Tamanho do buffer do caminho com cópia
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def can_zero_copy(sock, f):
+    """
+    Verifica se o arquivo pode ir direto do kernel para o socket
+
+    Args:
+        sock: Socket de destino
+        f: Arquivo aberto em modo binário
+
+    Returns:
+        bool: True se sendfile está disponível para esse par
+    """
+    if not hasattr(os, 'sendfile'):
+        return False
+    if sock.gettimeout() == 0:
+        # socket.sendfile não aceita sockets não bloqueantes
+        return False
+    try:
+        return stat.S_ISREG(os.fstat(f.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        # Objetos sem descritor (BytesIO etc.) só servem no caminho com cópia
+        return False
+
+
+def send_zero_copy(sock, f, offset, count):
+    """
+    Envia `count` bytes do arquivo a partir de `offset` com sendfile
+
+    Returns:
+        int: Bytes enviados
+    """
+    return sock.sendfile(f, offset, count)
+
+
+def send_buffered(sock, f, offset, count, buffer_size=COPY_BUFFER_SIZE):
+    """
+    Envia `count` bytes do arquivo lendo num buffer reaproveitado
+
+    Cada bloco é lido com readinto e enviado como memoryview, sem criar
+    objetos bytes intermediários.
+
+    Returns:
+        int: Bytes enviados
+    """
+    buffer = bytearray(min(buffer_size, max(count, 1)))
+    view = memoryview(buffer)
+    f.seek(offset)
+    sent = 0
+    while sent < count:
+        n = f.readinto(view[:min(len(buffer), count - sent)])
+        if not n:
+            break
+        sock.sendall(view[:n])
+        sent += n
+    return sent
+
+
+def send_throttled(conn, f, offset, count, zero_copy):
+    """
+    Envia `count` bytes em pedaços, pedindo banda a `conn.throttle` antes de cada um
+
+    Returns:
+        int: Bytes enviados
+    """
+    sent = 0
+    while sent < count:
+        step = min(THROTTLE_STEP, count - sent)
+        conn.throttle.sending(step)
+        if zero_copy:
+            n = send_zero_copy(conn.sock, f, offset + sent, step)
+        else:
+            n = send_buffered(conn.sock, f, offset + sent, step)
+        sent += n
+        if n != step:
+            break
+    return sent
+
+
+def send_file_data(conn, request_id, f, offset, count, zero_copy=True, end=True):
+    """
+    Envia parte de um arquivo como um único frame de dados
+
+    Usa sendfile quando possível e cai para o caminho com buffer quando a
+    plataforma ou o arquivo não permitem. Arquivos já em memória (ver
+    file_cache.MemoryFile) vão direto da memória. Deve ser chamado com
+    `conn.send_lock` já adquirido se outros frames precisarem vir junto.
+
+    Args:
+        conn (FrameConnection): Conexão de destino
+        request_id (int): Id da requisição
+        f: Arquivo aberto em modo binário
+        offset (int): Posição inicial no arquivo
+        count (int): Quantidade de bytes
+        zero_copy (bool): Permite usar sendfile
+        end (bool): Marca o frame como o último do fluxo
+    """
+    memory = getattr(f, 'memory', None)
+    if memory is not None:
+        # Fatia da memória: frames pequenos saem com o cabeçalho numa escrita só
+        view = memory[offset:offset + count]
+        if len(view) != count:
+            raise ConnectionError('Arquivo alterado durante o envio')
+        conn.send_frame(FRAME_DATA, request_id, view, FLAG_END if end else 0)
+        return
+    with conn.send_lock:
+        conn.send_header(FRAME_DATA, request_id, count, FLAG_END if end else 0)
+        if not count:
+            return
+        zero_copy = zero_copy and can_zero_copy(conn.sock, f)
+        if conn.throttle:
+            sent = send_throttled(conn, f, offset, count, zero_copy)
+        elif zero_copy:
+            sent = send_zero_copy(conn.sock, f, offset, count)
+        else:
+            sent = send_buffered(conn.sock, f, offset, count)
+        if sent != count:
+            # O arquivo encolheu: o frame não pode ser completado
+            raise ConnectionError('Arquivo alterado durante o envio')
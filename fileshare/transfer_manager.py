@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - FILA DE TRANSFERÊNCIAS
+Executa uploads e downloads em threads de trabalho, fora da thread da
+interface gráfica
+
+Os trabalhos entram numa fila limitada e algumas threads os executam ao
+mesmo tempo. Nada aqui toca no Tkinter: a interface consulta `poll()`
+periodicamente (com root.after) para mostrar progresso e conclusões.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Transferências executadas ao mesmo tempo
+MAX_CONCURRENT = 3
+
+# Trabalhos aguardando na fila antes de recusar novos
+MAX_QUEUED = 32
+
+# Trabalhos concluídos mantidos para exibição
+MAX_FINISHED = 50
+
+# Estados de um trabalho
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class TransferCancelled(Exception):
+    """Transferência cancelada pelo usuário"""
+
+
+class TransferJob:
+    def __init__(self, job_id, kind, name, run):
+        """
+        Uma transferência na fila
+
+        Args:
+            job_id (int): Identificador do trabalho
+            kind (str): 'upload' ou 'download'
+            name (str): Nome do arquivo (para exibição)
+            run: Função que recebe o próprio trabalho e faz a transferência
+        """
+        self.id = job_id
+        self.kind = kind
+        self.name = name
+        self.run = run
+        self.status = QUEUED
+        self.done = 0  # Bytes transferidos
+        self.total = None  # Total em bytes, quando conhecido
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def progress(self, done, total=None):
+        """
+        Informa o progresso (chamado pela transferência, na thread de trabalho)
+
+        Raises:
+            TransferCancelled: Se o trabalho foi cancelado; a transferência
+            para no ponto em que estiver
+        """
+        if self.cancel_event.is_set():
+            raise TransferCancelled('Transferência cancelada')
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def cancel(self):
+        """Pede o cancelamento (efetivo na próxima chamada de `progress`)"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        """Indica se o cancelamento foi pedido"""
+        return self.cancel_event.is_set()
+
+    @property
+    def rate(self):
+        """Velocidade média em bytes/s desde o início"""
+        if not self.started:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+class TransferManager:
+    def __init__(self, workers=MAX_CONCURRENT, max_queued=MAX_QUEUED):
+        """
+        Fila de transferências atendida por threads de trabalho
+
+        Args:
+            workers (int): Transferências simultâneas
+            max_queued (int): Limite de trabalhos esperando na fila
+        """
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()  # id -> TransferJob (ativos e concluídos recentes)
+        self.completed = deque()  # Concluídos ainda não entregues por poll()
+        self.ids = itertools.count(1)
+        self.threads = [
+            threading.Thread(target=self.worker, name=f'fileshare-transfer-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, kind, name, run):
+        """
+        Coloca uma transferência na fila
+
+        Args:
+            kind (str): 'upload' ou 'download'
+            name (str): Nome do arquivo
+            run: Função que recebe o TransferJob e devolve o resultado
+
+        Returns:
+            TransferJob: Trabalho criado
+
+        Raises:
+            queue.Full: Se a fila está cheia
+        """
+        job = TransferJob(next(self.ids), kind, name, run)
+        self.queue.put_nowait(job)
+        with self.lock:
+            self.jobs[job.id] = job
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancela um trabalho na fila ou em andamento
+
+        Returns:
+            bool: False se o trabalho não existe ou já terminou
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None or job.status not in (QUEUED, RUNNING):
+            return False
+        job.cancel()
+        return True
+
+    def worker(self):
+        """Laço de uma thread de trabalho"""
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.started = time.monotonic()
+            if job.cancelled:
+                job.status = CANCELLED
+            else:
+                job.status = RUNNING
+                try:
+                    job.result = job.run(job)
+                    job.status = DONE
+                except TransferCancelled:
+                    job.status = CANCELLED
+                except Exception as e:
+                    job.error = e
+                    job.status = FAILED
+            job.finished = time.monotonic()
+            with self.lock:
+                self.completed.append(job)
+
+    def poll(self):
+        """
+        Estado atual para a interface (chamado na thread do Tkinter)
+
+        Returns:
+            tuple: (lista de trabalhos visíveis, trabalhos concluídos desde a
+            última chamada)
+        """
+        with self.lock:
+            completed = list(self.completed)
+            self.completed.clear()
+            # Esquece os concluídos mais antigos
+            finished = [job_id for job_id, job in self.jobs.items()
+                        if job.status in (DONE, FAILED, CANCELLED)]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED)]:
+                del self.jobs[job_id]
+            jobs = list(self.jobs.values())
+        return jobs, completed
+
+    def active(self):
+        """Quantidade de trabalhos na fila ou em andamento"""
+        with self.lock:
+            return sum(job.status in (QUEUED, RUNNING) for job in self.jobs.values())
+
+    def shutdown(self):
+        """Cancela tudo e encerra as threads (sem esperar as transferências)"""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+        for _ in self.threads:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break  # Threads são daemon: terminam com o programa
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - UNIDADES
+Leitura de tamanhos escritos com unidade ('4K', '1.5G')
+
+Usado pelas opções do servidor (limites de banda), do cliente de linha de
+comando e do benchmark, que convertem os erros no formato de cada um.
+"""
+
+import math
+
+# Multiplicadores dos tamanhos e limites ('4K', '1.5G')
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(text):
+    """
+    Converte um tamanho como '4K', '1M' ou '1.5G' em bytes
+
+    Returns:
+        int: Bytes (zero ou mais)
+
+    Raises:
+        ValueError: Se o texto não for um tamanho válido, for negativo ou
+            infinito
+    """
+    value = text.strip().upper()
+    if value.endswith('B'):
+        value = value[:-1]
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ''
+    try:
+        size = float(value[:len(value) - len(unit)]) * SIZE_UNITS[unit]
+        if not math.isfinite(size) or size < 0:
+            raise ValueError
+        return int(size)
+    except (ValueError, OverflowError):
+        raise ValueError(f'Tamanho inválido: {text}') from None
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aplicativo de Compartilhamento de Arquivos - OBSERVADOR DA PASTA
+Eventos de mudança da pasta compartilhada para a ação `subscribe`
+
+No Linux a pasta é observada com inotify (via ctypes, sem dependências):
+cada aviso do kernel traz o nome do arquivo, que é conferido com os.stat,
+então o custo é proporcional às mudanças. Nos demais sistemas (ou se o
+inotify não estiver disponível) a pasta é relida quando a data do
+diretório muda ou a cada RESCAN_INTERVAL (edições no lugar não mudam a
+data do diretório), e a diferença entre as leituras vira eventos.
+
+O servidor também avisa (notify) dos arquivos que ele mesmo publicou ou
+removeu, para que os eventos saiam na hora mesmo no modo por leitura.
+
+Cada evento ganha um número de sequência. Os últimos HISTORY_SIZE ficam
+guardados para que um cliente que reconectou receba só o que perdeu;
+`epoch` identifica a sequência (um servidor reiniciado, ou outro processo
+do pré-fork, começa outra).
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from stat import S_ISREG
+
+# Tipos de evento
+EVENT_ADDED = 'added'
+EVENT_MODIFIED = 'modified'
+EVENT_DELETED = 'deleted'
+
+# Modo por leitura: intervalo entre as conferências da data do diretório
+POLL_INTERVAL = 1.0
+
+# Modo por leitura: releitura completa mesmo sem mudança na data do diretório
+RESCAN_INTERVAL = 5.0
+
+# inotify: espera para juntar os avisos de uma mesma gravação
+SETTLE_DELAY = 0.05
+
+# Eventos guardados para clientes que reconectam
+HISTORY_SIZE = 10000
+
+# Máscaras do inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                 | IN_CREATE | IN_DELETE)
+
+# Cabeçalho de cada aviso: wd, mask, cookie, len (o nome vem em seguida)
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    def __init__(self, fd):
+        """Descritor do inotify observando uma pasta (ver Inotify.open)"""
+        self.fd = fd
+
+    @classmethod
+    def open(cls, folder):
+        """
+        Começa a observar uma pasta
+
+        Returns:
+            Inotify: Observador ou None se o sistema não tiver inotify
+        """
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, os.fsencode(folder), IN_WATCH_MASK) < 0:
+                os.close(fd)
+                return None
+        except (OSError, AttributeError):
+            return None
+        return cls(fd)
+
+    def fileno(self):
+        return self.fd
+
+    def read(self):
+        """
+        Lê os avisos pendentes
+
+        Returns:
+            tuple: (nomes afetados, True se a fila do kernel transbordou)
+        """
+        names = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            position = 0
+            while position < len(data):
+                _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, position)
+                position += _INOTIFY_EVENT.size
+                name = data[position:position + length].rstrip(b'\0')
+                position += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif name:
+                    names.add(os.fsdecode(name))
+        return names, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    def __init__(self, folder, scan, history=HISTORY_SIZE, use_inotify=True):
+        """
+        Observa uma pasta e entrega os eventos de mudança aos assinantes
+
+        Args:
+            folder (Path): Pasta observada
+            scan: Função que lê a pasta inteira (nome -> (tamanho, mtime)),
+                ex.: ListingCache.scan
+            history (int): Eventos guardados para reenviar
+            use_inotify (bool): Usa o inotify quando disponível
+        """
+        self.folder = folder
+        self.scan = scan
+        self.use_inotify = use_inotify
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.history = deque(maxlen=history)
+        self.subscribers = {}  # chave -> função que recebe (eventos, seq)
+        self.lock = threading.Lock()
+        self.state = {}  # nome -> (tamanho, mtime) na última conferência
+        self.hints = deque()  # Nomes avisados pelo servidor (notify)
+        self.wakeup = threading.Event()
+        self.inotify = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Lê o estado inicial e começa a observar numa thread própria"""
+        self.inotify = Inotify.open(self.folder) if self.use_inotify else None
+        self.state = self.scan()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='fileshare-watcher', daemon=True)
+        self.thread.start()
+        way = "inotify" if self.inotify else f"leitura a cada {POLL_INTERVAL:.0f}s"
+        print(f"👀 Observando mudanças na pasta ({way})")
+
+    def stop(self):
+        """Para a observação"""
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+    def notify(self, name):
+        """Avisa que um arquivo foi publicado ou removido pelo servidor"""
+        self.hints.append(name)
+        self.wakeup.set()
+
+    def subscribe(self, key, deliver, epoch=None, since=None):
+        """
+        Registra um assinante
+
+        Args:
+            key: Identifica o assinante (para unsubscribe)
+            deliver: Função chamada com (eventos, seq) a cada mudança; se
+                ela levantar uma exceção o assinante é removido
+            epoch (str): Sequência conhecida pelo cliente (reconexão)
+            since (int): Último evento que o cliente recebeu
+
+        Returns:
+            tuple: (epoch, seq atual, eventos perdidos desde `since` ou None
+            se eles não estão mais guardados e o cliente deve reler a lista)
+        """
+        with self.lock:
+            self.subscribers[key] = deliver
+            missed = []
+            if since is not None:
+                oldest = self.history[0]['seq'] if self.history else self.seq + 1
+                if epoch != self.epoch or since > self.seq or since < oldest - 1:
+                    missed = None
+                else:
+                    missed = [event for event in self.history if event['seq'] > since]
+            return self.epoch, self.seq, missed
+
+    def unsubscribe(self, key):
+        """Remove um assinante"""
+        with self.lock:
+            self.subscribers.pop(key, None)
+
+    def emit(self, events):
+        """Numera os eventos, guarda no histórico e entrega aos assinantes"""
+        if not events:
+            return
+        with self.lock:
+            for event in events:
+                self.seq += 1
+                event['seq'] = self.seq
+                self.history.append(event)
+            seq = self.seq
+            subscribers = list(self.subscribers.items())
+        for key, deliver in subscribers:
+            try:
+                deliver(events, seq)
+            except Exception:
+                self.unsubscribe(key)
+
+    def event(self, kind, name, info=None):
+        """Monta um evento com os mesmos campos da listagem"""
+        event = {'event': kind, 'name': name}
+        if info is not None:
+            size, mtime = info
+            event.update(size=size, mtime=mtime, modified=time.ctime(mtime))
+        return event
+
+    def check(self, names):
+        """
+        Confere alguns arquivos com os.stat
+
+        Returns:
+            list: Eventos das mudanças encontradas
+        """
+        events = []
+        for name in names:
+            try:
+                stat = os.stat(self.folder / name)
+                info = (stat.st_size, stat.st_mtime) if S_ISREG(stat.st_mode) else None
+            except OSError:
+                info = None
+            old = self.state.get(name)
+            if info == old:
+                continue
+            if info is None:
+                del self.state[name]
+                events.append(self.event(EVENT_DELETED, name))
+            else:
+                self.state[name] = info
+                events.append(self.event(EVENT_ADDED if old is None else EVENT_MODIFIED,
+                                         name, info))
+        return events
+
+    def rescan(self):
+        """
+        Relê a pasta inteira e compara com o estado anterior
+
+        Returns:
+            list: Eventos das mudanças encontradas
+        """
+        current = self.scan()
+        events = []
+        for name, info in current.items():
+            old = self.state.get(name)
+            if old != info:
+                events.append(self.event(EVENT_ADDED if old is None else EVENT_MODIFIED,
+                                         name, info))
+        for name in self.state.keys() - current.keys():
+            events.append(self.event(EVENT_DELETED, name))
+        self.state = current
+        return events
+
+    def take_hints(self):
+        """Nomes avisados pelo servidor desde a última vez"""
+        names = set()
+        while self.hints:
+            names.add(self.hints.popleft())
+        return names
+
+    def run(self):
+        """Laço da thread de observação"""
+        dir_mtime = os.stat(self.folder).st_mtime_ns
+        last_rescan = time.monotonic()
+        while self.running:
+            try:
+                if self.inotify:
+                    ready, _, _ = select.select([self.inotify], [], [], POLL_INTERVAL)
+                    names = self.take_hints()
+                    if ready:
+                        time.sleep(SETTLE_DELAY)
+                        changed, overflow = self.inotify.read()
+                        if overflow:
+                            # Avisos perdidos: só uma releitura completa é confiável
+                            self.emit(self.rescan())
+                            continue
+                        names |= changed
+                    self.emit(self.check(names))
+                else:
+                    self.wakeup.wait(POLL_INTERVAL)
+                    self.wakeup.clear()
+                    if not self.running:
+                        break
+                    self.emit(self.check(self.take_hints()))
+                    now = time.monotonic()
+                    mtime = os.stat(self.folder).st_mtime_ns
+                    if mtime != dir_mtime or now - last_rescan >= RESCAN_INTERVAL:
+                        dir_mtime = mtime
+                        last_rescan = now
+                        self.emit(self.rescan())
+            except OSError as e:
+                print(f"❌ Erro ao observar a pasta: {e}")
+                time.sleep(POLL_INTERVAL)